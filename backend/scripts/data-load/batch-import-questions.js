@@ -1064,6 +1064,9 @@ async function importChapter(chapterPath, subject, chapterName, options, isFlat
           doc.image_url = imageUrl;
         }
 
+        // Change-feed watermark (set() replaces the whole document on re-import)
+        doc.updated_at = admin.firestore.FieldValue.serverTimestamp();
+
         // Add to batch
         const ref = db.collection('questions').doc(questionId);
         batch.set(ref, doc);
@@ -1178,6 +1181,7 @@ async function importAssessment(folderPath, options) {
         doc.image_url = imageUrl;
       }
 
+      doc.updated_at = admin.firestore.FieldValue.serverTimestamp(); // Change-feed watermark
       const ref = db.collection('initial_assessment_questions').doc(questionId);
       batch.set(ref, doc);
       batchCount++;
@@ -12,7 +12,7 @@
  */
 
 require('dotenv').config();
-const { db } = require('../src/config/firebase');
+const { db, admin } = require('../src/config/firebase');
 const Anthropic = require('@anthropic-ai/sdk');
 
 // ============================================================================
@@ -213,7 +213,10 @@ async function enrichQuestions(options = {}) {
           console.log(`     [DRY RUN] Would update with:`, JSON.stringify(enrichment).substring(0, 100));
         } else {
           try {
-            await db.collection('questions').doc(question.id).update(enrichment);
+            await db.collection('questions').doc(question.id).update({
+              ...enrichment,
+              updated_at: admin.firestore.FieldValue.serverTimestamp() // Change-feed watermark
+            });
             console.log(`     ✅ Updated`);
             updated++;
           } catch (updateError) {
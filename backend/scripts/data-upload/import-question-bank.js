@@ -468,6 +468,9 @@ async function processBatch(questions) {
       console.log(`  📝 Processing: ${questionId} → ${questionData.subject} / ${questionData.chapter}`);
       const questionDoc = await processQuestion(questionId, questionData);
       
+      // Change-feed watermark (set() replaces the whole document on re-import)
+      questionDoc.updated_at = admin.firestore.FieldValue.serverTimestamp();
+      
       // Add to batch
       const questionRef = db.collection('questions').doc(questionId);
       batch.set(questionRef, questionDoc);
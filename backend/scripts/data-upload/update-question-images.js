@@ -170,7 +170,8 @@ async function updateQuestionImage(questionId) {
     // Update question document
     await retryFirestoreOperation(async () => {
       return await questionRef.update({
-        image_url: imageUrl
+        image_url: imageUrl,
+        updated_at: admin.firestore.FieldValue.serverTimestamp() // Change-feed watermark
       });
     });
     
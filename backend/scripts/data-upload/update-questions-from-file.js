@@ -221,6 +221,7 @@ function processQuestionDocument(questionId, questionData) {
     archived_reason: questionData.archived_reason || null,
 
     created_date: questionData.created_date || admin.firestore.FieldValue.serverTimestamp(),
+    updated_at: admin.firestore.FieldValue.serverTimestamp(), // Change-feed watermark for engine caches
     created_by: questionData.created_by || 'update_script',
     validation_status: questionData.validation_status || 'pending'
   };
@@ -0,0 +1,545 @@
+# JEEVibe IIDP Algorithm - Distributed Nightly Batch Runner
+# Runs the engine's per-student nightly jobs over the whole student base,
+# across processes and nodes, resuming after crashes
+#
+# Usage (every node runs the same command; the first one plans the job):
+#   python iidp_batch_runner.py theta_replay --lease-db /tmp/iidp_leases.sqlite
+#   python iidp_batch_runner.py response_compaction --lease-store firestore --workers 8
+#   python iidp_batch_runner.py theta_replay --lease-db /tmp/iidp_leases.sqlite --status
+#
+# Planning sorts the student IDs and cuts them into contiguous shards, one
+# lease-table row each. A node claims a free shard, or one whose lease has
+# expired, and runs the job over the shard in chunks on a process pool. It
+# checkpoints the shard's position after every finished chunk, in order, and
+# the checkpoint also renews the lease. When a node dies, its lease expires.
+# Another node then claims the shard and resumes from the checkpoint, so at
+# most the chunks in flight run twice. The registered jobs are idempotent:
+# replay writes carry preconditions, and compaction only folds what is
+# still raw.
+#
+# Lease tables:
+#   SQLiteLeaseTable    one file: a single machine, or local testing
+#   FirestoreLeaseTable batch_jobs/{job_id}/shards/{n}: many nodes, claims
+#                       made safe by last_update_time preconditions
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BATCH_DEFAULT_SHARDS = 64               # Shards per job (the unit of leasing)
+BATCH_CHUNK_STUDENTS = engine.REPLAY_CHUNK_STUDENTS  # Students per process-pool task
+BATCH_LEASE_SECONDS = 300               # A shard is reclaimable this long after its last renewal
+BATCH_MAX_ATTEMPTS = 3                  # Failed runs before a shard is marked failed
+BATCH_IDLE_POLL_SECONDS = 10            # Wait between claims while other nodes hold the rest
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+# A job is a module-level function from a job ID and a chunk of student IDs
+# to a summary dict of counts (summed into the shard's checkpoint).
+# Module-level so the process pool can pickle it. The job ID lets a job load
+# inputs shared by all its chunks once per process (see theta_replay_chunk).
+
+@dataclass
+class BatchJob:
+    name: str
+    run_chunk: Callable[[str, List[str]], Dict]
+    description: str = ""
+
+
+BATCH_JOBS: Dict[str, BatchJob] = {}
+
+
+def register_batch_job(name: str, run_chunk: Callable[[str, List[str]], Dict], description: str = ""):
+    """Make a per-student engine function runnable by name"""
+    BATCH_JOBS[name] = BatchJob(name, run_chunk, description)
+
+
+_replay_item_parameters: Dict[str, Dict] = {}  # job_id -> item parameters, this process only
+
+
+def _item_parameters_for_job(job_id: str) -> Dict:
+    """Item parameters, read once per process per job (a run scores every chunk against the same ones)"""
+    if job_id not in _replay_item_parameters:
+        _replay_item_parameters.clear()
+        _replay_item_parameters[job_id] = engine.load_item_parameters()
+    return _replay_item_parameters[job_id]
+
+
+def theta_replay_chunk(job_id: str, student_ids: List[str]) -> Dict:
+    return engine.replay_theta_chunk(student_ids, _item_parameters_for_job(job_id))
+
+
+def response_compaction_chunk(job_id: str, student_ids: List[str]) -> Dict:
+    return engine.compact_all_response_logs(student_ids)
+
+
+register_batch_job("theta_replay", theta_replay_chunk,
+                   "Re-score response logs with the current IRT parameters")
+register_batch_job("response_compaction", response_compaction_chunk,
+                   "Fold old raw responses into per-topic rollups")
+
+
+def _merge_summary(total: Dict, summary: Optional[Dict]) -> Dict:
+    """Add a chunk summary's numeric fields into the running shard summary"""
+    for key, value in (summary or {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = round(total.get(key, 0) + value, 6)
+    return total
+
+
+# ============================================================================
+# LEASE TABLES
+# ============================================================================
+
+@dataclass
+class ShardLease:
+    """A claimed shard: its students and where the last owner stopped"""
+    job_id: str
+    job_name: str
+    shard: int
+    student_ids: List[str]
+    position: int = 0
+    summary: Dict = field(default_factory=dict)
+    attempts: int = 0
+
+
+class SQLiteLeaseTable:
+    """
+    Lease table in one SQLite file.
+    
+    Claims run inside BEGIN IMMEDIATE, so concurrent processes on the machine
+    never claim the same shard. Not for network filesystems; use
+    FirestoreLeaseTable across nodes.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_shards (
+                    job_id TEXT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    job_name TEXT NOT NULL,
+                    student_ids TEXT NOT NULL,
+                    position INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    owner TEXT,
+                    lease_expires_at REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    summary TEXT NOT NULL DEFAULT '{}',
+                    error TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (job_id, shard)
+                )
+            """)
+    
+    @contextlib.contextmanager
+    def _connect(self):
+        """Autocommit connection, closed on exit (rolling back an open BEGIN)"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def create_job(self, job_id: str, job_name: str, shards: List[List[str]]) -> bool:
+        """Insert the job's shards unless the job exists; True if this call planned it"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute("SELECT 1 FROM batch_shards WHERE job_id = ? LIMIT 1",
+                                  (job_id,)).fetchone()
+            if exists:
+                conn.execute("COMMIT")
+                return False
+            conn.executemany(
+                "INSERT INTO batch_shards (job_id, shard, job_name, student_ids, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(job_id, n, job_name, json.dumps(ids), time.time()) for n, ids in enumerate(shards)]
+            )
+            conn.execute("COMMIT")
+            return True
+    
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[ShardLease]:
+        """Take the lowest pending shard, or a running one whose lease expired"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM batch_shards WHERE job_id = ? AND "
+                "(status = 'pending' OR (status = 'running' AND lease_expires_at < ?)) "
+                "ORDER BY shard LIMIT 1",
+                (job_id, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE batch_shards SET status = 'running', owner = ?, lease_expires_at = ?, "
+                "updated_at = ? WHERE job_id = ? AND shard = ?",
+                (owner, now + lease_seconds, now, job_id, row['shard'])
+            )
+            conn.execute("COMMIT")
+        
+        return ShardLease(job_id, row['job_name'], row['shard'], json.loads(row['student_ids']),
+                          row['position'], json.loads(row['summary']), row['attempts'])
+    
+    def _update_owned(self, lease: ShardLease, owner: str, assignments: str, values: tuple) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE batch_shards SET {assignments}, updated_at = ? "
+                "WHERE job_id = ? AND shard = ? AND owner = ? AND status = 'running'",
+                values + (time.time(), lease.job_id, lease.shard, owner)
+            )
+            return cursor.rowcount == 1
+    
+    def renew(self, lease: ShardLease, owner: str, lease_seconds: float) -> bool:
+        """Extend the lease; False if another node took the shard"""
+        return self._update_owned(lease, owner, "lease_expires_at = ?", (time.time() + lease_seconds,))
+    
+    def checkpoint(self, lease: ShardLease, owner: str, lease_seconds: float) -> bool:
+        """Record lease.position and lease.summary and renew; False if the lease was lost"""
+        return self._update_owned(
+            lease, owner, "position = ?, summary = ?, lease_expires_at = ?",
+            (lease.position, json.dumps(lease.summary), time.time() + lease_seconds)
+        )
+    
+    def complete(self, lease: ShardLease, owner: str) -> bool:
+        return self._update_owned(
+            lease, owner, "status = 'done', position = ?, summary = ?, owner = NULL",
+            (lease.position, json.dumps(lease.summary))
+        )
+    
+    def release(self, lease: ShardLease, owner: str, error: str) -> bool:
+        """Give the shard back after a failure (failed for good after BATCH_MAX_ATTEMPTS)"""
+        status = 'failed' if lease.attempts + 1 >= BATCH_MAX_ATTEMPTS else 'pending'
+        return self._update_owned(
+            lease, owner, "status = ?, attempts = attempts + 1, error = ?, owner = NULL, "
+                          "lease_expires_at = 0",
+            (status, error[:2000])
+        )
+    
+    def progress(self, job_id: str) -> Dict:
+        """Shard counts by status, plus the summed shard summaries"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, position, student_ids, summary FROM batch_shards "
+                                "WHERE job_id = ?", (job_id,)).fetchall()
+        return _progress_report([(r['status'], r['position'], len(json.loads(r['student_ids'])),
+                                  json.loads(r['summary'])) for r in rows])
+
+
+class FirestoreLeaseTable:
+    """
+    Lease table in Firestore, for runners on several nodes.
+    
+    batch_jobs/{job_id} plus one document per shard under shards/. Every
+    ownership change is an update preconditioned on the shard document's
+    last_update_time, so of two nodes racing for a shard exactly one wins.
+    """
+    
+    def __init__(self, db=None):
+        self.db = db if db is not None else engine.get_firestore_client()
+    
+    def _shards(self, job_id: str):
+        return self.db.collection('batch_jobs').document(job_id).collection('shards')
+    
+    def create_job(self, job_id: str, job_name: str, shards: List[List[str]]) -> bool:
+        """Create the job and its shards in one batch; False if the job already exists"""
+        batch = self.db.batch()
+        batch.create(self.db.collection('batch_jobs').document(job_id), {
+            "job_name": job_name,
+            "shard_count": len(shards),
+            "created_at": datetime.utcnow().isoformat()
+        })
+        for n, student_ids in enumerate(shards):
+            batch.set(self._shards(job_id).document(f"{n:05d}"), {
+                "shard": n, "job_name": job_name, "student_ids": student_ids,
+                "position": 0, "status": "pending", "owner": None,
+                "lease_expires_at": 0, "attempts": 0, "summary": {}, "error": None
+            })
+        try:
+            batch.commit()
+            return True
+        except AlreadyExists:
+            return False
+    
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[ShardLease]:
+        now = time.time()
+        for snapshot in self._shards(job_id).where('status', 'in', ['pending', 'running']).stream():
+            data = snapshot.to_dict()
+            if data['status'] == 'running' and data['lease_expires_at'] >= now:
+                continue
+            try:
+                snapshot.reference.update({
+                    "status": "running", "owner": owner, "lease_expires_at": now + lease_seconds
+                }, option=self.db.write_option(last_update_time=snapshot.update_time))
+            except FailedPrecondition:
+                continue  # Another node claimed it first
+            return ShardLease(job_id, data['job_name'], data['shard'], data['student_ids'],
+                              data['position'], data['summary'], data['attempts'])
+        return None
+    
+    def _update_owned(self, lease: ShardLease, owner: str, update: Dict) -> bool:
+        ref = self._shards(lease.job_id).document(f"{lease.shard:05d}")
+        snapshot = ref.get()
+        data = snapshot.to_dict() or {}
+        if data.get('owner') != owner or data.get('status') != 'running':
+            return False
+        try:
+            ref.update(update, option=self.db.write_option(last_update_time=snapshot.update_time))
+            return True
+        except FailedPrecondition:
+            return False
+    
+    def renew(self, lease: ShardLease, owner: str, lease_seconds: float) -> bool:
+        return self._update_owned(lease, owner, {"lease_expires_at": time.time() + lease_seconds})
+    
+    def checkpoint(self, lease: ShardLease, owner: str, lease_seconds: float) -> bool:
+        return self._update_owned(lease, owner, {
+            "position": lease.position, "summary": lease.summary,
+            "lease_expires_at": time.time() + lease_seconds
+        })
+    
+    def complete(self, lease: ShardLease, owner: str) -> bool:
+        return self._update_owned(lease, owner, {
+            "status": "done", "position": lease.position, "summary": lease.summary, "owner": None
+        })
+    
+    def release(self, lease: ShardLease, owner: str, error: str) -> bool:
+        return self._update_owned(lease, owner, {
+            "status": "failed" if lease.attempts + 1 >= BATCH_MAX_ATTEMPTS else "pending",
+            "attempts": lease.attempts + 1, "error": error[:2000], "owner": None,
+            "lease_expires_at": 0
+        })
+    
+    def progress(self, job_id: str) -> Dict:
+        rows = []
+        for snapshot in self._shards(job_id).stream():
+            data = snapshot.to_dict()
+            rows.append((data['status'], data['position'], len(data['student_ids']), data['summary']))
+        return _progress_report(rows)
+
+
+def _progress_report(rows) -> Dict:
+    """rows: (status, position, shard size, summary) per shard"""
+    report = {"shards": len(rows), "pending": 0, "running": 0, "done": 0, "failed": 0,
+              "students": 0, "students_processed": 0, "summary": {}}
+    for status, position, size, summary in rows:
+        report[status] += 1
+        report["students"] += size
+        report["students_processed"] += position
+        _merge_summary(report["summary"], summary)
+    return report
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def plan_batch_job(lease_table, job_name: str, job_id: Optional[str] = None,
+                   student_ids: Optional[List[str]] = None,
+                   shards: int = BATCH_DEFAULT_SHARDS) -> str:
+    """
+    Split the students into contiguous shards and record them (once per job_id).
+    
+    Args:
+        lease_table: SQLiteLeaseTable or FirestoreLeaseTable
+        job_name: Registered job (BATCH_JOBS)
+        job_id: Run identifier (default: job name + today's date, so every
+                node's nightly cron plans and joins the same run)
+        student_ids: Students to cover (default: every students document)
+        shards: Number of shards
+    
+    Returns:
+        job_id
+    """
+    if job_name not in BATCH_JOBS:
+        raise ValueError(f"Unknown batch job {job_name!r} (registered: {sorted(BATCH_JOBS)})")
+    job_id = job_id or f"{job_name}_{datetime.utcnow().strftime('%Y-%m-%d')}"
+    
+    if student_ids is None:
+        db = engine.get_firestore_client()
+        student_ids = [ref.id for ref in db.collection('students').list_documents()]
+    student_ids = sorted(student_ids)
+    
+    shard_size = max(1, -(-len(student_ids) // max(1, shards)))
+    shard_lists = [student_ids[i:i + shard_size] for i in range(0, len(student_ids), shard_size)]
+    
+    if lease_table.create_job(job_id, job_name, shard_lists):
+        engine.instrument.event("batch.planned",
+                                f"🗂️ Planned {job_id}: {len(student_ids)} students in {len(shard_lists)} shards")
+    return job_id
+
+
+def _initialize_worker():
+    """Process-pool initializer: each worker process needs its own Firebase app"""
+    try:
+        engine.firebase_admin.get_app()
+    except ValueError:
+        engine.firebase_admin.initialize_app()
+
+
+class BatchRunner:
+    """
+    One node's share of a planned job.
+    
+    Claims shards until none are left, running each shard's remaining
+    students in chunks on a process pool (workers=1 runs in-process).
+    """
+    
+    def __init__(self, lease_table, job_id: str, workers: Optional[int] = None,
+                 chunk_size: int = BATCH_CHUNK_STUDENTS, lease_seconds: float = BATCH_LEASE_SECONDS,
+                 owner: Optional[str] = None, initializer: Optional[Callable] = _initialize_worker):
+        self.lease_table = lease_table
+        self.job_id = job_id
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.initializer = initializer
+    
+    def run(self, wait_for_stragglers: bool = True) -> Dict:
+        """
+        Process shards until the job is finished.
+        
+        Args:
+            wait_for_stragglers: When every remaining shard is leased by
+                                 another node, keep polling so a crashed
+                                 node's shards are picked up on expiry
+        
+        Returns:
+            Job progress (see SQLiteLeaseTable.progress)
+        """
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+        
+        try:
+            while True:
+                lease = self.lease_table.claim(self.job_id, self.owner, self.lease_seconds)
+                if lease is not None:
+                    self._run_shard(lease, pool)
+                    continue
+                if not wait_for_stragglers or self.lease_table.progress(self.job_id)["running"] == 0:
+                    break
+                time.sleep(BATCH_IDLE_POLL_SECONDS)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        
+        progress = self.lease_table.progress(self.job_id)
+        engine.instrument.event("batch.finished",
+                                f"🏁 {self.job_id}: {progress['done']}/{progress['shards']} shards done, "
+                                f"{progress['failed']} failed, "
+                                f"{progress['students_processed']}/{progress['students']} students")
+        return progress
+    
+    def _run_shard(self, lease: ShardLease, pool: Optional[ProcessPoolExecutor]):
+        """Run a shard from its checkpoint; checkpoints after each chunk, in order"""
+        job = BATCH_JOBS[lease.job_name]
+        remaining = lease.student_ids[lease.position:]
+        chunks = [remaining[i:i + self.chunk_size] for i in range(0, len(remaining), self.chunk_size)]
+        if lease.position:
+            engine.instrument.event("batch.shard_resumed",
+                                    f"↩️ {self.job_id} shard {lease.shard}: resuming at "
+                                    f"{lease.position}/{len(lease.student_ids)}")
+        
+        futures = []
+        try:
+            if pool is None:
+                results = (job.run_chunk(self.job_id, chunk) for chunk in chunks)
+            else:
+                futures = [pool.submit(job.run_chunk, self.job_id, chunk) for chunk in chunks]
+                results = (self._await(lease, future) for future in futures)
+            
+            for chunk, summary in zip(chunks, results):
+                lease.position += len(chunk)
+                _merge_summary(lease.summary, summary)
+                if not self.lease_table.checkpoint(lease, self.owner, self.lease_seconds):
+                    engine.instrument.event("batch.lease_lost",
+                                            f"⚠️ {self.job_id} shard {lease.shard}: lease lost, stopping",
+                                            level=logging.WARNING)
+                    return
+        except Exception as e:
+            engine.instrument.event("batch.shard_failed",
+                                    f"⚠️ {self.job_id} shard {lease.shard} failed at {lease.position}: {e!r}",
+                                    level=logging.WARNING)
+            self.lease_table.release(lease, self.owner, repr(e))
+            return
+        finally:
+            for future in futures:
+                future.cancel()  # No-op for finished chunks
+        
+        self.lease_table.complete(lease, self.owner)
+    
+    def _await(self, lease: ShardLease, future) -> Dict:
+        """Wait for a chunk, renewing the lease so a slow chunk does not lose it"""
+        while True:
+            try:
+                return future.result(timeout=self.lease_seconds / 3)
+            except FutureTimeoutError:
+                if not self.lease_table.renew(lease, self.owner, self.lease_seconds):
+                    raise RuntimeError("lease lost while waiting for a chunk")
+
+
+def run_batch_job(lease_table, job_name: str, job_id: Optional[str] = None,
+                  student_ids: Optional[List[str]] = None, shards: int = BATCH_DEFAULT_SHARDS,
+                  workers: Optional[int] = None, chunk_size: int = BATCH_CHUNK_STUDENTS,
+                  lease_seconds: float = BATCH_LEASE_SECONDS) -> Dict:
+    """Plan the job (first node only) and work on it until it is finished"""
+    job_id = plan_batch_job(lease_table, job_name, job_id, student_ids, shards)
+    runner = BatchRunner(lease_table, job_id, workers=workers, chunk_size=chunk_size,
+                         lease_seconds=lease_seconds)
+    return runner.run()
+
+
+# ============================================================================
+# MAIN EXECUTION FLOW
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an IIDP nightly job over leased student shards")
+    parser.add_argument("job", choices=sorted(BATCH_JOBS))
+    parser.add_argument("--job-id", default=None, help="Run identifier (default: job name + date)")
+    parser.add_argument("--lease-store", choices=["sqlite", "firestore"], default="sqlite")
+    parser.add_argument("--lease-db", default="iidp_batch_leases.sqlite", help="SQLite lease file")
+    parser.add_argument("--shards", type=int, default=BATCH_DEFAULT_SHARDS)
+    parser.add_argument("--workers", type=int, default=None, help="Processes on this node")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_STUDENTS)
+    parser.add_argument("--lease-seconds", type=float, default=BATCH_LEASE_SECONDS)
+    parser.add_argument("--status", action="store_true", help="Print progress and exit")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    _initialize_worker()
+    if args.lease_store == "firestore":
+        table = FirestoreLeaseTable()
+    else:
+        table = SQLiteLeaseTable(args.lease_db)
+    
+    if args.status:
+        job_id = args.job_id or f"{args.job}_{datetime.utcnow().strftime('%Y-%m-%d')}"
+        print(json.dumps(table.progress(job_id), indent=2))
+    else:
+        run_batch_job(table, args.job, job_id=args.job_id, shards=args.shards, workers=args.workers,
+                      chunk_size=args.chunk_size, lease_seconds=args.lease_seconds)
@@ -1,14 +1,36 @@
 # JEEVibe IIDP Algorithm - Python Implementation
 # Production-Ready Code for Firebase + Python Backend
 
+import asyncio
+import bisect
+import contextlib
+import cProfile
+import functools
+import gzip
+import hashlib
+import heapq
+import json
+import logging
 import math
+import os
+import pstats
+import queue
+import re
 import random
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import (Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                TimeoutError as FuturesTimeoutError)
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
-from scipy.stats import norm
+from typing import Collection, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+import numpy as np
+from scipy.stats import chi2, norm
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
 
 # ============================================================================
 # DATA STRUCTURES
@@ -86,6 +108,21 @@ QUIZ_LENGTH = 10
 WEAK_TOPIC_COUNT_EXPLOITATION = 7
 MAINTENANCE_COUNT_EXPLOITATION = 2
 REVIEW_COUNT = 1
+INTERLEAVE_SUBJECT_SPACING = True       # Equally full topics: prefer a subject change
+INTERLEAVE_DIFFICULTY_RAMP = False      # Easier questions first within the topic interleave
+INTERLEAVE_SUBJECT_LOOKAHEAD = 3        # Extra equally full topics checked for a subject change
+
+# Adaptive initial assessment (max-information items, EAP per subject, SE stopping)
+ASSESSMENT_MAX_QUESTIONS = 30           # Fixed-form length; the adaptive form never exceeds it
+CAT_SE_TARGET = 0.6                     # A subject stops once its posterior SD falls below this (SE_CEILING)
+CAT_MIN_QUESTIONS_PER_SUBJECT = 3       # Answered before the SE rule may stop a subject
+CAT_MAX_QUESTIONS_PER_SUBJECT = 10      # Hard stop per subject (3 x 10 = fixed-form length)
+CAT_PRIOR_SD = 1.0                      # Subject theta prior N(0, 1), same scale as percentiles
+CAT_TOPIC_PRIOR_SD = 0.6                # Topic theta prior spread around its subject's estimate
+
+# Streaming initial assessment (per-answer aggregation)
+ASSESSMENT_IDLE_SECONDS = 3600          # In-memory aggregates idle this long are evicted
+ASSESSMENT_WRITE_ATTEMPTS = 3           # Progress writes retried after losing an update_time race
 
 # Difficulty matching
 OPTIMAL_DIFFICULTY_RANGE = 0.5
@@ -104,9 +141,123 @@ DIFFICULTY_VERY_HARD_MAX = 2.6
 # For exploration (first attempt on topic), use neutral medium difficulty
 EXPLORATION_TARGET_DIFFICULTY = 0.9
 
+# Precomputed item curves (information / probability on a theta grid)
+THETA_GRID_STEP = 0.05                  # Grid over [THETA_MIN, THETA_MAX], 121 points
+INFORMATION_INTERPOLATION_TOLERANCE = 0.002  # Max lookup error, share of the item's peak (a <= 3)
+BANK_GAP_MIN_INFORMATION = 0.3          # Topic max information below this = bank gap
+
 # Recency filtering
 RECENT_QUESTIONS_WINDOW_DAYS = 30
 
+# Correlated-topic priors (cohort topic covariance, refit nightly)
+TOPIC_COVARIANCE_MIN_STUDENTS = 30      # Topics / topic pairs seen in fewer profiles get no covariance
+TOPIC_COVARIANCE_SHRINKAGE = 0.5        # Weight of the subject-pair average in each topic-pair correlation
+TOPIC_COVARIANCE_REFRESH_SECONDS = 3600 # How often workers reload the published model
+TOPIC_PRIOR_CACHE_SIZE = 256            # Regression weights cached per tested-topic set
+PREDICTABLE_TOPIC_SE = 0.45             # Predicted at least this precisely = explored last
+
+# Response-time model (lognormal item time intensity / student speed, refit nightly)
+RESPONSE_TIME_SCORING = os.environ.get("IIDP_RESPONSE_TIME_SCORING", "0") == "1"  # Effort-weighted theta steps
+RESPONSE_TIME_MIN_RESPONSES = 20        # Items timed fewer times keep their authored time_estimate
+RESPONSE_TIME_FIT_ITERATIONS = 25       # Alternating speed / item-parameter passes
+RESPONSE_TIME_REFRESH_SECONDS = 3600    # How often workers reload the published model
+RESPONSE_TIME_DEFAULT_ALPHA = 1.5       # Time discrimination for items without a fit
+RESPONSE_TIME_DEFAULT_SECONDS = 150     # Authored estimate for items with none (QUIZ_TIME_BUDGET / QUIZ_LENGTH)
+RAPID_GUESS_Z = -2.5                    # Standardized log-time residual below this = rapid guess
+RAPID_GUESS_WEIGHT = 0.2                # Share of a full theta step a rapid guess moves
+
+# Selection randomness (one RNG per quiz, from student, quiz number and seed)
+QUIZ_SELECTION_SEED = int(os.environ.get("IIDP_QUIZ_SELECTION_SEED", "0"))
+
+# Deadline-aware generation (stages that overrun fall back to cheaper paths)
+QUIZ_DEADLINE_SECONDS = float(os.environ.get("IIDP_QUIZ_DEADLINE_SECONDS", "0")) or None  # None = no deadline
+QUIZ_DEADLINE_RESERVE_SECONDS = 0.15    # Kept back for in-memory fallbacks and returning
+QUIZ_DEADLINE_THREADS = 32              # Stage threads (overrunning reads finish in the background)
+FALLBACK_QUIZ_POOL_SIZE = 50            # Pre-generated generic quizzes per bank index
+FALLBACK_REFRESH_SECONDS = 300          # How often the fallback state checks for a new bank index
+
+# Optimal test assembly (joint selection of all quiz items)
+QUIZ_TIME_BUDGET_SECONDS = 1500         # 25 minutes for a 10-question quiz
+ASSEMBLY_CANDIDATE_POOL_SIZE = 15       # Most informative candidates kept per topic
+ASSEMBLY_MAX_REPAIR_STEPS = 20          # Swap iterations spent repairing constraints
+DAILY_QUIZ_DIFFICULTY_MIX = {           # (min, max) items per difficulty label
+    "easy": (0, 4),
+    "medium": (2, 10),
+    "hard": (0, 5),
+}
+
+# Parallel mock test forms (full-length JEE Main papers, many statistically parallel forms)
+MOCK_FORM_SECTIONS = {                  # subject -> (MCQ, NVQ) items, in paper order
+    "physics": (20, 10),
+    "chemistry": (20, 10),
+    "mathematics": (20, 10),
+}
+MOCK_MCQ_TYPES = ("mcq_single", "mcq")
+MOCK_NVQ_TYPES = ("numerical", "integer")
+MOCK_FORM_THETA_POINTS = (-1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0)  # Where information curves are matched
+MOCK_FORM_EXPOSURE_SLACK = 1            # Uses an item may have above the least-used item of its cell
+MOCK_FORM_MAX_OVERLAP = 0.25            # Share of a form's items it may share with any other form
+MOCK_FORM_SWAP_PASSES = 2               # Same-cell swap passes refining each form's information curve
+MOCK_TEST_DURATION_SECONDS = 10800      # 3 hours
+MOCK_TEMPLATE_CHUNK_SIZE = 15           # Questions per question_chunks doc (stays under 1MB)
+
+# Shared question bank snapshot (memory-mapped, shared by all worker processes)
+QUESTION_BANK_SNAPSHOT_DIR = os.environ.get("IIDP_QUESTION_BANK_SNAPSHOT_DIR")  # None = per-process load
+SNAPSHOT_VERSION_CHECK_SECONDS = 10     # How often workers look for a newer snapshot
+SNAPSHOT_VERSIONS_KEPT = 3              # Older versions deleted after publishing
+
+# Columnar question bank export (cold-start source, Firestore only for deltas).
+# Relative paths are taken from this module's directory, not the working directory.
+QUESTION_BANK_EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                         os.environ.get("IIDP_QUESTION_BANK_EXPORT_PATH", "question_bank_export.npz"))
+QUESTION_BANK_EXPORT_FORMAT_VERSION = 1
+
+# Question bank change feed (incremental refresh instead of full reloads)
+QUESTION_BANK_CHANGE_FEED = os.environ.get("IIDP_QUESTION_BANK_CHANGE_FEED", "poll")  # "listen", "poll" or "" (off)
+CHANGE_FEED_POLL_SECONDS = 15           # Poll / listener health-check cadence
+CHANGE_FEED_POLL_LIMIT = 500            # More changes than this in one poll = gap, full rescan
+CHANGE_FEED_COUNT_CHECK_SECONDS = 300   # Document-count reconciliation (catches hard deletes)
+CHANGE_FEED_READY_TIMEOUT_SECONDS = 30  # Wait for the listener's initial snapshot
+
+# Item exposure control (stops every similar-theta student getting the same items)
+EXPOSURE_CONTROL_METHOD = "randomesque"  # None, "randomesque" or "sympson_hetter"
+RANDOMESQUE_TOP_K = 3                   # Pick uniformly among the k most informative
+EXPOSURE_TARGET_MAX_RATE = 0.25         # Sympson-Hetter: max share of a topic's selections
+EXPOSURE_COUNTER_SHARDS = 10            # Write shards per item range (spreads concurrent flushes)
+EXPOSURE_ITEM_BUCKETS = 64              # Item ranges the counters are split over (keeps shard docs small)
+EXPOSURE_PARAMETERS_REFRESH_SECONDS = 3600  # How often workers reload published Sympson-Hetter K_i
+EXPOSURE_FLUSH_INTERVAL_SECONDS = 30    # Background flush cadence for pending counts
+
+# Item statistics (check of irt_parameters against answers, drift queues recalibration)
+ITEM_STATS_THETA_EDGES = (-2.0, -1.0, 0.0, 1.0, 2.0)  # Theta bin boundaries (6 bins)
+ITEM_STATS_FLUSH_INTERVAL_SECONDS = 60  # Background flush cadence for pending statistics
+ITEM_STATS_WRITE_BATCH_SIZE = 500       # Firestore batch write limit
+ITEM_DRIFT_MIN_RESPONSES = 200          # Items answered fewer times are never flagged
+ITEM_DRIFT_MIN_BIN_RESPONSES = 20       # Theta bins with fewer answers stay out of the fit test
+ITEM_DRIFT_ALPHA = 0.001                # Significance for a flag (strict: every item is tested nightly)
+
+# Answer ingestion (idempotency keys, per-student ordered worker pool)
+ANSWER_QUEUE_WORKERS = 16               # Worker threads; each student is pinned to one
+ANSWER_QUEUE_MAX_PENDING = 4096         # Queued answers before submit() blocks (burst buffer)
+IDEMPOTENCY_CACHE_TTL_SECONDS = 900     # Recent answer keys answered from memory
+IDEMPOTENCY_CACHE_MAX_KEYS = 100000     # Oldest keys evicted beyond this
+IDEMPOTENCY_KEY_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,200}$")  # Same rule as the backend's response_id
+
+# Theta history replay (bulk recompute after IRT recalibration)
+REPLAY_CHUNK_STUDENTS = 200             # Students per vectorized replay batch
+REPLAY_LOAD_THREADS = 16                # Concurrent response-log reads
+REPLAY_WRITE_BATCH_SIZE = 500           # Firestore batch write limit
+
+# Response log compaction (raw log kept short, older history in rollups)
+RESPONSE_LOG_RETAIN_DAYS = 30           # Raw responses kept; must cover RECENT_QUESTIONS_WINDOW_DAYS
+RESPONSE_COMPACTION_CHUNK_SIZE = 400    # Responses folded per atomic batch (deletes + rollup write)
+REVIEW_CANDIDATES_MAX = 1000            # Rollup review candidates kept (most recently correct first)
+REVIEW_CANDIDATE_MAX_AGE_DAYS = 365     # Candidates not answered correctly for this long are dropped
+RESPONSE_ARCHIVE_PREFIX = "response_archive"  # Cloud Storage prefix for archived raw logs
+
+# Debugging: print Firestore document reads per generated quiz
+QUIZ_DEBUG_READ_COUNTS = False
+
 # Circuit Breaker Configuration (Death Spiral Prevention)
 CIRCUIT_BREAKER_THRESHOLD = 5           # Consecutive failures to trigger
 CIRCUIT_BREAKER_REALTIME_THRESHOLD = 3  # Failures in current quiz
@@ -181,6 +332,284 @@ TOPIC_PREREQUISITE_DEPTH = {
     # ... Map all topics
 }
 
+# ============================================================================
+# STORAGE CLIENT
+# ============================================================================
+# Every engine function takes its client from here. By default that is the
+# firebase_admin Firestore client; load tests and local runs install a
+# stand-in with the same interface via set_firestore_client().
+
+_firestore_client_override = None
+_async_firestore_client_override = None
+
+
+def set_firestore_client(client=None, async_client=None):
+    """
+    Route all engine storage calls to the given clients.
+    
+    Args:
+        client: Object with the firestore.Client interface (None = real Firestore)
+        async_client: Object with the firestore_async client interface
+            (None = real Firestore)
+    """
+    global _firestore_client_override, _async_firestore_client_override
+    _firestore_client_override = client
+    _async_firestore_client_override = async_client
+
+
+def get_firestore_client():
+    """Client for synchronous engine code"""
+    if _firestore_client_override is not None:
+        return _firestore_client_override
+    return firestore.client()
+
+
+def get_async_firestore_client():
+    """Client for the async quiz generation path"""
+    if _async_firestore_client_override is not None:
+        return _async_firestore_client_override
+    return firestore_async.client()
+
+
+# ============================================================================
+# INSTRUMENTATION (TIMING SPANS, COUNTERS, SAMPLING PROFILER)
+# ============================================================================
+# Disabled by default: with no sink configured, span() hands back a shared
+# no-op context manager and count() returns immediately, so instrumented
+# hot paths pay one attribute check. Operational messages (job summaries,
+# degradations, failures) go through event(), which falls back to the "iidp"
+# logger when no sink is configured.
+
+logger = logging.getLogger("iidp")
+
+
+class MetricsSink:
+    """Destination for spans, counters and events (subclass and override)"""
+    
+    def record_span(self, name: str, seconds: float, tags: Dict[str, str]):
+        pass
+    
+    def record_count(self, name: str, value: float, tags: Dict[str, str]):
+        pass
+    
+    def record_event(self, name: str, message: str, level: int, tags: Dict[str, str]):
+        logger.log(level, message)
+
+
+class InMemorySink(MetricsSink):
+    """Keeps every span and counter in memory (tests, notebooks)"""
+    
+    def __init__(self):
+        self.spans = []  # [(name, seconds, tags)]
+        self.counts = {}  # (name, sorted tag items) -> total
+        self.events = []  # [(name, message, level, tags)]
+        self._lock = threading.Lock()
+    
+    def record_span(self, name: str, seconds: float, tags: Dict[str, str]):
+        with self._lock:
+            self.spans.append((name, seconds, tags))
+    
+    def record_count(self, name: str, value: float, tags: Dict[str, str]):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + value
+    
+    def record_event(self, name: str, message: str, level: int, tags: Dict[str, str]):
+        with self._lock:
+            self.events.append((name, message, level, tags))
+    
+    def event_names(self) -> List[str]:
+        return [name for name, _, _, _ in self.events]
+    
+    def span_names(self) -> List[str]:
+        return [name for name, _, _ in self.spans]
+    
+    def total(self, name: str) -> float:
+        """Counter total across all tag combinations"""
+        return sum(v for (n, _), v in self.counts.items() if n == name)
+
+
+class LoggingSink(MetricsSink):
+    """One structured (JSON) log line per span / counter increment / event"""
+    
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger("iidp.metrics")
+    
+    def record_span(self, name: str, seconds: float, tags: Dict[str, str]):
+        self.logger.info(json.dumps({"type": "span", "name": name,
+                                     "ms": round(seconds * 1000, 3), **tags}))
+    
+    def record_count(self, name: str, value: float, tags: Dict[str, str]):
+        self.logger.info(json.dumps({"type": "count", "name": name, "value": value, **tags}))
+    
+    def record_event(self, name: str, message: str, level: int, tags: Dict[str, str]):
+        self.logger.log(level, json.dumps({"type": "event", "name": name,
+                                           "level": logging.getLevelName(level),
+                                           "message": message, **tags}))
+
+
+class PrometheusTextSink(MetricsSink):
+    """Aggregates spans as summaries and counters as totals; render() gives text format"""
+    
+    def __init__(self, prefix: str = "iidp"):
+        self.prefix = prefix
+        self._span_stats = {}  # (name, tags) -> [count, sum_seconds]
+        self._counters = {}  # (metric, tags) -> total
+        self._lock = threading.Lock()
+    
+    def record_span(self, name: str, seconds: float, tags: Dict[str, str]):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            stats = self._span_stats.setdefault(key, [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+    
+    def record_count(self, name: str, value: float, tags: Dict[str, str]):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def record_event(self, name: str, message: str, level: int, tags: Dict[str, str]):
+        self.record_count("events", 1, {"event": name})
+        super().record_event(name, message, level, tags)
+    
+    @staticmethod
+    def _labels(items) -> str:
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+    
+    def _metric_name(self, name: str) -> str:
+        return self.prefix + "_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+    
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            span_metric = f"{self.prefix}_span_seconds"
+            lines.append(f"# TYPE {span_metric} summary")
+            for (name, tags), (count, total) in sorted(self._span_stats.items()):
+                labels = self._labels((("span", name),) + tags)
+                lines.append(f"{span_metric}_count{labels} {count}")
+                lines.append(f"{span_metric}_sum{labels} {total:.6f}")
+            
+            samples_by_metric = {}
+            for (name, tags), total in sorted(self._counters.items()):
+                samples_by_metric.setdefault(self._metric_name(name), []).append((tags, total))
+            for metric, samples in samples_by_metric.items():
+                lines.append(f"# TYPE {metric}_total counter")
+                for tags, total in samples:
+                    lines.append(f"{metric}_total{self._labels(tags)} {total}")
+        
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    """Times a with-block and reports it to the sink"""
+    
+    __slots__ = ("sink", "name", "tags", "start")
+    
+    def __init__(self, sink: MetricsSink, name: str, tags: Dict[str, str]):
+        self.sink = sink
+        self.name = name
+        self.tags = tags
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        tags = self.tags if exc_type is None else {**self.tags, "error": exc_type.__name__}
+        self.sink.record_span(self.name, time.perf_counter() - self.start, tags)
+        return False
+
+
+_NO_OP_SPAN = contextlib.nullcontext()
+
+
+class Instrumentation:
+    """
+    Engine-wide instrumentation surface.
+    
+    - span(name, **tags): time a stage
+    - count(name, value, **tags): per-call counters (document reads/writes, events)
+    - event(name, message, level, **tags): operational messages (job summaries,
+      degradations, failures); logged via the "iidp" logger when no sink is set
+    - profile hook: for a sampled fraction of @instrumented calls, run cProfile
+      and pass (operation, pstats.Stats) to the hook
+    """
+    
+    def __init__(self):
+        self.sink: Optional[MetricsSink] = None
+        self.profile_sample_rate = 0.0
+        self.profile_hook = None
+    
+    def span(self, name: str, **tags):
+        if self.sink is None:
+            return _NO_OP_SPAN
+        return _Span(self.sink, name, tags)
+    
+    def count(self, name: str, value: float = 1, **tags):
+        if self.sink is None:
+            return
+        self.sink.record_count(name, value, tags)
+    
+    def event(self, name: str, message: str, level: int = logging.INFO, **tags):
+        if self.sink is None:
+            logger.log(level, message)
+            return
+        self.sink.record_event(name, message, level, tags)
+
+
+instrument = Instrumentation()
+
+
+def configure_instrumentation(sink: Optional[MetricsSink] = None,
+                              profile_sample_rate: float = 0.0,
+                              profile_hook=None):
+    """
+    Enable (or, with sink=None, disable) instrumentation.
+    
+    Args:
+        sink: InMemorySink, LoggingSink, PrometheusTextSink or any MetricsSink
+        profile_sample_rate: Fraction [0, 1] of instrumented calls to profile
+        profile_hook: Callable(operation_name, pstats.Stats) receiving profiles
+    """
+    instrument.sink = sink
+    instrument.profile_sample_rate = profile_sample_rate if profile_hook else 0.0
+    instrument.profile_hook = profile_hook
+
+
+# cProfile allows one active profiler per interpreter (Python 3.12+ raises
+# ValueError on a second enable), so concurrent sampled calls run unprofiled.
+_profile_lock = threading.Lock()
+
+
+def instrumented(operation: str):
+    """Decorator: top-level span for the call plus sampled profiling"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if instrument.sink is None and instrument.profile_sample_rate == 0.0:
+                return fn(*args, **kwargs)
+            
+            with instrument.span(operation):
+                if (instrument.profile_sample_rate > 0
+                        and random.random() < instrument.profile_sample_rate
+                        and _profile_lock.acquire(blocking=False)):
+                    try:
+                        profiler = cProfile.Profile()
+                        try:
+                            return profiler.runcall(fn, *args, **kwargs)
+                        finally:
+                            instrument.profile_hook(operation, pstats.Stats(profiler))
+                    finally:
+                        _profile_lock.release()
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # ============================================================================
 # CORE IRT FUNCTIONS
 # ============================================================================
@@ -214,6 +643,16 @@ def calculate_probability_3PL(theta: float, difficulty_b: float,
     return max(0.0, min(1.0, probability))
 
 
+def calculate_probability_3PL_array(theta, difficulty_b: np.ndarray,
+                                    discrimination_a: np.ndarray,
+                                    guessing_c: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_probability_3PL (same overflow cut-offs)"""
+    exponent = -discrimination_a * (theta - difficulty_b)
+    P = guessing_c + (1 - guessing_c) / (1 + np.exp(np.clip(exponent, -20.0, 20.0)))
+    P = np.where(exponent > 20, guessing_c, np.where(exponent < -20, 1.0, P))
+    return np.clip(P, 0.0, 1.0)
+
+
 def calculate_fisher_information(theta: float, difficulty_b: float,
                                  discrimination_a: float, guessing_c: float) -> float:
     """
@@ -256,6 +695,104 @@ def calculate_fisher_information(theta: float, difficulty_b: float,
     return information
 
 
+def calculate_fisher_information_array(theta, difficulty_b: np.ndarray,
+                                       discrimination_a: np.ndarray,
+                                       guessing_c: np.ndarray) -> np.ndarray:
+    """
+    Vectorized calculate_fisher_information over arrays of item parameters.
+    
+    Applies the same overflow and P(θ) cut-offs as the scalar version, so
+    results match item for item.
+    
+    Args:
+        theta: Student ability (scalar or array broadcastable to the items)
+        difficulty_b: Array of difficulty parameters
+        discrimination_a: Array of discrimination parameters
+        guessing_c: Array of guessing parameters
+    
+    Returns:
+        Array of Fisher information values
+    """
+    exponent = -discrimination_a * (theta - difficulty_b)
+    safe_exponent = np.clip(exponent, -20.0, 20.0)
+    exp_val = np.exp(safe_exponent)
+    
+    P = guessing_c + (1 - guessing_c) / (1 + exp_val)
+    P = np.where(exponent > 20, guessing_c, np.where(exponent < -20, 1.0, P))
+    P = np.clip(P, 0.0, 1.0)
+    
+    P_prime = discrimination_a * (1 - guessing_c) * exp_val / (1 + exp_val) ** 2
+    Q = 1 - P
+    
+    valid = (np.abs(exponent) <= 20) & (P > 0.01) & (P < 0.99)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        information = (discrimination_a ** 2) * (P_prime ** 2) / (P * Q)
+    
+    return np.where(valid, information, 0.0)
+
+
+THETA_GRID = np.linspace(THETA_MIN, THETA_MAX, int(round((THETA_MAX - THETA_MIN) / THETA_GRID_STEP)) + 1)
+
+
+def build_item_curve_tables(difficulty_b: np.ndarray, discrimination_a: np.ndarray,
+                            guessing_c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Information and 3PL probability of every item at every THETA_GRID point.
+    
+    An item's curves only change when it is recalibrated, so they are
+    computed once per index instead of per candidate per selection.
+    
+    Returns:
+        (information, probability) arrays of shape (items, len(THETA_GRID))
+    """
+    b = np.asarray(difficulty_b, dtype=np.float64)[:, None]
+    a = np.asarray(discrimination_a, dtype=np.float64)[:, None]
+    c = np.asarray(guessing_c, dtype=np.float64)[:, None]
+    return (calculate_fisher_information_array(THETA_GRID, b, a, c),
+            calculate_probability_3PL_array(THETA_GRID, b, a, c))
+
+
+def theta_grid_cell(theta) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    THETA_GRID cell of theta (clamped to the grid).
+    
+    Returns:
+        (lower, weight): index of the cell's lower grid point and theta's
+        fractional position in the cell
+    """
+    position = (np.clip(theta, THETA_MIN, THETA_MAX) - THETA_MIN) / THETA_GRID_STEP
+    lower = np.minimum(np.floor(position).astype(np.int64), len(THETA_GRID) - 2)
+    return lower, position - lower
+
+
+def interpolate_item_curves(table: np.ndarray, rows, theta) -> np.ndarray:
+    """
+    Look up rows of a curve table at theta (scalar or one value per row).
+    
+    Linear interpolation between the two neighbouring grid points; theta is
+    clamped to the grid.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    lower, weight = theta_grid_cell(theta)
+    return table[rows, lower] * (1 - weight) + table[rows, lower + 1] * weight
+
+
+def information_cutoff_cells(information_table: np.ndarray) -> np.ndarray:
+    """
+    Grid cells, per item, that an information cut-off falls inside.
+    
+    Information drops to 0 where P(θ) leaves (0.01, 0.99), so across such a
+    cell linear interpolation blends a live value with the cut-off zero and
+    can be off by most of the item's information (0.1-0.2 for a > 1).
+    fisher_information evaluates these cells exactly instead.
+    
+    Returns:
+        Boolean array of shape (items, len(THETA_GRID) - 1)
+    """
+    zero = information_table == 0
+    return zero[:, :-1] != zero[:, 1:]
+
+
 def bound_theta(theta: float) -> float:
     """Enforce hard bounds at [-3.0, +3.0]"""
     return max(THETA_MIN, min(THETA_MAX, theta))
@@ -346,6 +883,7 @@ def calculate_initial_SE(num_questions: int, accuracy: float) -> float:
     return min(SE_CEILING, max(SE_FLOOR, SE))
 
 
+@instrumented("process_initial_assessment")
 def process_initial_assessment(student_id: str, responses: List[Dict]) -> Dict:
     """
     Process the 30-question initial assessment to calculate initial theta per topic.
@@ -358,48 +896,88 @@ def process_initial_assessment(student_id: str, responses: List[Dict]) -> Dict:
         student_profile: Dictionary with theta estimates per topic
     """
     # Get question details from Firebase (would be actual DB call)
-    db = firestore.client()
+    db = get_firestore_client()
     
     # Group responses by topic
     topic_responses = {}
-    for response in responses:
-        # Fetch question to get topic
-        question_ref = db.collection('questions').document(response['question_id'])
-        question_data = question_ref.get().to_dict()
-        topic = question_data['topic']
-        
-        if topic not in topic_responses:
-            topic_responses[topic] = []
-        topic_responses[topic].append(response)
+    with instrument.span("process_initial_assessment.question_lookups"):
+        for response in responses:
+            # Fetch question to get topic
+            question_ref = db.collection('questions').document(response['question_id'])
+            question_data = question_ref.get().to_dict()
+            topic = question_data['topic']
+            
+            if topic not in topic_responses:
+                topic_responses[topic] = []
+            topic_responses[topic].append(response)
+    instrument.count("firestore.reads", len(responses), operation="process_initial_assessment")
     
     # Calculate theta per topic
     theta_estimates = {}
     
     for topic, topic_questions in topic_responses.items():
         correct_count = sum(1 for q in topic_questions if q['is_correct'])
-        total_count = len(topic_questions)
-        accuracy = correct_count / total_count if total_count > 0 else 0.0
-        
-        # Map accuracy to theta
-        initial_theta = accuracy_to_theta_mapping(accuracy, total_count)
-        
-        # Calculate standard error
-        standard_error = calculate_initial_SE(total_count, accuracy)
-        
-        theta_estimates[topic] = {
-            "theta": bound_theta(initial_theta),
-            "percentile": theta_to_percentile(initial_theta),
-            "confidence_SE": standard_error,
-            "attempts": total_count,
-            "accuracy": accuracy,
-            "last_updated": datetime.utcnow().isoformat()
-        }
+        theta_estimates[topic] = build_initial_topic_estimate(correct_count, len(topic_questions))
+    
+    student_profile = build_initial_profile(student_id, theta_estimates)
+    
+    # Save to Firebase
+    with instrument.span("process_initial_assessment.profile_write"):
+        db.collection('students').document(student_id).set(student_profile)
+    instrument.count("firestore.writes", 1, operation="process_initial_assessment")
+    
+    return student_profile
+
+
+def build_initial_topic_estimate(correct_count: int, total_count: int) -> Dict:
+    """
+    Initial theta estimate for one topic from its assessment answer counts.
+    
+    Args:
+        correct_count: Correct answers in the topic
+        total_count: Answers in the topic
+    
+    Returns:
+        theta_by_topic entry: {theta, percentile, confidence_SE, attempts,
+        accuracy, last_updated}
+    """
+    accuracy = correct_count / total_count if total_count > 0 else 0.0
+    
+    # Map accuracy to theta
+    initial_theta = accuracy_to_theta_mapping(accuracy, total_count)
+    
+    # Calculate standard error
+    standard_error = calculate_initial_SE(total_count, accuracy)
+    
+    return {
+        "theta": bound_theta(initial_theta),
+        "percentile": theta_to_percentile(initial_theta),
+        "confidence_SE": standard_error,
+        "attempts": total_count,
+        "accuracy": accuracy,
+        "last_updated": datetime.utcnow().isoformat()
+    }
+
+
+def build_initial_profile(student_id: str, theta_estimates: Dict) -> Dict:
+    """
+    Student profile written at the end of the initial assessment.
+    
+    Shared by every assessment scoring path so they all produce the same
+    profile shape.
     
+    Args:
+        student_id: Unique student identifier
+        theta_estimates: Dict of {topic: {theta, percentile, confidence_SE,
+                         attempts, accuracy, last_updated}}
+    
+    Returns:
+        student_profile: Dictionary with theta estimates per topic
+    """
     # Calculate overall theta (weighted by JEE importance)
     overall_theta = calculate_weighted_overall_theta(theta_estimates)
     
-    # Build student profile
-    student_profile = {
+    return {
         "student_id": student_id,
         "theta_by_topic": theta_estimates,
         "overall_theta": overall_theta,
@@ -409,17 +987,13 @@ def process_initial_assessment(student_id: str, responses: List[Dict]) -> Dict:
         "current_day": 0,  # Analytics only: days since assessment
         "learning_phase": "exploration",
         "phase_switched_at_quiz": None,
-        "total_questions_solved": len(responses),
-        "topic_attempt_counts": {topic: len(qs) for topic, qs in topic_responses.items()},
+        "total_questions_solved": sum(v["attempts"] for v in theta_estimates.values()),
+        "topic_attempt_counts": {topic: v["attempts"] for topic, v in theta_estimates.items()},
         "subject_balance": calculate_subject_balance_initial(theta_estimates),
         "topics_explored": len(theta_estimates),
-        "topics_confident": sum(1 for v in theta_estimates.values() if v["attempts"] >= 2)
+        "topics_confident": sum(1 for v in theta_estimates.values() if v["attempts"] >= 2),
+        "recent_questions_by_day": {}  # Filled by update_theta_after_response
     }
-    
-    # Save to Firebase
-    db.collection('students').document(student_id).set(student_profile)
-    
-    return student_profile
 
 
 def calculate_weighted_overall_theta(theta_estimates: Dict) -> float:
@@ -479,73 +1053,602 @@ def get_subject_from_topic(topic: str) -> str:
         return "unknown"
 
 # ============================================================================
-# THETA UPDATE AFTER EACH QUESTION
+# ADAPTIVE INITIAL ASSESSMENT (CAT WITH EARLY STOPPING)
 # ============================================================================
+# Alternative to the fixed 30-question form. Items come from the in-memory
+# question bank index, so choosing the next item reads nothing. Physics,
+# chemistry and mathematics each keep an EAP (expected a posteriori) ability
+# estimate over THETA_GRID. The next item goes to the running subject with
+# the fewest answers. It is that subject's most informative unanswered item
+# at its current estimate, taken from a topic the subject has not covered yet
+# while any remain. A subject stops once its posterior SD is below
+# CAT_SE_TARGET, or at CAT_MAX_QUESTIONS_PER_SUBJECT.
+#
+# Per-topic thetas (the profile shape process_initial_assessment writes) are
+# EAP estimates from the topic's own answers, with a prior centred on the
+# subject estimate. Scoring reuses the index's probability table, so the
+# finished assessment costs a single profile write.
 
-def update_theta_after_response(student_id: str, question_id: str, 
-                                is_correct: bool, time_taken: int) -> float:
+ASSESSMENT_SUBJECTS = ("physics", "chemistry", "mathematics")
+
+
+def eap_estimate(probabilities: np.ndarray, correct: np.ndarray,
+                 prior_mean: float = 0.0, prior_sd: float = CAT_PRIOR_SD) -> Tuple[float, float]:
     """
-    Update student's theta for the relevant topic after answering a question.
+    EAP theta and posterior SD on THETA_GRID.
     
     Args:
-        student_id: Unique student identifier
-        question_id: Question that was answered
-        is_correct: Whether answer was correct
-        time_taken: Time spent in seconds
+        probabilities: (answered items, len(THETA_GRID)) P(correct) of each
+                       item at every grid point (rows of a probability table)
+        correct: 1.0 / 0.0 per answered item
+        prior_mean: Normal prior mean
+        prior_sd: Normal prior SD
     
     Returns:
-        updated_theta: New theta value for the topic
+        (theta, posterior SD)
+    """
+    log_posterior = -0.5 * ((THETA_GRID - prior_mean) / prior_sd) ** 2
+    if len(correct) > 0:
+        p = np.clip(probabilities, 1e-9, 1 - 1e-9)
+        log_posterior = log_posterior + correct @ np.log(p) + (1 - correct) @ np.log1p(-p)
+    
+    weights = np.exp(log_posterior - log_posterior.max())
+    weights /= weights.sum()
+    theta = float(weights @ THETA_GRID)
+    return theta, float(np.sqrt(weights @ (THETA_GRID - theta) ** 2))
+
+
+class AdaptiveAssessment:
     """
-    db = firestore.client()
+    One student's adaptive initial assessment.
     
-    # Load question metadata
-    question_ref = db.collection('questions').document(question_id)
-    question_data = question_ref.get().to_dict()
+    The caller serves next_question(), passes each answer to
+    record_response(), and calls finalize() once next_question() returns None.
+    The whole state is the response list. Rebuild it with
+    AdaptiveAssessment(student_id, responses=...) to resume on another worker.
+    """
     
-    topic = question_data['topic']
-    irt_params = question_data['irt_parameters']
-    difficulty_b = irt_params['difficulty_b']
-    discrimination_a = irt_params['discrimination_a']
-    guessing_c = irt_params['guessing_c']
+    def __init__(self, student_id: str, index: Optional["QuestionBankIndex"] = None,
+                 responses: Optional[List[Dict]] = None):
+        self.student_id = student_id
+        self.index = index if index is not None else get_question_bank_index()
+        self.responses: List[Dict] = []
+        
+        self._topics = np.asarray(self.index.topics)
+        subjects = np.asarray(self.index.subjects)
+        self._subject_rows = {subject: np.flatnonzero(subjects == subject)
+                              for subject in ASSESSMENT_SUBJECTS}
+        self._answered_rows: Dict[str, List[int]] = {subject: [] for subject in ASSESSMENT_SUBJECTS}
+        self._correct: Dict[str, List[float]] = {subject: [] for subject in ASSESSMENT_SUBJECTS}
+        self._estimates = {subject: (0.0, CAT_PRIOR_SD) for subject in ASSESSMENT_SUBJECTS}
+        
+        for response in responses or []:
+            self.record_response(response['question_id'], response['is_correct'],
+                                 response.get('time_taken', 0))
+    
+    def subject_estimate(self, subject: str) -> Tuple[float, float]:
+        """Current (theta, posterior SD) for a subject"""
+        return self._estimates[subject]
+    
+    def subject_complete(self, subject: str) -> bool:
+        """Whether the subject has met its stopping rule or run out of items"""
+        answered = len(self._answered_rows[subject])
+        if answered >= CAT_MAX_QUESTIONS_PER_SUBJECT or answered >= len(self._subject_rows[subject]):
+            return True
+        return answered >= CAT_MIN_QUESTIONS_PER_SUBJECT and \
+            self._estimates[subject][1] < CAT_SE_TARGET
+    
+    def is_complete(self) -> bool:
+        """No subject still running, or ASSESSMENT_MAX_QUESTIONS answered"""
+        return self._next_subject() is None
+    
+    def _next_subject(self) -> Optional[str]:
+        if len(self.responses) >= ASSESSMENT_MAX_QUESTIONS:
+            return None
+        running = [s for s in ASSESSMENT_SUBJECTS if not self.subject_complete(s)]
+        if not running:
+            return None
+        return min(running, key=lambda s: (len(self._answered_rows[s]), -self._estimates[s][1]))
+    
+    def next_question(self) -> Optional[Dict]:
+        """
+        Most informative unanswered item for the next subject.
+        
+        Returns:
+            Question document, or None when the assessment is complete
+        """
+        subject = self._next_subject()
+        if subject is None:
+            return None
+        
+        rows = self._subject_rows[subject]
+        rows = rows[~np.isin(rows, self._answered_rows[subject])]
+        
+        # Cover new topics first: every answered topic gets a profile theta
+        answered_topics = [r['topic'] for r in self.responses if r['subject'] == subject]
+        uncovered = rows[~np.isin(self._topics[rows], answered_topics)]
+        if len(uncovered) > 0:
+            rows = uncovered
+        
+        information = self.index.fisher_information(rows, self._estimates[subject][0])
+        return self.index.get_document(int(rows[int(np.argmax(information))]))
     
-    # Load current student theta
-    student_ref = db.collection('students').document(student_id)
-    student_data = student_ref.get().to_dict()
+    def record_response(self, question_id: str, is_correct: bool, time_taken: int = 0) -> Dict:
+        """
+        Add an answer and update its subject's estimate.
+        
+        Raises:
+            ValueError: question_id is not in the question bank index
+        
+        Returns:
+            The stored response ({question_id, topic, subject, is_correct, time_taken})
+        """
+        row = self.index.row_of(question_id)
+        if row is None:
+            raise ValueError(f"Question {question_id} is not in the question bank index")
+        
+        subject = str(self.index.subjects[row])
+        response = {
+            "question_id": question_id,
+            "topic": str(self._topics[row]),
+            "subject": subject,
+            "is_correct": bool(is_correct),
+            "time_taken": time_taken
+        }
+        self.responses.append(response)
+        
+        if subject in self._estimates:
+            self._answered_rows[subject].append(row)
+            self._correct[subject].append(1.0 if is_correct else 0.0)
+            probability_table = self.index.curve_tables()[1]
+            self._estimates[subject] = eap_estimate(
+                probability_table[self._answered_rows[subject]],
+                np.array(self._correct[subject])
+            )
+        
+        return response
+    
+    def topic_estimates(self) -> Dict[str, Dict]:
+        """Per-topic theta estimates in the theta_by_topic profile shape"""
+        probability_table = self.index.curve_tables()[1]
+        topic_responses = {}
+        for response in self.responses:
+            topic_responses.setdefault(response['topic'], []).append(response)
+        
+        theta_estimates = {}
+        for topic, responses in topic_responses.items():
+            subject_theta, subject_sd = self._estimates.get(responses[0]['subject'],
+                                                            (0.0, CAT_PRIOR_SD))
+            correct = np.array([1.0 if r['is_correct'] else 0.0 for r in responses])
+            rows = [self.index.row_of(r['question_id']) for r in responses]
+            
+            # Subject uncertainty widens the topic prior
+            theta, posterior_sd = eap_estimate(
+                probability_table[rows], correct,
+                prior_mean=subject_theta,
+                prior_sd=math.sqrt(CAT_TOPIC_PRIOR_SD ** 2 + subject_sd ** 2)
+            )
+            
+            theta_estimates[topic] = {
+                "theta": bound_theta(theta),
+                "percentile": theta_to_percentile(theta),
+                "confidence_SE": min(SE_CEILING, max(SE_FLOOR, posterior_sd)),
+                "attempts": len(responses),
+                "accuracy": float(correct.mean()),
+                "last_updated": datetime.utcnow().isoformat()
+            }
+        
+        return theta_estimates
     
-    # Get topic theta (or initialize if new)
-    if topic not in student_data['theta_by_topic']:
-        topic_theta = get_theta_for_untested_topic(student_id, topic, student_data)
-    else:
-        topic_theta = student_data['theta_by_topic'][topic]
+    def finalize(self) -> Dict:
+        """Write and return the student profile (one write)"""
+        return score_adaptive_assessment(self.student_id, self.responses, index=self.index,
+                                         assessment=self)
+
+
+def score_adaptive_assessment(student_id: str, responses: List[Dict],
+                              index: Optional["QuestionBankIndex"] = None,
+                              assessment: Optional[AdaptiveAssessment] = None) -> Dict:
+    """
+    Batch-score an assessment with EAP and save the profile.
     
-    current_theta = topic_theta['theta']
-    current_SE = topic_theta['confidence_SE']
-    attempts = topic_theta['attempts']
+    Takes the same responses as process_initial_assessment, whether from a
+    fixed or an adaptive form, and writes the same profile shape. Item
+    parameters come from the question bank index instead of one document
+    read per response.
     
-    # Calculate expected probability
-    P_correct = calculate_probability_3PL(current_theta, difficulty_b, 
-                                         discrimination_a, guessing_c)
+    Args:
+        student_id: Unique student identifier
+        responses: List of response dicts with {question_id, is_correct, time_taken}
+        index: Question bank index (defaults to the process-wide index)
+        assessment: Already-built state for these responses (skips replaying them)
     
-    # Learning rate (decreases with experience)
-    learning_rate = BASE_LEARNING_RATE / (1 + LEARNING_RATE_DECAY * attempts)
+    Returns:
+        student_profile: Dictionary with theta estimates per topic
+    """
+    if assessment is None:
+        assessment = AdaptiveAssessment(student_id, index=index, responses=responses)
     
-    # Calculate theta update
-    if is_correct:
-        delta = learning_rate * (1 - P_correct)
-    else:
-        delta = -learning_rate * P_correct
+    student_profile = build_initial_profile(student_id, assessment.topic_estimates())
+    student_profile["assessment_mode"] = "adaptive"
     
-    # Apply update with bounds
-    new_theta = bound_theta(current_theta + delta)
+    with instrument.span("score_adaptive_assessment.profile_write"):
+        get_firestore_client().collection('students').document(student_id).set(student_profile)
+    instrument.count("firestore.writes", 1, operation="score_adaptive_assessment")
     
-    # Update standard error (decreases with more data)
-    new_SE = current_SE * SE_REDUCTION_RATE
-    new_SE = max(SE_FLOOR, new_SE)
+    return student_profile
+
+# ============================================================================
+# STREAMING INITIAL ASSESSMENT (PER-ANSWER AGGREGATION)
+# ============================================================================
+# Incremental alternative to process_initial_assessment. Each answer updates
+# per-topic [attempts, correct] counts in memory and writes one merge to
+# assessment_progress/{student_id}. That write carries Increments for the
+# counts, the question ID, and the topic's provisional theta. Finalization
+# builds the profile from the counts in O(topics) and commits it together
+# with deleting the progress doc, as one batch. The "assessment complete"
+# screen waits on that single write instead of 30 question lookups.
+#
+# The in-process aggregate is loaded from the progress doc the first time a
+# worker sees the student, so a resumed assessment keeps its earlier answers.
+# Aggregates idle for ASSESSMENT_IDLE_SECONDS are evicted (an abandoned
+# assessment would otherwise stay in memory for the life of the worker).
+#
+# Each progress write is conditional on the update_time this worker last saw
+# (create() for the first answer). A write that loses the race - another
+# worker's answer, or a retried answer whose first attempt did land -
+# reloads the doc and re-checks question_ids, so the Increments are applied
+# exactly once per question. If answers for a student reach several
+# workers, pass expected_responses to finalize: a count mismatch triggers a
+# reload from the progress doc.
+
+class StreamingAssessment:
+    """
+    Running aggregate of one student's initial assessment.
     
-    # Update in database
-    updated_topic_theta = {
-        "theta": new_theta,
-        "percentile": theta_to_percentile(new_theta),
+    topic_counts holds [attempts, correct] per topic. question_ids makes a
+    retried answer a no-op. update_time is the progress doc's last known
+    update time (None = no doc yet), the precondition for the next write.
+    """
+    
+    def __init__(self, student_id: str, topic_counts: Optional[Dict[str, List[int]]] = None,
+                 question_ids: Optional[Collection[str]] = None, update_time=None):
+        self.student_id = student_id
+        self.topic_counts: Dict[str, List[int]] = {topic: list(counts)
+                                                   for topic, counts in (topic_counts or {}).items()}
+        self.question_ids = set(question_ids or [])
+        self.update_time = update_time
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def from_document(cls, student_id: str, data: Optional[Dict],
+                      update_time=None) -> "StreamingAssessment":
+        """Rebuild from an assessment_progress document (None = nothing answered yet)"""
+        data = data or {}
+        return cls(
+            student_id,
+            {topic: [counts.get('attempts', 0), counts.get('correct', 0)]
+             for topic, counts in data.get('topic_counts', {}).items()},
+            data.get('question_ids', []),
+            update_time
+        )
+    
+    def reload(self):
+        """Replace the aggregate with the progress doc's current contents (caller holds lock)"""
+        snapshot = _assessment_progress_ref(self.student_id).get()
+        instrument.count("firestore.reads", 1, operation="get_streaming_assessment")
+        loaded = StreamingAssessment.from_document(self.student_id, snapshot.to_dict(),
+                                                   snapshot.update_time if snapshot.exists else None)
+        self.topic_counts = loaded.topic_counts
+        self.question_ids = loaded.question_ids
+        self.update_time = loaded.update_time
+    
+    def record(self, question_id: str, topic: str, is_correct: bool) -> bool:
+        """Count an answer; False if this question was already counted"""
+        if question_id in self.question_ids:
+            return False
+        self.question_ids.add(question_id)
+        counts = self.topic_counts.setdefault(topic, [0, 0])
+        counts[0] += 1
+        counts[1] += 1 if is_correct else 0
+        return True
+    
+    def discard(self, question_id: str, topic: str, is_correct: bool):
+        """Undo record() (its progress write failed)"""
+        self.question_ids.discard(question_id)
+        counts = self.topic_counts[topic]
+        counts[0] -= 1
+        counts[1] -= 1 if is_correct else 0
+        if counts[0] == 0:
+            del self.topic_counts[topic]
+    
+    def provisional_estimate(self, topic: str) -> Dict:
+        """Current theta_by_topic entry for a topic"""
+        attempts, correct = self.topic_counts.get(topic, (0, 0))
+        return build_initial_topic_estimate(correct, attempts)
+    
+    def theta_estimates(self) -> Dict[str, Dict]:
+        """theta_by_topic for every answered topic (O(topics))"""
+        return {topic: self.provisional_estimate(topic) for topic in self.topic_counts}
+
+
+_streaming_assessments: Dict[str, StreamingAssessment] = {}
+_streaming_assessments_lock = threading.Lock()
+_streaming_assessments_swept_at = time.monotonic()
+
+
+def _assessment_progress_ref(student_id: str):
+    return get_firestore_client().collection('assessment_progress').document(student_id)
+
+
+def get_streaming_assessment(student_id: str, reload: bool = False) -> StreamingAssessment:
+    """
+    This process's aggregate for a student's assessment.
+    
+    Args:
+        student_id: Unique student identifier
+        reload: Re-read the progress doc even if the aggregate is cached
+    
+    Returns:
+        StreamingAssessment (loaded from assessment_progress on first use)
+    """
+    with _streaming_assessments_lock:
+        assessment = _streaming_assessments.get(student_id)
+        if assessment is None:
+            _evict_idle_assessments()
+            assessment = StreamingAssessment(student_id)
+            _streaming_assessments[student_id] = assessment
+            reload = True
+        assessment.last_used = time.monotonic()
+    
+    if reload:
+        with assessment.lock:
+            assessment.reload()
+    return assessment
+
+
+def _evict_idle_assessments():
+    """Drop aggregates idle for ASSESSMENT_IDLE_SECONDS (caller holds the registry lock)"""
+    global _streaming_assessments_swept_at
+    
+    now = time.monotonic()
+    if now - _streaming_assessments_swept_at < ASSESSMENT_IDLE_SECONDS / 10:
+        return
+    _streaming_assessments_swept_at = now
+    
+    for student_id in [student_id for student_id, assessment in _streaming_assessments.items()
+                       if now - assessment.last_used > ASSESSMENT_IDLE_SECONDS]:
+        del _streaming_assessments[student_id]
+
+
+def _assessment_question_topic(question_id: str) -> str:
+    """Topic of a question: from the in-memory bank index, else one document read"""
+    index = get_question_bank_index()
+    row = index.row_of(question_id)
+    if row is not None:
+        return str(index.topics[row])
+    
+    question_data = get_firestore_client().collection('questions').document(question_id).get().to_dict()
+    instrument.count("firestore.reads", 1, operation="record_assessment_answer")
+    return question_data['topic']
+
+
+@instrumented("record_assessment_answer")
+def record_assessment_answer(student_id: str, question_id: str, is_correct: bool,
+                             time_taken: int, topic: Optional[str] = None) -> Dict:
+    """
+    Ingest one initial-assessment answer as it arrives.
+    
+    Args:
+        student_id: Unique student identifier
+        question_id: Question answered
+        is_correct: Whether answer was correct
+        time_taken: Seconds taken to answer
+        topic: Question's topic if the caller has it (saves the lookup)
+    
+    Returns:
+        Provisional theta_by_topic entry for the question's topic
+    """
+    if topic is None:
+        topic = _assessment_question_topic(question_id)
+    
+    assessment = get_streaming_assessment(student_id)
+    with assessment.lock:
+        for attempt in range(ASSESSMENT_WRITE_ATTEMPTS):
+            if not assessment.record(question_id, topic, is_correct):
+                return assessment.provisional_estimate(topic)
+            estimate = assessment.provisional_estimate(topic)
+            
+            try:
+                _write_assessment_progress(assessment, question_id, topic, is_correct,
+                                           time_taken, estimate['theta'])
+                break
+            except (AlreadyExists, FailedPrecondition):
+                # The doc moved on since we last saw it: reload, then re-check
+                # whether this question is already counted
+                assessment.reload()
+                if attempt == ASSESSMENT_WRITE_ATTEMPTS - 1:
+                    raise
+            except Exception:
+                assessment.discard(question_id, topic, is_correct)
+                raise
+    instrument.count("firestore.writes", 1, operation="record_assessment_answer")
+    
+    return estimate
+
+
+def _write_assessment_progress(assessment: StreamingAssessment, question_id: str, topic: str,
+                               is_correct: bool, time_taken: int, provisional_theta: float):
+    """One answer's progress write, conditional on the doc being as last seen"""
+    progress_ref = _assessment_progress_ref(assessment.student_id)
+    
+    if assessment.update_time is None:
+        result = progress_ref.create({
+            'student_id': assessment.student_id,
+            'question_ids': [question_id],
+            'topic_counts': {topic: {'attempts': 1, 'correct': 1 if is_correct else 0}},
+            'provisional_theta': {topic: provisional_theta},
+            'time_taken_total': time_taken,
+            'updated_at': datetime.utcnow().isoformat()
+        })
+    else:
+        result = progress_ref.update({
+            'question_ids': firestore.ArrayUnion([question_id]),
+            f'topic_counts.{topic}.attempts': firestore.Increment(1),
+            f'topic_counts.{topic}.correct': firestore.Increment(1 if is_correct else 0),
+            f'provisional_theta.{topic}': provisional_theta,
+            'time_taken_total': firestore.Increment(time_taken),
+            'updated_at': datetime.utcnow().isoformat()
+        }, option=get_firestore_client().write_option(last_update_time=assessment.update_time))
+    
+    assessment.update_time = result.update_time
+
+
+@instrumented("finalize_streaming_assessment")
+def finalize_streaming_assessment(student_id: str,
+                                  expected_responses: Optional[int] = None) -> Dict:
+    """
+    Build and save the profile from the aggregated answers.
+    
+    Args:
+        student_id: Unique student identifier
+        expected_responses: Answers the client submitted; a mismatch with
+                            this process's count reloads the progress doc
+    
+    Returns:
+        student_profile: Same shape as process_initial_assessment
+    """
+    assessment = get_streaming_assessment(student_id)
+    with assessment.lock:
+        if expected_responses is not None and len(assessment.question_ids) != expected_responses:
+            assessment.reload()
+        student_profile = build_initial_profile(student_id, assessment.theta_estimates())
+    
+    # Profile write and progress cleanup in one commit
+    db = get_firestore_client()
+    batch = db.batch()
+    batch.set(db.collection('students').document(student_id), student_profile)
+    batch.delete(_assessment_progress_ref(student_id))
+    batch.commit()
+    instrument.count("firestore.writes", 2, operation="finalize_streaming_assessment")
+    
+    with _streaming_assessments_lock:
+        _streaming_assessments.pop(student_id, None)
+    
+    return student_profile
+
+# ============================================================================
+# THETA UPDATE AFTER EACH QUESTION
+# ============================================================================
+
+@instrumented("update_theta_after_response")
+def update_theta_after_response(student_id: str, question_id: str, 
+                                is_correct: bool, time_taken: int,
+                                idempotency_key: Optional[str] = None) -> float:
+    """
+    Update student's theta for the relevant topic after answering a question.
+    
+    The profile update and the response log entry commit in one batch. With
+    an idempotency_key the entry is created under that ID, so a retried
+    answer is recognised (from the in-memory key cache, else by the create
+    failing) and returns the original result without updating again. The
+    store-side check only lasts as long as the response entry: once it is
+    compacted (after RESPONSE_LOG_RETAIN_DAYS) a retry with the same key is
+    applied as a new answer, so clients must not retry older answers.
+    
+    With a published response-time model the student's speed is updated
+    from time_taken, and with RESPONSE_TIME_SCORING on a rapid guess moves
+    theta and SE by only RAPID_GUESS_WEIGHT of a normal step.
+    
+    Args:
+        student_id: Unique student identifier
+        question_id: Question that was answered
+        is_correct: Whether answer was correct
+        time_taken: Time spent in seconds
+        idempotency_key: Client-generated ID of this answer (same on retries)
+    
+    Returns:
+        updated_theta: New theta value for the topic
+    """
+    db = get_firestore_client()
+    
+    dedupe = get_idempotency_cache()
+    if idempotency_key is not None:
+        validate_idempotency_key(idempotency_key)
+        cached_theta = dedupe.get(student_id, idempotency_key)
+        if cached_theta is not None:
+            instrument.count("answers.duplicate", source="cache")
+            return cached_theta
+    
+    # Load question metadata
+    with instrument.span("update_theta_after_response.load_question"):
+        question_ref = db.collection('questions').document(question_id)
+        question_data = question_ref.get().to_dict()
+    
+    topic = question_data['topic']
+    irt_params = question_data['irt_parameters']
+    difficulty_b = irt_params['difficulty_b']
+    discrimination_a = irt_params['discrimination_a']
+    guessing_c = irt_params['guessing_c']
+    
+    # Load current student theta
+    with instrument.span("update_theta_after_response.load_student"):
+        student_ref = db.collection('students').document(student_id)
+        student_data = student_ref.get().to_dict()
+    instrument.count("firestore.reads", 2, operation="update_theta_after_response")
+    
+    # Get topic theta (or initialize if new)
+    if topic not in student_data['theta_by_topic']:
+        topic_theta = get_theta_for_untested_topic(student_id, topic, student_data)
+    else:
+        topic_theta = student_data['theta_by_topic'][topic]
+    
+    current_theta = topic_theta['theta']
+    current_SE = topic_theta['confidence_SE']
+    attempts = topic_theta['attempts']
+    
+    # Calculate expected probability
+    P_correct = calculate_probability_3PL(current_theta, difficulty_b, 
+                                         discrimination_a, guessing_c)
+    
+    # Learning rate (decreases with experience)
+    learning_rate = BASE_LEARNING_RATE / (1 + LEARNING_RATE_DECAY * attempts)
+    
+    # Response time: rapid guesses carry little evidence; other answers update speed
+    time_weight = 1.0
+    residual_z = None
+    speed_state = None
+    time_model = get_response_time_model()
+    if time_model is not None and time_taken and time_taken > 0:
+        beta, alpha = time_model.item_parameters(question_id, question_data.get('time_estimate'))
+        speed = (student_data.get('response_speed') or {}).get('tau', 0.0)
+        residual_z = time_residual(time_taken, beta, alpha, speed)
+        if residual_z < RAPID_GUESS_Z:
+            if RESPONSE_TIME_SCORING:
+                time_weight = RAPID_GUESS_WEIGHT
+        else:
+            speed_state = update_speed_estimate(student_data.get('response_speed'), time_taken,
+                                                beta, alpha, time_model.speed_sd)
+    
+    # Calculate theta update
+    if is_correct:
+        delta = learning_rate * (1 - P_correct)
+    else:
+        delta = -learning_rate * P_correct
+    delta *= time_weight
+    
+    # Apply update with bounds
+    new_theta = bound_theta(current_theta + delta)
+    
+    # Update standard error (decreases with more data)
+    new_SE = current_SE * SE_REDUCTION_RATE ** time_weight
+    new_SE = max(SE_FLOOR, new_SE)
+    
+    # Update in database
+    updated_topic_theta = {
+        "theta": new_theta,
+        "percentile": theta_to_percentile(new_theta),
         "confidence_SE": new_SE,
         "attempts": attempts + 1,
         "last_updated": datetime.utcnow().isoformat()
@@ -559,15 +1662,30 @@ def update_theta_after_response(student_id: str, question_id: str,
     else:
         updated_topic_theta['accuracy'] = 1.0 if is_correct else 0.0
     
-    student_ref.update({
+    # Record the question in today's recency bucket and drop aged-out buckets
+    recent_buckets = student_data.get('recent_questions_by_day', {})
+    profile_update = {
         f'theta_by_topic.{topic}': updated_topic_theta,
+        # Counters ride the answer's own profile write (combining them elsewhere saves none)
         f'topic_attempt_counts.{topic}': firestore.Increment(1),
-        'total_questions_solved': firestore.Increment(1)
-    })
-    
-    # Log response
+        'total_questions_solved': firestore.Increment(1),
+        f'recent_questions_by_day.{recent_question_day_key(datetime.utcnow())}':
+            firestore.ArrayUnion([question_id])
+    }
+    for day_key in expired_recent_question_days(recent_buckets):
+        profile_update[f'recent_questions_by_day.{day_key}'] = firestore.DELETE_FIELD
+    if 'recent_questions_by_day' not in student_data:
+        profile_update['recent_questions_tracked_since'] = datetime.utcnow().isoformat()
+    if speed_state is not None:
+        profile_update['response_speed'] = speed_state
+    
+    # Log response (keyed by the idempotency key when there is one)
+    responses_ref = db.collection('student_responses').document(student_id).collection('responses')
+    response_ref = responses_ref.document(idempotency_key) if idempotency_key is not None \
+        else responses_ref.document()
     response_data = {
-        "response_id": f"resp_{student_id}_{question_id}_{int(datetime.utcnow().timestamp())}",
+        "response_id": response_ref.id,
+        "idempotency_key": idempotency_key,
         "student_id": student_id,
         "question_id": question_id,
         "topic": topic,
@@ -578,10 +1696,35 @@ def update_theta_after_response(student_id: str, question_id: str,
         "theta_delta": delta,
         "confidence_SE_before": current_SE,
         "confidence_SE_after": new_SE,
+        "time_residual_z": residual_z,
+        "time_weight": time_weight,
         "answered_at": datetime.utcnow().isoformat()
     }
     
-    db.collection('student_responses').document(student_id).collection('responses').add(response_data)
+    # Profile update and log entry together: a duplicate key fails the create
+    # and leaves the profile untouched
+    batch = db.batch()
+    batch.update(student_ref, profile_update)
+    batch.create(response_ref, response_data)
+    try:
+        with instrument.span("update_theta_after_response.commit"):
+            batch.commit()
+    except AlreadyExists:
+        original_theta = response_ref.get().to_dict()['theta_after']
+        dedupe.put(student_id, idempotency_key, original_theta)
+        instrument.count("answers.duplicate", source="store")
+        return original_theta
+    instrument.count("firestore.writes", 2, operation="update_theta_after_response")
+    
+    # Live item fit (rapid guesses say nothing about the item)
+    if residual_z is None or residual_z >= RAPID_GUESS_Z:
+        get_item_statistics_aggregator().record(
+            question_id, current_theta, P_correct, is_correct,
+            (discrimination_a, difficulty_b, guessing_c)
+        )
+    
+    if idempotency_key is not None:
+        dedupe.put(student_id, idempotency_key, new_theta)
     
     return new_theta
 
@@ -589,7 +1732,9 @@ def update_theta_after_response(student_id: str, question_id: str,
 def get_theta_for_untested_topic(student_id: str, topic: str, student_data: Dict) -> Dict:
     """
     Estimate theta for a topic the student hasn't attempted yet.
-    Use subject-level average as prior.
+    Uses the cohort topic covariance model's conditional prediction from the
+    student's tested topics when a model is published, else the subject-level
+    average.
     
     Args:
         student_id: Student identifier
@@ -599,6 +1744,19 @@ def get_theta_for_untested_topic(student_id: str, topic: str, student_data: Dict
     Returns:
         Estimated theta data for topic
     """
+    model = get_topic_covariance_model()
+    prediction = model.predict_topic(student_data['theta_by_topic'], topic) if model else None
+    if prediction is not None:
+        estimated_theta, predicted_SE = prediction
+        return {
+            "theta": bound_theta(estimated_theta),
+            "percentile": theta_to_percentile(estimated_theta),
+            "confidence_SE": min(SE_CEILING, max(SE_FLOOR, predicted_SE)),
+            "attempts": 0,
+            "accuracy": None,
+            "last_updated": None
+        }
+    
     # Get subject from topic
     subject = get_subject_from_topic(topic)
     
@@ -625,94 +1783,981 @@ def get_theta_for_untested_topic(student_id: str, topic: str, student_data: Dict
     }
 
 # ============================================================================
-# CIRCUIT BREAKER: DEATH SPIRAL PREVENTION
+# ANSWER INGESTION (IDEMPOTENT, PER-STUDENT ORDER)
+# ============================================================================
+# Clients attach an idempotency key (a UUID made once per answer, reused on
+# every retry). update_theta_after_response checks it twice:
+# - IdempotencyCache: keys applied by this process in the last
+#   IDEMPOTENCY_CACHE_TTL_SECONDS, answered with the stored theta, no reads
+# - The response log: the entry is created under the key in the same batch
+#   as the profile update, so a key seen before fails the whole commit
+#   (covers other processes and older retries, for as long as the raw log
+#   keeps the entry, RESPONSE_LOG_RETAIN_DAYS)
+#
+# AnswerIngestionQueue sits in front: answers wait in a bounded queue and a
+# fixed pool applies them, so a whole batch finishing at once becomes steady
+# load. Each student is pinned to one worker, so a student's answers apply
+# in submission order and never race on the profile, and a retry that
+# arrives while the original is still queued shares its result.
+
+def validate_idempotency_key(key: str):
+    """Keys become response document IDs: alphanumeric, underscore or dash, 1-200 characters"""
+    if not isinstance(key, str) or not IDEMPOTENCY_KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid idempotency key {key!r}: must be alphanumeric, underscore "
+                         f"or dash, 1-200 characters")
+
+
+class IdempotencyCache:
+    """Recently applied answer keys and their results, expiring after a TTL"""
+    
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_CACHE_TTL_SECONDS,
+                 max_keys: int = IDEMPOTENCY_CACHE_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # (student_id, key) -> (expires_at, result), oldest first
+        self._lock = threading.Lock()
+    
+    def get(self, student_id: str, key: str):
+        """Result recorded for the key (None if unseen or expired)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((student_id, key))
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[(student_id, key)]
+                return None
+            return entry[1]
+    
+    def put(self, student_id: str, key: str, result):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[(student_id, key)] = (now + self.ttl_seconds, result)
+            self._entries.move_to_end((student_id, key))
+            # Insertion order is expiry order, so expired keys are at the front
+            while self._entries and (len(self._entries) > self.max_keys or
+                                     next(iter(self._entries.values()))[0] <= now):
+                self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_idempotency_cache: Optional[IdempotencyCache] = None
+
+
+def get_idempotency_cache() -> IdempotencyCache:
+    """Process-wide answer key cache"""
+    global _idempotency_cache
+    
+    if _idempotency_cache is None:
+        _idempotency_cache = IdempotencyCache()
+    
+    return _idempotency_cache
+
+
+@dataclass
+class AnswerSubmission:
+    """One queued answer; future resolves to the updated theta"""
+    student_id: str
+    question_id: str
+    is_correct: bool
+    time_taken: int
+    idempotency_key: str
+    future: Future = field(default_factory=Future)
+
+
+class AnswerIngestionQueue:
+    """
+    Bounded answer queue drained by a worker pool, in per-student order.
+    
+    Each worker owns one queue and students are assigned to workers by
+    hash, so answers from different students apply in parallel while one
+    student's answers apply one at a time, in the order submitted.
+    """
+    
+    def __init__(self, workers: int = ANSWER_QUEUE_WORKERS,
+                 max_pending: int = ANSWER_QUEUE_MAX_PENDING):
+        self._queues = [queue.Queue(maxsize=max(1, max_pending // workers)) for _ in range(workers)]
+        self._in_flight: Dict[Tuple[str, str], AnswerSubmission] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+    
+    def submit(self, student_id: str, question_id: str, is_correct: bool, time_taken: int,
+               idempotency_key: str, timeout: Optional[float] = None) -> Future:
+        """
+        Queue an answer for update_theta_after_response.
+        
+        Blocks while the student's worker queue is full (raises queue.Full
+        after timeout seconds, if given).
+        
+        Args:
+            student_id: Student identifier
+            question_id: Question answered
+            is_correct: Whether the answer was correct
+            time_taken: Seconds spent
+            idempotency_key: Client-generated answer ID, reused on retries
+            timeout: Longest wait for queue space (None = wait)
+        
+        Returns:
+            Future resolving to the updated theta (the original one for a retry)
+        """
+        validate_idempotency_key(idempotency_key)
+        cached_theta = get_idempotency_cache().get(student_id, idempotency_key)
+        if cached_theta is not None:
+            future = Future()
+            future.set_result(cached_theta)
+            instrument.count("answers.duplicate", source="cache")
+            return future
+        
+        with self._lock:
+            pending = self._in_flight.get((student_id, idempotency_key))
+            if pending is not None:
+                instrument.count("answers.duplicate", source="queue")
+                return pending.future
+            submission = AnswerSubmission(student_id, question_id, is_correct, time_taken,
+                                          idempotency_key)
+            self._in_flight[(student_id, idempotency_key)] = submission
+        
+        if not self._threads:
+            self.start()
+        
+        try:
+            self._queues[hash(student_id) % len(self._queues)].put(submission, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._in_flight.pop((student_id, idempotency_key), None)
+            raise
+        
+        instrument.count("answers.queued")
+        return submission.future
+    
+    def pending(self) -> int:
+        """Answers queued or being applied"""
+        with self._lock:
+            return len(self._in_flight)
+    
+    def start(self):
+        """Start the worker threads"""
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._work, args=(q,), daemon=True,
+                                              name=f"answer-ingestion-{i}")
+                             for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+    
+    def stop(self):
+        """Apply everything already queued, then stop the workers"""
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+    
+    def _work(self, answers: queue.Queue):
+        while True:
+            submission = answers.get()
+            if submission is None:
+                return
+            try:
+                submission.future.set_result(update_theta_after_response(
+                    submission.student_id, submission.question_id, submission.is_correct,
+                    submission.time_taken, idempotency_key=submission.idempotency_key
+                ))
+            except Exception as e:
+                submission.future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight.pop((submission.student_id, submission.idempotency_key), None)
+
+
+_answer_ingestion_queue: Optional[AnswerIngestionQueue] = None
+_answer_ingestion_lock = threading.Lock()
+
+
+def get_answer_ingestion_queue() -> AnswerIngestionQueue:
+    """Process-wide answer queue (workers start on first submit)"""
+    global _answer_ingestion_queue
+    
+    with _answer_ingestion_lock:
+        if _answer_ingestion_queue is None:
+            _answer_ingestion_queue = AnswerIngestionQueue()
+    
+    return _answer_ingestion_queue
+
+
+def submit_answer(student_id: str, question_id: str, is_correct: bool, time_taken: int,
+                  idempotency_key: str) -> Future:
+    """Queue an answer on the process-wide queue (see AnswerIngestionQueue.submit)"""
+    return get_answer_ingestion_queue().submit(student_id, question_id, is_correct,
+                                               time_taken, idempotency_key)
+
+# ============================================================================
+# CORRELATED TOPIC PRIORS (COHORT COVARIANCE)
 # ============================================================================
+# A nightly job fits the cohort's topic x topic theta mean and covariance
+# and publishes them to topic_covariance/current. For an untested topic t
+# and the student's tested topics O, the prior is the conditional Gaussian:
+#
+#   theta_t | theta_O ~ N(mu_t + W (theta_O - mu_O),  S_tt - W S_Ot)
+#   W = S_tO S_OO^-1
+#
+# W and the conditional variances for every topic depend only on which
+# topics are tested, so they are cached per tested-topic set. A prediction
+# is then one matrix-vector product. The covariance is fitted on estimated
+# thetas, so it already includes their measurement noise.
+
+class TopicCovarianceModel:
+    """Cohort topic theta means and covariance, with cached conditional predictions"""
+    
+    def __init__(self, topics: List[str], mean: np.ndarray, covariance: np.ndarray,
+                 fitted_at: Optional[str] = None, students: int = 0):
+        self.topics = list(topics)
+        self.position = {topic: i for i, topic in enumerate(self.topics)}
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.covariance = np.asarray(covariance, dtype=np.float64)
+        self.fitted_at = fitted_at
+        self.students = students
+        self._regression = functools.lru_cache(maxsize=TOPIC_PRIOR_CACHE_SIZE)(self._fit_regression)
+    
+    def _fit_regression(self, observed: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+        """(W for every topic, conditional SD for every topic) given the observed positions"""
+        observed = list(observed)
+        cross = self.covariance[:, observed]
+        weights = np.linalg.solve(self.covariance[np.ix_(observed, observed)], cross.T).T
+        variance = np.diag(self.covariance) - np.einsum('ij,ij->i', weights, cross)
+        return weights, np.sqrt(np.maximum(variance, 0.0))
+    
+    def predict(self, theta_by_topic: Dict) -> Dict[str, Tuple[float, float]]:
+        """
+        Conditional (theta, SD) for every model topic the student has not attempted.
+        
+        Args:
+            theta_by_topic: Student's topic estimates; topics with attempts count as evidence
+        
+        Returns:
+            topic -> (predicted theta, predicted SD)
+        """
+        observed = sorted(self.position[t] for t, data in theta_by_topic.items()
+                          if t in self.position and data.get('attempts', 0) > 0)
+        if not observed:
+            return {t: (float(self.mean[i]), float(math.sqrt(self.covariance[i, i])))
+                    for i, t in enumerate(self.topics) if t not in theta_by_topic}
+        
+        weights, sd = self._regression(tuple(observed))
+        residual = np.array([theta_by_topic[self.topics[i]]['theta'] for i in observed]) - \
+            self.mean[observed]
+        predicted = self.mean + weights @ residual
+        
+        observed_set = set(observed)
+        return {t: (float(predicted[i]), float(sd[i])) for i, t in enumerate(self.topics)
+                if i not in observed_set}
+    
+    def predict_topic(self, theta_by_topic: Dict, topic: str) -> Optional[Tuple[float, float]]:
+        """Conditional (theta, SD) for one topic (None if the model does not cover it)"""
+        if topic not in self.position:
+            return None
+        return self.predict(theta_by_topic).get(topic)
+    
+    def to_document(self) -> Dict:
+        """Firestore document (no nested arrays, so the covariance is stored flat)"""
+        return {
+            "topics": self.topics,
+            "mean": self.mean.tolist(),
+            "covariance": self.covariance.ravel().tolist(),
+            "fitted_at": self.fitted_at,
+            "students": self.students
+        }
+    
+    @classmethod
+    def from_document(cls, data: Dict) -> "TopicCovarianceModel":
+        n = len(data['topics'])
+        return cls(data['topics'], data['mean'], np.reshape(data['covariance'], (n, n)),
+                   data.get('fitted_at'), data.get('students', 0))
+
 
-def check_circuit_breaker(student_id: str) -> bool:
+def fit_topic_covariance_model(student_ids: Optional[List[str]] = None,
+                               min_students: int = TOPIC_COVARIANCE_MIN_STUDENTS,
+                               shrinkage: float = TOPIC_COVARIANCE_SHRINKAGE) -> Optional[TopicCovarianceModel]:
     """
-    Check if student needs intervention due to consecutive failures.
+    Fit topic theta means and covariance from cohort profiles.
     
-    Circuit breaker triggers if:
-    - 5+ consecutive incorrect answers in recent session
+    Pairwise-complete correlations (students with both topics attempted),
+    shrunk toward the average correlation of their subject pair and scaled
+    by each topic's SD, then eigenvalues clipped so the matrix stays
+    positive definite for conditioning.
     
     Args:
-        student_id: Unique student identifier
+        student_ids: Profiles to fit on (default: every student)
+        min_students: Topics attempted by fewer students are left out; pairs
+                      seen together fewer times get zero covariance
+        shrinkage: Weight of the subject-pair average in each correlation
     
     Returns:
-        True if circuit breaker should activate (override normal quiz)
+        TopicCovarianceModel (None if no topic has enough data)
     """
-    db = firestore.client()
+    db = get_firestore_client()
+    if student_ids is None:
+        profiles = (doc.to_dict() for doc in db.collection('students').stream())
+    else:
+        profiles = (db.collection('students').document(sid).get().to_dict() for sid in student_ids)
+    
+    rows = []
+    for profile in profiles:
+        if profile:
+            rows.append({t: data['theta'] for t, data in profile.get('theta_by_topic', {}).items()
+                         if data.get('attempts', 0) > 0})
+    
+    counts = {}
+    for row in rows:
+        for topic in row:
+            counts[topic] = counts.get(topic, 0) + 1
+    topics = sorted(t for t, count in counts.items() if count >= min_students)
+    if not topics:
+        return None
     
-    # Get last 10 responses (covers ~1 quiz)
-    recent_responses = db.collection('student_responses')\
-                        .document(student_id)\
-                        .collection('responses')\
-                        .order_by('answered_at', direction=firestore.Query.DESCENDING)\
-                        .limit(10)\
-                        .stream()
+    thetas = np.full((len(rows), len(topics)), np.nan)
+    for r, row in enumerate(rows):
+        for c, topic in enumerate(topics):
+            thetas[r, c] = row.get(topic, np.nan)
+    
+    observed = ~np.isnan(thetas)
+    mask = observed.astype(np.float64)
+    mean = np.nanmean(thetas, axis=0)
+    sd = np.nanstd(thetas, axis=0, ddof=1)
+    centered = np.where(observed, thetas - mean, 0.0)
+    pair_counts = mask.T @ mask
+    
+    # Pairwise correlations, each from the students who attempted both
+    # topics (variances over the same students, so |r| <= 1)
+    squares = centered ** 2
+    correlation = (centered.T @ centered) / np.sqrt(
+        np.maximum((squares.T @ mask) * (mask.T @ squares), 1e-12)
+    )
     
-    responses_list = [r.to_dict() for r in recent_responses]
+    off_diagonal = ~np.eye(len(topics), dtype=bool)
+    reliable = off_diagonal & (pair_counts >= min_students)
+    
+    # Shrink toward the subject-pair block averages: a topic pair's own
+    # estimate is noisy, the average over its subject pair is not
+    subjects = np.array([get_subject_from_topic(t) for t in topics])
+    target = np.zeros_like(correlation)
+    for subject_a in set(subjects):
+        for subject_b in set(subjects):
+            block = np.outer(subjects == subject_a, subjects == subject_b) & reliable
+            if block.any():
+                target[block] = correlation[block].mean()
+    correlation = np.where(reliable, (1 - shrinkage) * correlation + shrinkage * target, 0.0)
+    np.fill_diagonal(correlation, 1.0)
+    covariance = correlation * np.outer(sd, sd)
+    
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    floor = 1e-3 * max(float(np.mean(np.diag(covariance))), 1e-6)
+    covariance = (eigenvectors * np.maximum(eigenvalues, floor)) @ eigenvectors.T
+    
+    return TopicCovarianceModel(topics, mean, covariance,
+                                fitted_at=datetime.utcnow().isoformat(), students=len(rows))
+
+
+def save_topic_covariance_model(model: TopicCovarianceModel):
+    """Publish the model for get_topic_covariance_model to load"""
+    db = get_firestore_client()
+    db.collection('topic_covariance').document('current').set(model.to_document())
+
+
+def run_nightly_topic_covariance_fit() -> Optional[TopicCovarianceModel]:
+    """Cron entry point: refit on every profile and publish"""
+    model = fit_topic_covariance_model()
+    if model is None:
+        instrument.event("topic_covariance.fit_skipped",
+                         "⚠️ Topic covariance: not enough profiles to fit", level=logging.WARNING)
+        return None
     
-    if len(responses_list) < CIRCUIT_BREAKER_THRESHOLD:
-        return False  # Not enough data
+    save_topic_covariance_model(model)
+    instrument.event("topic_covariance.fitted",
+                     f"🧮 Topic covariance: {len(model.topics)} topics fitted on {model.students} profiles")
+    return model
+
+
+_topic_covariance_model: Optional[TopicCovarianceModel] = None
+_topic_covariance_loaded_at: Optional[float] = None
+_topic_covariance_lock = threading.Lock()
+
+
+def get_topic_covariance_model() -> Optional[TopicCovarianceModel]:
+    """
+    Process-wide published model, reloaded every TOPIC_COVARIANCE_REFRESH_SECONDS.
     
-    # Count consecutive failures from most recent
-    consecutive_failures = 0
-    for response in responses_list:
-        if not response['is_correct']:
-            consecutive_failures += 1
-        else:
-            break  # Stop at first correct answer
+    Returns None while nothing is published (callers fall back to subject averages).
+    """
+    global _topic_covariance_model, _topic_covariance_loaded_at
+    
+    now = time.monotonic()
+    if _topic_covariance_loaded_at is not None and \
+            now - _topic_covariance_loaded_at < TOPIC_COVARIANCE_REFRESH_SECONDS:
+        return _topic_covariance_model
+    
+    with _topic_covariance_lock:
+        if _topic_covariance_loaded_at is None or \
+                now - _topic_covariance_loaded_at >= TOPIC_COVARIANCE_REFRESH_SECONDS:
+            doc = get_firestore_client().collection('topic_covariance').document('current').get()
+            data = doc.to_dict() if doc.exists else None
+            _topic_covariance_model = TopicCovarianceModel.from_document(data) if data else None
+            _topic_covariance_loaded_at = now
+    
+    return _topic_covariance_model
+
+
+def get_predictable_topics(theta_by_topic: Dict, max_SE: float = PREDICTABLE_TOPIC_SE) -> List[str]:
+    """Untested topics the covariance model already predicts to within max_SE"""
+    model = get_topic_covariance_model()
+    if model is None:
+        return []
+    return [t for t, (_, sd) in model.predict(theta_by_topic).items() if sd <= max_SE]
+
+# ============================================================================
+# RESPONSE-TIME MODEL (LOGNORMAL SPEED)
+# ============================================================================
+# van der Linden's lognormal model for the time student j spends on item i:
+#
+#   log t_ij ~ N(beta_i - tau_j, 1 / alpha_i^2)
+#
+# beta_i is the item's time intensity, alpha_i its time discrimination and
+# tau_j the student's speed (0 = cohort average). A nightly job fits beta /
+# alpha from the response logs and publishes them to response_time_model/
+# current; items timed too rarely fall back to log(time_estimate). tau is
+# updated after every answer (conjugate normal update, kept on the profile
+# as response_speed).
+#
+# Given theta and tau, correctness and time are independent, so time enters
+# scoring as evidence about effort: an answer far faster than this student
+# needs for this item (residual below RAPID_GUESS_Z) is a rapid guess. With
+# RESPONSE_TIME_SCORING on it moves theta by RAPID_GUESS_WEIGHT of a normal
+# step and shrinks SE by as much; rapid guesses never update tau. The same
+# parameters give the expected seconds a student needs per item, which
+# optimal assembly checks against the quiz time budget.
+
+class ResponseTimeModel:
+    """Per-item lognormal time parameters plus the cohort speed spread"""
+    
+    def __init__(self, question_ids: List[str], time_intensity: np.ndarray,
+                 time_discrimination: np.ndarray, speed_sd: float = 1.0,
+                 fitted_at: Optional[str] = None, responses: int = 0):
+        self.question_ids = list(question_ids)
+        self.position = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.time_intensity = np.asarray(time_intensity, dtype=np.float64)
+        self.time_discrimination = np.asarray(time_discrimination, dtype=np.float64)
+        self.speed_sd = speed_sd
+        self.fitted_at = fitted_at
+        self.responses = responses
+        self.default_alpha = float(np.median(self.time_discrimination)) \
+            if len(self.time_discrimination) else RESPONSE_TIME_DEFAULT_ALPHA
+        self._aligned = None  # (index, beta, alpha) for the last index seen
+    
+    def item_parameters(self, question_id: str, time_estimate: Optional[int] = None) -> Tuple[float, float]:
+        """(beta, alpha) of one item; unfitted items use log(time_estimate)"""
+        position = self.position.get(question_id)
+        if position is not None:
+            return float(self.time_intensity[position]), float(self.time_discrimination[position])
+        return math.log(time_estimate or RESPONSE_TIME_DEFAULT_SECONDS), self.default_alpha
+    
+    def index_parameters(self, index: "QuestionBankIndex") -> Tuple[np.ndarray, np.ndarray]:
+        """(beta, alpha) arrays aligned with the index rows (cached per index)"""
+        aligned = self._aligned
+        if aligned is not None and aligned[0] is index:
+            return aligned[1], aligned[2]
+        
+        estimates = np.where(index.time_estimates > 0, index.time_estimates, RESPONSE_TIME_DEFAULT_SECONDS)
+        beta = np.log(estimates.astype(np.float64))
+        alpha = np.full(len(index), self.default_alpha)
+        for row, question_id in enumerate(index.question_ids.tolist()):
+            position = self.position.get(question_id)
+            if position is not None:
+                beta[row] = self.time_intensity[position]
+                alpha[row] = self.time_discrimination[position]
+        
+        self._aligned = (index, beta, alpha)
+        return beta, alpha
+    
+    def expected_seconds(self, index: "QuestionBankIndex", speed: float = 0.0) -> np.ndarray:
+        """Mean seconds a student of this speed needs per index row: exp(beta - tau + 1/(2 alpha^2))"""
+        beta, alpha = self.index_parameters(index)
+        return np.exp(beta - speed + 0.5 / alpha ** 2)
+    
+    def to_document(self) -> Dict:
+        return {
+            "question_ids": self.question_ids,
+            "time_intensity": self.time_intensity.tolist(),
+            "time_discrimination": self.time_discrimination.tolist(),
+            "speed_sd": self.speed_sd,
+            "fitted_at": self.fitted_at,
+            "responses": self.responses
+        }
     
-    # Trigger: 5+ consecutive failures
-    return consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD
+    @classmethod
+    def from_document(cls, data: Dict) -> "ResponseTimeModel":
+        return cls(data['question_ids'], data['time_intensity'], data['time_discrimination'],
+                   data.get('speed_sd', 1.0), data.get('fitted_at'), data.get('responses', 0))
+
 
+def time_residual(seconds: float, beta: float, alpha: float, speed: float) -> float:
+    """Standardized log-time residual: alpha * (log t - (beta - tau)); negative = faster than expected"""
+    return alpha * (math.log(seconds) - (beta - speed))
 
-def generate_recovery_quiz(student_id: str, student_data: Dict) -> List[Dict]:
+
+def update_speed_estimate(speed_state: Optional[Dict], seconds: float, beta: float,
+                          alpha: float, prior_sd: float) -> Dict:
     """
-    Generate confidence-building quiz after circuit breaker triggers.
-    
-    Strategy (based on actual JEEVibe question bank distribution):
-    - 7 EASY questions (b = 0.4 to 0.7): 75-85% success
-    - 2 MEDIUM questions (b = 0.8 to 1.1): 60-70% success  
-    - 1 REVIEW question (previously correct): ~90% success
+    Conjugate normal update of a student's speed after one timed answer.
     
-    Goal: 70-80% overall success rate to rebuild confidence
+    Each answer is a measurement of tau, beta - log t, with precision alpha^2.
     
     Args:
-        student_id: Unique student identifier
-        student_data: Student profile data
+        speed_state: Profile's response_speed ({tau, precision, responses}), None = prior N(0, prior_sd^2)
+        seconds: Time taken
+        beta: Item time intensity
+        alpha: Item time discrimination
+        prior_sd: Cohort speed SD
     
     Returns:
-        List of 10 recovery questions
+        New response_speed state
     """
-    db = firestore.client()
+    if speed_state:
+        tau, precision, responses = speed_state['tau'], speed_state['precision'], speed_state['responses']
+    else:
+        tau, precision, responses = 0.0, 1.0 / prior_sd ** 2, 0
     
-    theta_by_topic = student_data['theta_by_topic']
-    recent_questions = get_recent_questions(student_id, days=RECENT_QUESTIONS_WINDOW_DAYS)
+    weight = alpha ** 2
+    new_precision = precision + weight
+    return {
+        "tau": (precision * tau + weight * (beta - math.log(seconds))) / new_precision,
+        "precision": new_precision,
+        "responses": responses + 1
+    }
+
+
+def fit_response_time_model(student_ids: Optional[List[str]] = None,
+                            min_responses: int = RESPONSE_TIME_MIN_RESPONSES,
+                            iterations: int = RESPONSE_TIME_FIT_ITERATIONS) -> Optional[ResponseTimeModel]:
+    """
+    Fit item time intensity / discrimination from the raw response logs.
     
-    # Get weakest topics (where student is struggling)
-    weak_topics = sorted(
-        theta_by_topic.items(),
-        key=lambda x: x[1]['theta']
-    )[:5]  # Focus on 5 weakest
+    Alternates between student speeds (alpha^2-weighted mean of beta - log t,
+    centred so the cohort averages 0) and item parameters (beta = mean of
+    log t + tau, alpha = 1 / residual SD). Every timed response takes part;
+    only items timed at least min_responses times are published.
     
-    recovery_questions = []
+    Args:
+        student_ids: Students whose logs to use (default: all)
+        min_responses: Timed responses an item needs to be published
+        iterations: Alternating passes
     
-    # ========================================
-    # 7 EASY questions (confidence builders)
-    # ========================================
+    Returns:
+        ResponseTimeModel (None if no item has enough timed responses)
+    """
+    db = get_firestore_client()
+    if student_ids is None:
+        student_ids = [ref.id for ref in db.collection('students').list_documents()]
+    
+    def load_log(student_id):
+        return [r.to_dict() for r in db.collection('student_responses').document(student_id)
+                .collection('responses').stream()]
+    
+    students, items, log_times = [], [], []
+    item_position = {}
+    with ThreadPoolExecutor(max_workers=REPLAY_LOAD_THREADS) as loader:
+        for s, responses in enumerate(loader.map(load_log, student_ids)):
+            for response in responses:
+                seconds = response.get('time_taken_seconds')
+                if not seconds or seconds <= 0:
+                    continue
+                students.append(s)
+                items.append(item_position.setdefault(response['question_id'], len(item_position)))
+                log_times.append(math.log(seconds))
+    
+    if not log_times:
+        return None
     
-    for topic_name, topic_data in weak_topics[:4]:
-        # Select EASY: b = 0.4 to 0.7 (actual easy range in JEEVibe question bank)
-        # This gives 75-85% success probability for struggling students
-        easy_questions = select_questions_by_difficulty_range(
-            topic=topic_name,
-            difficulty_min=RECOVERY_EASY_MIN,
-            difficulty_max=RECOVERY_EASY_MAX,
+    students = np.array(students)
+    items = np.array(items)
+    log_times = np.array(log_times)
+    n_students, n_items = len(student_ids), len(item_position)
+    item_counts = np.bincount(items, minlength=n_items)
+    student_counts = np.bincount(students, minlength=n_students)
+    timed = student_counts > 0
+    
+    beta = np.bincount(items, log_times, n_items) / np.maximum(item_counts, 1)
+    alpha = np.full(n_items, RESPONSE_TIME_DEFAULT_ALPHA)
+    tau = np.zeros(n_students)
+    
+    for _ in range(iterations):
+        weight = alpha[items] ** 2
+        tau = np.bincount(students, weight * (beta[items] - log_times), n_students) / \
+            np.maximum(np.bincount(students, weight, n_students), 1e-12)
+        tau[timed] -= tau[timed].mean()
+        beta = np.bincount(items, log_times + tau[students], n_items) / np.maximum(item_counts, 1)
+        residual = log_times - (beta[items] - tau[students])
+        variance = np.bincount(items, residual ** 2, n_items) / np.maximum(item_counts - 1, 1)
+        alpha = np.clip(1.0 / np.sqrt(np.maximum(variance, 1e-6)), 0.25, 10.0)
+    
+    fitted = item_counts >= min_responses
+    if not fitted.any():
+        return None
+    
+    question_ids = list(item_position)
+    return ResponseTimeModel(
+        [question_ids[i] for i in np.flatnonzero(fitted)], beta[fitted], alpha[fitted],
+        speed_sd=float(np.std(tau[timed])) or 1.0,
+        fitted_at=datetime.utcnow().isoformat(), responses=len(log_times)
+    )
+
+
+def save_response_time_model(model: ResponseTimeModel):
+    """Publish the model for get_response_time_model to load"""
+    db = get_firestore_client()
+    db.collection('response_time_model').document('current').set(model.to_document())
+
+
+def run_nightly_response_time_fit() -> Optional[ResponseTimeModel]:
+    """Cron entry point: refit on every response log and publish"""
+    model = fit_response_time_model()
+    if model is None:
+        instrument.event("response_time.fit_skipped",
+                         "⚠️ Response-time model: not enough timed responses to fit", level=logging.WARNING)
+        return None
+    
+    save_response_time_model(model)
+    instrument.event("response_time.fitted", f"⏱️ Response-time model: {len(model.question_ids)} items fitted on "
+                                             f"{model.responses} timed responses (speed SD {model.speed_sd:.2f})")
+    return model
+
+
+_response_time_model: Optional[ResponseTimeModel] = None
+_response_time_loaded_at: Optional[float] = None
+_response_time_lock = threading.Lock()
+
+
+def get_response_time_model() -> Optional[ResponseTimeModel]:
+    """
+    Process-wide published model, reloaded every RESPONSE_TIME_REFRESH_SECONDS.
+    
+    Returns None while nothing is published (time is then only logged, and
+    assembly budgets with the authored time_estimate).
+    """
+    global _response_time_model, _response_time_loaded_at
+    
+    now = time.monotonic()
+    if _response_time_loaded_at is not None and \
+            now - _response_time_loaded_at < RESPONSE_TIME_REFRESH_SECONDS:
+        return _response_time_model
+    
+    with _response_time_lock:
+        if _response_time_loaded_at is None or \
+                now - _response_time_loaded_at >= RESPONSE_TIME_REFRESH_SECONDS:
+            doc = get_firestore_client().collection('response_time_model').document('current').get()
+            data = doc.to_dict() if doc.exists else None
+            _response_time_model = ResponseTimeModel.from_document(data) if data else None
+            _response_time_loaded_at = now
+    
+    return _response_time_model
+
+
+def expected_item_seconds(student_data: Dict, index: "QuestionBankIndex") -> Optional[np.ndarray]:
+    """Student-specific expected seconds per index row (None = no published model)"""
+    model = get_response_time_model()
+    if model is None:
+        return None
+    speed = (student_data.get('response_speed') or {}).get('tau', 0.0)
+    return model.expected_seconds(index, speed)
+
+# ============================================================================
+# SEEDED SELECTION RANDOMNESS
+# ============================================================================
+# Every random draw in quiz generation (maintenance topics, recovery picks,
+# exposure control, interleaving) comes from one RNG per quiz, seeded from
+# (student_id, quiz number, seed). The same inputs against the same profile
+# and bank regenerate the same quiz, so benchmarks are reproducible and a
+# pre-generated quiz can be validated or rebuilt from its metadata instead of
+# stored in full. Helpers given rng=None fall back to the module-level RNG.
+
+def quiz_rng(student_id: str, quiz_number: int, seed: int = QUIZ_SELECTION_SEED) -> random.Random:
+    """
+    RNG for one quiz generation.
+    
+    Args:
+        student_id: Student identifier
+        quiz_number: completed_quiz_count the quiz is generated at
+        seed: Selection seed (stored on the quiz metadata as selection_seed)
+    
+    Returns:
+        random.Random seeded from a SHA-256 of the three (stable across
+        processes and Python versions, unlike hash())
+    """
+    digest = hashlib.sha256(f"{student_id}:{quiz_number}:{seed}".encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def split_rng(rng: random.Random, count: int) -> List[random.Random]:
+    """
+    Independent child RNGs, one per selection slot.
+    
+    Slots selected concurrently (generate_daily_quiz_async) would otherwise
+    draw from the shared RNG in completion order; a child per slot makes the
+    draws independent of scheduling and identical to the sync path.
+    """
+    return [random.Random(rng.getrandbits(64)) for _ in range(count)]
+
+
+# ============================================================================
+# QUIZ GENERATION CONTEXT (REQUEST-SCOPED MEMOIZATION)
+# ============================================================================
+
+class QuizGenerationContext:
+    """
+    Request-scoped cache for one quiz generation.
+    
+    Every helper in the quiz pipeline accepts an optional ctx; with one, each
+    document or query is fetched at most once per generation. `reads` counts
+    Firestore documents read through the context (an empty query still bills
+    one read), for per-quiz debugging; pipeline writes tally into `writes`.
+    `degradations` lists the deadline fallbacks the generation took.
+    """
+    
+    def __init__(self, student_id: str):
+        self.student_id = student_id
+        self.db = get_firestore_client()
+        self.reads = 0
+        self.writes = 0
+        self.degradations: List[str] = []
+        self._memo = {}
+    
+    @property
+    def student_ref(self):
+        return self.db.collection('students').document(self.student_id)
+    
+    @property
+    def responses_ref(self):
+        return self.db.collection('student_responses').document(self.student_id)\
+                      .collection('responses')
+    
+    def fork(self) -> "QuizGenerationContext":
+        """Child context for a deadline stage: starts from this cache, fills its own"""
+        child = QuizGenerationContext(self.student_id)
+        child.db = self.db
+        child.degradations = self.degradations
+        child._memo = dict(self._memo)
+        return child
+    
+    def merge(self, child: "QuizGenerationContext"):
+        """Adopt a finished fork's cache entries and read/write counts"""
+        for key, value in child._memo.items():
+            self._memo.setdefault(key, value)
+        self.reads += child.reads
+        self.writes += child.writes
+    
+    def memoize(self, key, loader):
+        """Return the cached value for key, computing it with loader() on first use"""
+        if key not in self._memo:
+            self._memo[key] = loader()
+        return self._memo[key]
+    
+    def _stream(self, query) -> List[Dict]:
+        docs = [d.to_dict() for d in query.stream()]
+        self.reads += max(1, len(docs))
+        return docs
+    
+    def _get(self, doc_ref) -> Optional[Dict]:
+        self.reads += 1
+        return doc_ref.get().to_dict()
+    
+    def student_data(self) -> Dict:
+        """Student profile document"""
+        return self.memoize('student', lambda: self._get(self.student_ref))
+    
+    def question(self, question_id: str) -> Optional[Dict]:
+        """Question document by ID"""
+        return self.memoize(('question', question_id), lambda: self._get(
+            self.db.collection('questions').document(question_id)
+        ))
+    
+    def topic_questions(self, topic: str) -> List[Dict]:
+        """All question documents for a topic"""
+        return self.memoize(('topic_questions', topic), lambda: self._stream(
+            self.db.collection('questions').where('topic', '==', topic)
+        ))
+    
+    def response_history(self) -> List[Dict]:
+        """Responses within the recency window, most recent first"""
+        cutoff = datetime.utcnow() - timedelta(days=RECENT_QUESTIONS_WINDOW_DAYS)
+        return self.memoize('response_history', lambda: sorted(
+            self._stream(self.responses_ref.where('answered_at', '>=', cutoff.isoformat())),
+            key=lambda r: r['answered_at'], reverse=True
+        ))
+    
+    def latest_responses(self) -> List[Dict]:
+        """Last 10 responses regardless of age, most recent first (circuit breaker)"""
+        return self.memoize('latest_responses', lambda: self._stream(
+            self.responses_ref.order_by('answered_at', direction=firestore.Query.DESCENDING)
+                              .limit(10)
+        ))
+    
+    def correct_responses(self) -> List[Dict]:
+        """Every correct response: raw log plus compacted review candidates"""
+        return self.memoize('correct_responses', lambda: self._stream(
+            self.responses_ref.where('is_correct', '==', True)
+        ) + rollup_review_responses(self.response_rollup()))
+    
+    def response_rollup(self) -> Dict:
+        """Per-topic rollup of compacted responses ({} if never compacted)"""
+        return self.memoize('response_rollup', lambda: self._get(
+            self.db.collection('student_response_rollups').document(self.student_id)
+        ) or {})
+    
+    def recent_questions(self) -> "RecentQuestionSet":
+        """Question IDs answered within the recency window"""
+        def load():
+            student_data = self.student_data()
+            recent = set(RecentQuestionSet.from_day_buckets(
+                student_data.get('recent_questions_by_day', {}), RECENT_QUESTIONS_WINDOW_DAYS
+            ))
+            if recent_question_log_needed(student_data):
+                recent |= {r['question_id'] for r in self.response_history()}
+            return RecentQuestionSet(recent)
+        
+        return self.memoize('recent_questions', load)
+    
+    def days_since_last_attempt(self, topic: str) -> int:
+        """
+        days_since_last_attempt from the windowed history.
+        
+        Topics not seen inside the window report 999 like never-attempted
+        topics; both saturate the 7-day recency score identically.
+        """
+        def load():
+            latest_by_topic = {}
+            for response in self.response_history():
+                latest_by_topic.setdefault(response['topic'], response)
+            return latest_by_topic
+        
+        latest_by_topic = self.memoize('latest_response_by_topic', load)
+        return _days_since_latest_response(
+            [latest_by_topic[topic]] if topic in latest_by_topic else []
+        )
+
+
+# ============================================================================
+# CIRCUIT BREAKER: DEATH SPIRAL PREVENTION
+# ============================================================================
+
+def check_circuit_breaker(student_id: str,
+                          ctx: Optional[QuizGenerationContext] = None) -> bool:
+    """
+    Check if student needs intervention due to consecutive failures.
+    
+    Circuit breaker triggers if:
+    - 5+ consecutive incorrect answers in recent session
+    
+    Args:
+        student_id: Unique student identifier
+        ctx: Request-scoped cache (optional)
+    
+    Returns:
+        True if circuit breaker should activate (override normal quiz)
+    """
+    if ctx is not None:
+        return _is_failure_streak(ctx.latest_responses())
+    
+    db = get_firestore_client()
+    
+    # Get last 10 responses (covers ~1 quiz)
+    recent_responses = db.collection('student_responses')\
+                        .document(student_id)\
+                        .collection('responses')\
+                        .order_by('answered_at', direction=firestore.Query.DESCENDING)\
+                        .limit(10)\
+                        .stream()
+    
+    responses_list = [r.to_dict() for r in recent_responses]
+    
+    return _is_failure_streak(responses_list)
+
+
+def _is_failure_streak(responses_list: List[Dict]) -> bool:
+    """Circuit breaker rule over the latest responses (most recent first)"""
+    if len(responses_list) < CIRCUIT_BREAKER_THRESHOLD:
+        return False  # Not enough data
+    
+    # Count consecutive failures from most recent
+    consecutive_failures = 0
+    for response in responses_list:
+        if not response['is_correct']:
+            consecutive_failures += 1
+        else:
+            break  # Stop at first correct answer
+    
+    # Trigger: 5+ consecutive failures
+    return consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD
+
+
+def generate_recovery_quiz(student_id: str, student_data: Dict,
+                           ctx: Optional[QuizGenerationContext] = None,
+                           seed: int = QUIZ_SELECTION_SEED, save: bool = True) -> List[Dict]:
+    """
+    Generate confidence-building quiz after circuit breaker triggers.
+    
+    Strategy (based on actual JEEVibe question bank distribution):
+    - 7 EASY questions (b = 0.4 to 0.7): 75-85% success
+    - 2 MEDIUM questions (b = 0.8 to 1.1): 60-70% success  
+    - 1 REVIEW question (previously correct): ~90% success
+    
+    Goal: 70-80% overall success rate to rebuild confidence
+    
+    Args:
+        student_id: Unique student identifier
+        student_data: Student profile data
+        ctx: Request-scoped cache (optional)
+        seed: Selection seed (see quiz_rng)
+        save: Log the circuit breaker event and save the quiz metadata; pass
+              False when the quiz may not be served and call
+              save_recovery_quiz once it is
+    
+    Returns:
+        List of 10 recovery questions
+    """
+    theta_by_topic = student_data['theta_by_topic']
+    completed_quiz_count = student_data.get('completed_quiz_count', 0)
+    rng = quiz_rng(student_id, completed_quiz_count, seed)
+    if ctx is not None:
+        recent_questions = ctx.recent_questions()
+    else:
+        recent_questions = get_recent_question_set(student_id, student_data)
+    
+    # Get weakest topics (where student is struggling)
+    weak_topics = sorted(
+        theta_by_topic.items(),
+        key=lambda x: x[1]['theta']
+    )[:5]  # Focus on 5 weakest
+    
+    recovery_questions = []
+    
+    # ========================================
+    # 7 EASY questions (confidence builders)
+    # ========================================
+    
+    for topic_name, topic_data in weak_topics[:4]:
+        # Select EASY: b = 0.4 to 0.7 (actual easy range in JEEVibe question bank)
+        # This gives 75-85% success probability for struggling students
+        easy_questions = select_questions_by_difficulty_range(
+            topic=topic_name,
+            difficulty_min=RECOVERY_EASY_MIN,
+            difficulty_max=RECOVERY_EASY_MAX,
             count=2,
             recent_questions=recent_questions,
-            discrimination_min=1.0  # Relaxed requirement
+            discrimination_min=1.0,  # Relaxed requirement
+            ctx=ctx,
+            rng=rng
         )
         recovery_questions.extend(easy_questions)
     
@@ -728,7 +2773,9 @@ def generate_recovery_quiz(student_id: str, student_data: Dict) -> List[Dict]:
             difficulty_max=RECOVERY_MEDIUM_MAX,
             count=1,
             recent_questions=recent_questions,
-            discrimination_min=1.0
+            discrimination_min=1.0,
+            ctx=ctx,
+            rng=rng
         )
         recovery_questions.extend(medium_questions)
     
@@ -739,34 +2786,48 @@ def generate_recovery_quiz(student_id: str, student_data: Dict) -> List[Dict]:
     review_question = get_previously_correct_question(
         student_id,
         recent_questions,
-        from_topics=[t[0] for t in weak_topics]
+        from_topics=[t[0] for t in weak_topics],
+        ctx=ctx,
+        rng=rng
     )
     
     if review_question:
         recovery_questions.append(review_question)
     
     # Interleave and finalize
-    interleaved = interleave_questions_by_topic(recovery_questions[:10])
+    interleaved = interleave_questions_by_topic(recovery_questions[:10], rng=rng)
     
+    if save:
+        save_recovery_quiz(student_id, completed_quiz_count, interleaved, seed=seed, ctx=ctx)
+    
+    return interleaved
+
+
+def save_recovery_quiz(student_id: str, completed_quiz_count: int, quiz: List[Dict],
+                       seed: int = QUIZ_SELECTION_SEED,
+                       ctx: Optional[QuizGenerationContext] = None):
+    """Log the circuit breaker activation and save the served recovery quiz's metadata"""
     # Log circuit breaker activation for analytics
     log_circuit_breaker_event(
         student_id=student_id,
         trigger_reason="consecutive_failures",
         recovery_quiz=True
     )
+    if ctx is not None:
+        ctx.writes += 1
     
     # Save metadata
     quiz_id = f"recovery_quiz_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M')}"
-    completed_quiz_count = student_data.get('completed_quiz_count', 0)
-    save_quiz_metadata(student_id, quiz_id, completed_quiz_count, "recovery", interleaved)
-    
-    return interleaved
+    save_quiz_metadata(student_id, quiz_id, completed_quiz_count, "recovery", quiz,
+                       selection_seed=seed, ctx=ctx)
 
 
 def select_questions_by_difficulty_range(topic: str, difficulty_min: float,
                                         difficulty_max: float, count: int,
-                                        recent_questions: List[str],
-                                        discrimination_min: float) -> List[Dict]:
+                                        recent_questions: Collection[str],
+                                        discrimination_min: float,
+                                        ctx: Optional[QuizGenerationContext] = None,
+                                        rng: Optional[random.Random] = None) -> List[Dict]:
     """
     Select questions within specific difficulty range.
     Used for circuit breaker recovery quizzes.
@@ -778,11 +2839,27 @@ def select_questions_by_difficulty_range(topic: str, difficulty_min: float,
         count: Number of questions to select
         recent_questions: Recently answered question IDs to exclude
         discrimination_min: Minimum discrimination threshold
+        ctx: Request-scoped cache (optional; filters the memoized topic
+             questions in memory instead of issuing range queries)
+        rng: Quiz RNG (see quiz_rng); module-level random if None
     
     Returns:
         List of question dictionaries
     """
-    db = firestore.client()
+    rng = rng or random
+    
+    if ctx is not None:
+        topic_questions = ctx.topic_questions(topic)
+        candidates = [q for q in topic_questions
+                      if difficulty_min <= q['irt_parameters']['difficulty_b'] <= difficulty_max
+                      and q['question_id'] not in recent_questions
+                      and q['irt_parameters']['discrimination_a'] >= discrimination_min]
+        if len(candidates) == 0:
+            candidates = [q for q in topic_questions
+                          if q['question_id'] not in recent_questions]
+        return rng.sample(candidates, min(count, len(candidates)))
+    
+    db = get_firestore_client()
     
     questions = db.collection('questions')\
                  .where('topic', '==', topic)\
@@ -801,13 +2878,15 @@ def select_questions_by_difficulty_range(topic: str, difficulty_min: float,
                      if q.to_dict()['question_id'] not in recent_questions]
     
     # Random selection (avoid always same "easy" questions)
-    selected = random.sample(candidates, min(count, len(candidates)))
+    selected = rng.sample(candidates, min(count, len(candidates)))
     
     return selected
 
 
-def get_previously_correct_question(student_id: str, recent_questions: List[str],
-                                   from_topics: List[str]) -> Optional[Dict]:
+def get_previously_correct_question(student_id: str, recent_questions: Collection[str],
+                                   from_topics: List[str],
+                                   ctx: Optional[QuizGenerationContext] = None,
+                                   rng: Optional[random.Random] = None) -> Optional[Dict]:
     """
     Get a question student answered correctly 7-14 days ago.
     High probability they still remember → confidence boost.
@@ -816,35 +2895,44 @@ def get_previously_correct_question(student_id: str, recent_questions: List[str]
         student_id: Student identifier
         recent_questions: Recently answered question IDs to exclude
         from_topics: Topics to select from
+        ctx: Request-scoped cache (optional)
+        rng: Quiz RNG (see quiz_rng); module-level random if None
     
     Returns:
         Question dictionary or None
     """
-    db = firestore.client()
+    db = get_firestore_client()
     
     # Look for correct answers 7-14 days ago
     cutoff_start = datetime.utcnow() - timedelta(days=14)
     cutoff_end = datetime.utcnow() - timedelta(days=7)
     
-    responses = db.collection('student_responses')\
-                 .document(student_id)\
-                 .collection('responses')\
-                 .where('is_correct', '==', True)\
-                 .where('answered_at', '>=', cutoff_start.isoformat())\
-                 .where('answered_at', '<=', cutoff_end.isoformat())\
-                 .stream()
-    
-    candidates = [r.to_dict() for r in responses 
-                  if r.to_dict()['topic'] in from_topics
-                  and r.to_dict()['question_id'] not in recent_questions]
+    if ctx is not None:
+        responses = [r for r in ctx.correct_responses()
+                     if cutoff_start.isoformat() <= r['answered_at'] <= cutoff_end.isoformat()]
+    else:
+        responses = [r.to_dict() for r in db.collection('student_responses')
+                                            .document(student_id)
+                                            .collection('responses')
+                                            .where('is_correct', '==', True)
+                                            .where('answered_at', '>=', cutoff_start.isoformat())
+                                            .where('answered_at', '<=', cutoff_end.isoformat())
+                                            .stream()]
+    
+    candidates = [r for r in responses
+                  if r['topic'] in from_topics
+                  and r['question_id'] not in recent_questions]
     
     if len(candidates) == 0:
         return None
     
     # Pick random previously-correct question
-    chosen = random.choice(candidates)
+    chosen = (rng or random).choice(candidates)
     question_id = chosen['question_id']
     
+    if ctx is not None:
+        return ctx.question(question_id)
+    
     q_ref = db.collection('questions').document(question_id)
     return q_ref.get().to_dict()
 
@@ -858,7 +2946,7 @@ def log_circuit_breaker_event(student_id: str, trigger_reason: str, recovery_qui
         trigger_reason: Why circuit breaker triggered
         recovery_quiz: Whether recovery quiz was generated
     """
-    db = firestore.client()
+    db = get_firestore_client()
     
     event_data = {
         "student_id": student_id,
@@ -871,11 +2959,321 @@ def log_circuit_breaker_event(student_id: str, trigger_reason: str, recovery_qui
     db.collection('system_events').add(event_data)
 
 
+# ============================================================================
+# DEADLINE-AWARE GENERATION (GRACEFUL DEGRADATION)
+# ============================================================================
+# With a deadline, every storage-bound stage of quiz generation is waited
+# for only while the budget lasts, less QUIZ_DEADLINE_RESERVE_SECONDS kept
+# for the in-memory work after it. A stage that overruns or fails is
+# replaced by a cheaper path and named in the quiz's degradations:
+#
+#   cached_quiz               profile (or recovery quiz) not ready: pre-generated generic quiz
+#   circuit_breaker_skipped   failure-streak check assumed clear
+#   profile_recent_questions  recency window from the profile's day buckets only
+#   profile_recency           exploitation ranking uses each topic's last_updated
+#   index_selection           unfinished slots assembled from the in-memory index
+#   review_skipped            no spaced-review question
+#   writes_deferred           metadata / profile writes finish after returning
+#
+# The fallbacks themselves make no I/O: prepare_quiz_fallbacks() (call it at
+# worker start) holds the bank index with every full document in memory plus
+# the generic quiz pool, and refreshes both in the background when the index
+# changes. Until it has run, cached_quiz is empty and index_selection leaves
+# the unfinished slots out.
+#
+# Sync stages run on stage threads, which cannot be interrupted, so an
+# overrunning read completes in the background and its result is dropped
+# (async stages are cancelled). A stage given the ctx works on a fork of it,
+# merged back only if the stage finishes in time, so an abandoned stage never
+# touches the generation's cache or read counts. Each generation counts
+# quiz_generation.requests{degraded="true"|"false"} and each fallback
+# quiz_generation.degradations{degradation}; the fallback rate is the
+# degraded="true" share of requests.
+
+_deadline_executor = ThreadPoolExecutor(max_workers=QUIZ_DEADLINE_THREADS,
+                                        thread_name_prefix="quiz-deadline")
+
+
+class QuizDeadline:
+    """Latency budget for one quiz generation (seconds=None: no budget, stages run inline)"""
+    
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.degradations: List[str] = []
+    
+    def remaining(self) -> float:
+        """Seconds the next stage may take (infinite without a budget)"""
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - QUIZ_DEADLINE_RESERVE_SECONDS - time.monotonic()
+    
+    def degrade(self, degradation: str):
+        self.degradations.append(degradation)
+        instrument.count("quiz_generation.degradations", degradation=degradation)
+    
+    def call(self, degradation: str, loader, fallback=lambda: None,
+             ctx: Optional["QuizGenerationContext"] = None):
+        """
+        loader() if it finishes within the budget, else fallback().
+        
+        Without a budget loader runs inline and errors propagate; with one,
+        an overrun or a storage error records the degradation instead.
+        With a ctx, loader is called with the context to use: ctx itself
+        inline, otherwise a fork merged back only when the stage finishes
+        in time.
+        """
+        if self.expires_at is None:
+            return loader(ctx) if ctx is not None else loader()
+        
+        timeout = self.remaining()
+        if timeout > 0:
+            stage_ctx = ctx.fork() if ctx is not None else None
+            future = _deadline_executor.submit(loader, stage_ctx) if ctx is not None \
+                else _deadline_executor.submit(loader)
+            try:
+                result = future.result(timeout=timeout)
+                if ctx is not None:
+                    ctx.merge(stage_ctx)
+                return result
+            except FuturesTimeoutError:
+                pass
+            except Exception as e:
+                instrument.event("quiz_deadline.stage_failed",
+                                 f"⚠️ Quiz stage failed, degrading to {degradation}: {e}",
+                                 level=logging.WARNING)
+        
+        self.degrade(degradation)
+        return fallback()
+    
+    async def call_async(self, degradation: str, awaitable, fallback=lambda: None):
+        """Async call(): the awaitable is cancelled if it overruns"""
+        if self.expires_at is None:
+            return await awaitable
+        
+        timeout = self.remaining()
+        if timeout > 0:
+            try:
+                return await asyncio.wait_for(awaitable, timeout)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                instrument.event("quiz_deadline.stage_failed",
+                                 f"⚠️ Quiz stage failed, degrading to {degradation}: {e}",
+                                 level=logging.WARNING)
+        elif asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        
+        self.degrade(degradation)
+        return fallback()
+    
+    def finish_writes(self, task):
+        """Run task to completion, waiting for it only while the budget lasts"""
+        if self.expires_at is None:
+            task()
+            return
+        
+        future = _deadline_executor.submit(task)
+        try:
+            future.result(timeout=max(0.0, self.remaining()))
+        except FuturesTimeoutError:
+            self.degrade("writes_deferred")
+            future.add_done_callback(_report_deferred_writes)
+    
+    async def finish_writes_async(self, awaitable):
+        """Async finish_writes(): the writes are shielded, never cancelled"""
+        if self.expires_at is None:
+            await awaitable
+            return
+        
+        writes = asyncio.ensure_future(awaitable)
+        try:
+            await asyncio.wait_for(asyncio.shield(writes), max(0.0, self.remaining()))
+        except asyncio.TimeoutError:
+            self.degrade("writes_deferred")
+            writes.add_done_callback(_report_deferred_writes)
+    
+    def record(self, student_id: str):
+        """Count the generation (and report its degradations)"""
+        degraded = bool(self.degradations)
+        instrument.count("quiz_generation.requests", degraded=str(degraded).lower())
+        if degraded:
+            instrument.event("quiz_deadline.degraded",
+                             f"⏱️ Quiz for {student_id} degraded: {', '.join(self.degradations)}")
+
+
+def _report_deferred_writes(future):
+    """Done callback for writes that outlived their deadline (errors would otherwise go unseen)"""
+    if not future.cancelled() and future.exception() is not None:
+        instrument.event("quiz_deadline.deferred_writes_failed",
+                         f"❌ Deferred quiz writes failed: {future.exception()}", level=logging.ERROR)
+
+
+def days_since_from_profile(theta_by_topic: Dict) -> Dict[str, int]:
+    """days_since_last_attempt per topic from theta_by_topic last_updated (no response-log query)"""
+    now = datetime.utcnow()
+    return {topic: (now - datetime.fromisoformat(data['last_updated'])).days
+            if data.get('last_updated') else 999
+            for topic, data in theta_by_topic.items()}
+
+
+def complete_slots_from_index(selection_slots: List[Tuple[str, float, float]],
+                              selected: List[Optional[Dict]],
+                              recent_questions: Collection[str]) -> List[Optional[Dict]]:
+    """
+    Fill the slots a timed-out selection did not reach from the in-memory index.
+    
+    Uses the prepared fallback index (see prepare_quiz_fallbacks), whose
+    documents are all held, so no storage is touched.
+    
+    Args:
+        selection_slots: Planned (topic, target_theta, discrimination_min)
+        selected: Questions already chosen for the leading slots
+        recent_questions: Recently answered question IDs to exclude
+    
+    Returns:
+        selected plus one assembled question per remaining slot (selected
+        alone if the fallbacks were never prepared)
+    """
+    missing = selection_slots[len(selected):]
+    index, _ = get_quiz_fallbacks().state()
+    if not missing or index is None:
+        return selected
+    
+    excluded = set(recent_questions) | {q['question_id'] for q in selected if q}
+    return selected + assemble_optimal_quiz(build_daily_quiz_blueprint(missing), excluded, index)
+
+
+def build_fallback_quizzes(index: "QuestionBankIndex", count: int = FALLBACK_QUIZ_POOL_SIZE,
+                           seed: int = QUIZ_SELECTION_SEED) -> List[List[Dict]]:
+    """
+    Generic quizzes served when a student's profile cannot be read in time.
+    
+    Each draws QUIZ_LENGTH topics weighted by JEE weight and, per topic, one
+    of its RANDOMESQUE_TOP_K most informative items at
+    EXPLORATION_TARGET_DIFFICULTY (the first-attempt target).
+    """
+    rng = random.Random(seed)
+    topics = sorted(t for t in index.topic_offsets if len(index.topic_rows(t)) > 0)
+    weights = [JEE_TOPIC_WEIGHTS.get(t, 0.5) for t in topics]
+    
+    top_rows = {}
+    for topic in topics:
+        rows = index.topic_rows(topic)
+        info = index.fisher_information(rows, EXPLORATION_TARGET_DIFFICULTY)
+        top_rows[topic] = [rows[int(i)] for i in np.argsort(-info)[:RANDOMESQUE_TOP_K]]
+    
+    quizzes = []
+    for _ in range(count):
+        chosen = []
+        while len(chosen) < min(QUIZ_LENGTH, len(topics)):
+            topic = rng.choices(topics, weights)[0]
+            if topic not in chosen:
+                chosen.append(topic)
+        quizzes.append(interleave_questions_by_topic(
+            [index.get_document(rng.choice(top_rows[t])) for t in chosen]
+        ))
+    
+    return quizzes
+
+
+class QuizFallbacks:
+    """
+    In-memory state the deadline fallbacks serve from.
+    
+    Holds a bank index with every full document loaded, plus the generic
+    quiz pool built from it, as one (index, quizzes) pair that readers take
+    without locking or I/O. A background thread rebuilds the pair when the
+    process-wide index changes; the old pair is served until then.
+    """
+    
+    def __init__(self, refresh_interval: float = FALLBACK_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._state: Tuple[Optional["QuestionBankIndex"], List[List[Dict]]] = (None, [])
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def state(self) -> Tuple[Optional["QuestionBankIndex"], List[List[Dict]]]:
+        """Current (index, quizzes); (None, []) before the first refresh"""
+        return self._state
+    
+    def refresh(self):
+        """Rebuild the state if the process-wide index changed (storage I/O)"""
+        with self._lock:
+            index = get_question_bank_index()
+            if self._state[0] is index:
+                return
+            index.hold_all_documents()
+            self._state = (index, build_fallback_quizzes(index))
+    
+    def start(self):
+        """Build the state now and keep it current in the background"""
+        self.refresh()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="quiz-fallbacks", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresh (the state stays; start() resumes it)"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        self._stop_event.clear()
+    
+    def _run(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                instrument.event("quiz_fallbacks.refresh_failed",
+                                 f"⚠️ Quiz fallback refresh failed: {e}", level=logging.WARNING)
+
+
+_quiz_fallbacks: Optional[QuizFallbacks] = None
+_quiz_fallbacks_lock = threading.Lock()
+
+
+def get_quiz_fallbacks() -> QuizFallbacks:
+    """Process-wide fallback state (empty until prepare_quiz_fallbacks runs)"""
+    global _quiz_fallbacks
+    
+    if _quiz_fallbacks is None:
+        with _quiz_fallbacks_lock:
+            if _quiz_fallbacks is None:
+                _quiz_fallbacks = QuizFallbacks()
+    
+    return _quiz_fallbacks
+
+
+def prepare_quiz_fallbacks() -> QuizFallbacks:
+    """Load the fallback index and quiz pool and start refreshing them (call at worker start)"""
+    fallbacks = get_quiz_fallbacks()
+    fallbacks.start()
+    return fallbacks
+
+
+def cached_quiz(student_id: str) -> List[Dict]:
+    """This student's pick from the fallback pool (rotates daily; no I/O)"""
+    _, quizzes = get_quiz_fallbacks().state()
+    if not quizzes:
+        instrument.count("quiz_generation.fallback_unprepared")
+        return []
+    rng = quiz_rng(student_id, datetime.utcnow().toordinal())
+    return list(quizzes[rng.randrange(len(quizzes))])
+
 # ============================================================================
 # DAILY QUIZ GENERATION
 # ============================================================================
 
-def generate_daily_quiz(student_id: str, completed_quiz_count: int = None) -> List[Dict]:
+@instrumented("generate_daily_quiz")
+def generate_daily_quiz(student_id: str, completed_quiz_count: int = None,
+                        assembly_mode: str = "greedy",
+                        ctx: Optional[QuizGenerationContext] = None,
+                        seed: int = QUIZ_SELECTION_SEED,
+                        deadline_seconds: Optional[float] = QUIZ_DEADLINE_SECONDS) -> List[Dict]:
     """
     Master function to generate personalized 10-question daily quiz.
     Implements hybrid Exploration → Exploitation strategy.
@@ -884,15 +3282,34 @@ def generate_daily_quiz(student_id: str, completed_quiz_count: int = None) -> Li
         student_id: Unique student identifier
         completed_quiz_count: Number of quizzes completed (0-indexed). If None, fetches from DB.
                              Phase transition at quiz 14 (0-13 = exploration, 14+ = exploitation)
+        assembly_mode: "greedy" picks one question per planned topic independently;
+                       "optimal" assembles all planned topics jointly under the
+                       quiz-level constraints (see assemble_optimal_quiz)
+        ctx: Request-scoped cache shared by every helper, so no document is
+             read twice; created if not given (pass one in to inspect ctx.reads
+             or ctx.degradations)
+        seed: Selection seed; every random draw comes from
+              quiz_rng(student_id, completed_quiz_count, seed), so the same
+              seed and profile state regenerate the same quiz
+        deadline_seconds: Latency budget; stages that would overrun it fall
+                          back to cheaper paths (see QuizDeadline). None = no budget
     
     Returns:
         quiz: List of 10 question dictionaries
     """
-    db = firestore.client()
+    if ctx is None:
+        ctx = QuizGenerationContext(student_id)
+    deadline = QuizDeadline(deadline_seconds)
+    ctx.degradations = deadline.degradations
     
     # Load student profile
-    student_ref = db.collection('students').document(student_id)
-    student_data = student_ref.get().to_dict()
+    with instrument.span("generate_daily_quiz.load_profile"):
+        student_ref = ctx.student_ref
+        student_data = deadline.call("cached_quiz", lambda c: c.student_data(), ctx=ctx)
+    
+    if student_data is None:
+        deadline.record(student_id)
+        return cached_quiz(student_id)
     
     # Get completed quiz count from DB if not provided
     if completed_quiz_count is None:
@@ -902,17 +3319,46 @@ def generate_daily_quiz(student_id: str, completed_quiz_count: int = None) -> Li
     # STEP 0: CIRCUIT BREAKER CHECK
     # ========================================
     
-    if check_circuit_breaker(student_id):
-        print(f"⚠️ Circuit breaker activated for {student_id}")
+    with instrument.span("generate_daily_quiz.circuit_breaker"):
+        circuit_breaker_tripped = deadline.call(
+            "circuit_breaker_skipped", lambda c: check_circuit_breaker(student_id, ctx=c),
+            fallback=lambda: False, ctx=ctx
+        )
+    
+    if circuit_breaker_tripped:
+        instrument.event("circuit_breaker.activated",
+                         f"⚠️ Circuit breaker activated for {student_id}", level=logging.WARNING)
+        instrument.count("circuit_breaker.triggered")
+        
         # Override normal quiz with recovery quiz
-        recovery_quiz = generate_recovery_quiz(student_id, student_data)
+        with instrument.span("generate_daily_quiz.recovery_quiz"):
+            recovery_quiz = deadline.call(
+                "cached_quiz",
+                lambda c: generate_recovery_quiz(student_id, student_data, ctx=c, seed=seed,
+                                                 save=False),
+                ctx=ctx
+            )
+        if recovery_quiz is None:
+            # A generic quiz is not a recovery quiz: no event, metadata or phase change
+            deadline.record(student_id)
+            return cached_quiz(student_id)
         
-        # Still increment quiz count
-        student_ref.update({
-            'completed_quiz_count': firestore.Increment(1),
-            'learning_phase': 'recovery',
-            'last_quiz_completed_at': datetime.utcnow().isoformat()
-        })
+        # Log the activation, save metadata and still increment quiz count
+        def write_recovery_quiz():
+            save_recovery_quiz(student_id, student_data.get('completed_quiz_count', 0),
+                               recovery_quiz, seed=seed, ctx=ctx)
+            with instrument.span("generate_daily_quiz.profile_update"):
+                student_ref.update({
+                    'completed_quiz_count': firestore.Increment(1),
+                    'learning_phase': 'recovery',
+                    'last_quiz_completed_at': datetime.utcnow().isoformat()
+                })
+            ctx.writes += 1
+        
+        deadline.finish_writes(write_recovery_quiz)
+        
+        _record_quiz_io(student_id, "recovery quiz", ctx)
+        deadline.record(student_id)
         
         return recovery_quiz
     
@@ -920,79 +3366,217 @@ def generate_daily_quiz(student_id: str, completed_quiz_count: int = None) -> Li
     # STEP 1: Normal quiz generation
     # ========================================
     
-    theta_by_topic = student_data['theta_by_topic']
-    topic_attempts = student_data['topic_attempt_counts']
-    
-    # Get recent questions (last 30 days)
-    recent_questions_30d = get_recent_questions(student_id, days=RECENT_QUESTIONS_WINDOW_DAYS)
+    rng = quiz_rng(student_id, completed_quiz_count, seed)
     
-    # Determine learning phase based on QUIZ COUNT (not days)
-    if completed_quiz_count < EXPLORATION_END_QUIZ:
-        learning_phase = "exploration"
-        # Linear decay from 60% to 30% over 14 quizzes
-        exploration_ratio = max(EXPLORATION_START_RATIO - (completed_quiz_count * 0.04), 
-                               EXPLORATION_END_RATIO)
-    else:
-        learning_phase = "exploitation"
-        exploration_ratio = 0.0
-        
-        # Mark phase transition if this is the first exploitation quiz
-        if student_data.get('phase_switched_at_quiz') is None:
-            student_ref.update({'phase_switched_at_quiz': completed_quiz_count})
+    # Get recent questions (last 30 days), carried on the profile
+    with instrument.span("generate_daily_quiz.recent_questions"):
+        recent_questions_30d = deadline.call(
+            "profile_recent_questions", lambda c: c.recent_questions(),
+            fallback=lambda: RecentQuestionSet.from_day_buckets(
+                student_data.get('recent_questions_by_day', {})),
+            ctx=ctx
+        )
     
-    quiz_questions = []
+    # Plan topics for this quiz (exploitation ranks by recency from the windowed history)
+    with instrument.span("generate_daily_quiz.plan_topics"):
+        days_since_by_topic = None
+        if completed_quiz_count >= EXPLORATION_END_QUIZ:
+            theta_by_topic = student_data['theta_by_topic']
+            days_since_by_topic = deadline.call(
+                "profile_recency",
+                lambda c: {t: c.days_since_last_attempt(t) for t in theta_by_topic},
+                fallback=lambda: days_since_from_profile(theta_by_topic), ctx=ctx
+            )
+        learning_phase, selection_slots = plan_quiz_selection_slots(
+            student_id, student_data, completed_quiz_count, days_since_by_topic, ctx=ctx, rng=rng
+        )
     
     # ========================================
-    # EXPLORATION PHASE (Quizzes 0-13)
+    # SELECT QUESTIONS FOR PLANNED TOPICS
     # ========================================
     
-    if learning_phase == "exploration":
-        num_exploration = int(QUIZ_LENGTH * exploration_ratio)
-        num_deliberate = QUIZ_LENGTH - num_exploration - REVIEW_COUNT
-        num_review = REVIEW_COUNT
-        
-        # 1. Get unexplored topics
-        unexplored_topics = get_unexplored_topics(topic_attempts, min_attempts=2)
-        
-        # 2. Prioritize by strategic importance
-        exploration_topics = prioritize_exploration_topics(
-            unexplored_topics,
-            student_data['subject_balance']
-        )[:num_exploration]
-        
-        # 3. Select exploration questions
-        for topic in exploration_topics:
-            # For first attempt, use neutral medium difficulty from actual question bank
-            # Question bank range: 0.4-2.6, with mean at 1.33
-            # Use 0.9 (low-medium) for exploration to avoid frustrating new students
-            if topic not in theta_by_topic or topic_attempts.get(topic, 0) == 0:
-                target_difficulty = EXPLORATION_TARGET_DIFFICULTY  # 0.9
-            else:
-                target_difficulty = theta_by_topic[topic]['theta']
+    with instrument.span("generate_daily_quiz.select_questions", assembly_mode=assembly_mode):
+        if assembly_mode == "optimal":
+            index = get_question_bank_index()
+            blueprint = build_daily_quiz_blueprint(selection_slots)
+            quiz_questions = assemble_optimal_quiz(blueprint, recent_questions_30d, index,
+                                                   expected_item_seconds(student_data, index),
+                                                   rng=rng)
+        else:
+            # Slots picked so far; once the fallback takes them, the
+            # abandoned stage stops and adds nothing more
+            selected = []
+            abandoned = threading.Event()
+            selected_lock = threading.Lock()
+            slot_rngs = split_rng(rng, len(selection_slots))
             
-            question = select_optimal_question_IRT(
-                topic, target_difficulty, recent_questions_30d, 
-                discrimination_min=1.4
-            )
-            if question:
-                quiz_questions.append(question)
-        
-        # 4. Select deliberate practice questions
-        tested_topics = [t for t, count in topic_attempts.items() if count >= 2]
-        weak_topics = rank_topics_by_weakness(tested_topics, theta_by_topic)
-        
-        for topic in weak_topics[:num_deliberate]:
-            question = select_optimal_question_IRT(
-                topic, theta_by_topic[topic]['theta'], 
-                recent_questions_30d, discrimination_min=1.4
-            )
-            if question:
-                quiz_questions.append(question)
+            def select_slots(stage_ctx):
+                for (topic, target_theta, discrimination_min), slot_rng in zip(selection_slots, slot_rngs):
+                    if abandoned.is_set():
+                        break
+                    question = select_optimal_question_IRT(
+                        topic, target_theta, recent_questions_30d,
+                        discrimination_min=discrimination_min, ctx=stage_ctx, rng=slot_rng
+                    )
+                    with selected_lock:
+                        if abandoned.is_set():
+                            break
+                        selected.append(question)
+                return selected
+            
+            def complete_selection():
+                with selected_lock:
+                    abandoned.set()
+                    done = list(selected)
+                return complete_slots_from_index(selection_slots, done, recent_questions_30d)
+            
+            quiz_questions = [q for q in deadline.call(
+                "index_selection", select_slots, fallback=complete_selection, ctx=ctx
+            ) if q]
+    
+    # Add review question
+    with instrument.span("generate_daily_quiz.review_question"):
+        review_q = deadline.call(
+            "review_skipped",
+            lambda c: get_spaced_review_question(student_id, recent_questions_30d, ctx=c),
+            ctx=ctx
+        )
+    if review_q:
+        quiz_questions.append(review_q)
+    
+    # ========================================
+    # FINALIZE QUIZ
+    # ========================================
+    
+    # Interleave to prevent topic clustering (no consecutive same-topic
+    # items whenever the topic mix allows it)
+    with instrument.span("generate_daily_quiz.interleave"):
+        interleaved_quiz = interleave_questions_by_topic(
+            quiz_questions, rng=rng, subject_spacing=INTERLEAVE_SUBJECT_SPACING,
+            difficulty_ramp=INTERLEAVE_DIFFICULTY_RAMP
+        )
+    
+    # Ensure exactly 10 questions
+    final_quiz = interleaved_quiz[:QUIZ_LENGTH]
+    
+    # Save quiz metadata and increment completed_quiz_count (the phase switch
+    # on the first exploitation quiz rides along)
+    quiz_id = f"quiz_num{completed_quiz_count}_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M')}"
+    profile_update = {
+        'completed_quiz_count': firestore.Increment(1),
+        'learning_phase': learning_phase,
+        'last_quiz_completed_at': datetime.utcnow().isoformat()
+    }
+    if learning_phase == "exploitation" and student_data.get('phase_switched_at_quiz') is None:
+        profile_update['phase_switched_at_quiz'] = completed_quiz_count
+    degradations = list(deadline.degradations)
+    
+    def write_quiz():
+        with instrument.span("generate_daily_quiz.save_metadata"):
+            save_quiz_metadata(student_id, quiz_id, completed_quiz_count, learning_phase, final_quiz,
+                               selection_seed=seed, degradations=degradations, ctx=ctx)
+        with instrument.span("generate_daily_quiz.profile_update"):
+            student_ref.update(profile_update)
+        ctx.writes += 1
+    
+    deadline.finish_writes(write_quiz)
+    
+    _record_quiz_io(student_id, quiz_id, ctx)
+    deadline.record(student_id)
+    
+    return final_quiz
+
+
+# Helper functions for quiz generation
+
+def _record_quiz_io(student_id: str, quiz_label: str, ctx: QuizGenerationContext):
+    """Report the generation's document reads/writes to instrumentation (and debug print)"""
+    instrument.count("firestore.reads", ctx.reads, operation="generate_daily_quiz")
+    instrument.count("firestore.writes", ctx.writes, operation="generate_daily_quiz")
+    
+    if QUIZ_DEBUG_READ_COUNTS:
+        instrument.event("quiz_generation.reads", f"📊 {student_id} {quiz_label}: {ctx.reads} document reads")
+
+
+def plan_quiz_selection_slots(student_id: str, student_data: Dict, completed_quiz_count: int,
+                              days_since_by_topic: Optional[Dict[str, int]] = None,
+                              ctx: Optional[QuizGenerationContext] = None,
+                              rng: Optional[random.Random] = None
+                              ) -> Tuple[str, List[Tuple[str, float, float]]]:
+    """
+    Decide the learning phase and which topics this quiz draws from.
+    
+    Args:
+        student_id: Unique student identifier
+        student_data: Student profile data
+        completed_quiz_count: Number of quizzes completed (0-indexed)
+        days_since_by_topic: Prefetched days_since_last_attempt per topic
+                             (queried per topic when None)
+        ctx: Request-scoped cache; recency comes from its single windowed
+             history query and topic rankings are memoized on it
+        rng: Quiz RNG for the maintenance topic draw (see quiz_rng)
+    
+    Returns:
+        (learning_phase, selection_slots) where each slot is
+        (topic, target_theta, discrimination_min)
+    """
+    theta_by_topic = student_data['theta_by_topic']
+    topic_attempts = student_data['topic_attempt_counts']
+    
+    # Determine learning phase based on QUIZ COUNT (not days)
+    if completed_quiz_count < EXPLORATION_END_QUIZ:
+        learning_phase = "exploration"
+        # Linear decay from 60% to 30% over 14 quizzes
+        exploration_ratio = max(EXPLORATION_START_RATIO - (completed_quiz_count * 0.04), 
+                               EXPLORATION_END_RATIO)
+    else:
+        learning_phase = "exploitation"
+        exploration_ratio = 0.0
+    
+    # Planned selections: (topic, target_theta, discrimination_min)
+    selection_slots = []
+    
+    # ========================================
+    # EXPLORATION PHASE (Quizzes 0-13)
+    # ========================================
+    
+    if learning_phase == "exploration":
+        num_exploration = int(QUIZ_LENGTH * exploration_ratio)
+        num_deliberate = QUIZ_LENGTH - num_exploration - REVIEW_COUNT
+        num_review = REVIEW_COUNT
+        
+        # 1. Get unexplored topics
+        unexplored_topics = get_unexplored_topics(topic_attempts, min_attempts=2)
+        
+        # 2. Prioritize by strategic importance
+        exploration_topics = prioritize_exploration_topics(
+            unexplored_topics,
+            student_data['subject_balance'],
+            predictable_topics=set(get_predictable_topics(theta_by_topic))
+        )[:num_exploration]
+        
+        # 3. Select exploration questions
+        for topic in exploration_topics:
+            # For first attempt, use neutral medium difficulty from actual question bank
+            # Question bank range: 0.4-2.6, with mean at 1.33
+            # Use 0.9 (low-medium) for exploration to avoid frustrating new students
+            if topic not in theta_by_topic or topic_attempts.get(topic, 0) == 0:
+                target_difficulty = EXPLORATION_TARGET_DIFFICULTY  # 0.9
+            else:
+                target_difficulty = theta_by_topic[topic]['theta']
+            
+            selection_slots.append((topic, target_difficulty, 1.4))
+        
+        # 4. Select deliberate practice questions
+        tested_topics = [t for t, count in topic_attempts.items() if count >= 2]
         
-        # 5. Add review question
-        review_q = get_spaced_review_question(student_id, recent_questions_30d)
-        if review_q:
-            quiz_questions.append(review_q)
+        def rank():
+            return rank_topics_by_weakness(tested_topics, theta_by_topic)
+        
+        weak_topics = ctx.memoize('weakness_ranking', rank) if ctx is not None else rank()
+        
+        for topic in weak_topics[:num_deliberate]:
+            selection_slots.append((topic, theta_by_topic[topic]['theta'], 1.4))
     
     # ========================================
     # EXPLOITATION PHASE (Quizzes 14+)
@@ -1001,68 +3585,44 @@ def generate_daily_quiz(student_id: str, completed_quiz_count: int = None) -> Li
     else:  # exploitation
         # 1. Rank all topics by priority
         all_topics = list(theta_by_topic.keys())
-        ranked_topics = rank_topics_by_priority_formula(
-            all_topics, theta_by_topic, topic_attempts, student_id
-        )
+        if ctx is not None and days_since_by_topic is None:
+            days_since_by_topic = {t: ctx.days_since_last_attempt(t) for t in all_topics}
+        
+        def rank():
+            return rank_topics_by_priority_formula(
+                all_topics, theta_by_topic, topic_attempts, student_id,
+                days_since_by_topic=days_since_by_topic
+            )
+        
+        ranked_topics = ctx.memoize('priority_ranking', rank) if ctx is not None else rank()
         
         # 2. Select weak topics
         weak_topics = ranked_topics[:WEAK_TOPIC_COUNT_EXPLOITATION]
         
         for topic in weak_topics:
-            question = select_optimal_question_IRT(
-                topic, theta_by_topic[topic]['theta'],
-                recent_questions_30d, discrimination_min=1.4
-            )
-            if question:
-                quiz_questions.append(question)
+            selection_slots.append((topic, theta_by_topic[topic]['theta'], 1.4))
         
         # 3. Select maintenance topics (strong topics)
         strong_topics = ranked_topics[-5:]  # Bottom 5 = strongest
-        maintenance_topics = random.sample(strong_topics, 
-                                          min(MAINTENANCE_COUNT_EXPLOITATION, len(strong_topics)))
+        maintenance_topics = (rng or random).sample(strong_topics,
+                                                    min(MAINTENANCE_COUNT_EXPLOITATION, len(strong_topics)))
         
         for topic in maintenance_topics:
-            question = select_optimal_question_IRT(
-                topic, theta_by_topic[topic]['theta'],
-                recent_questions_30d, discrimination_min=1.0
-            )
-            if question:
-                quiz_questions.append(question)
-        
-        # 4. Add review question
-        review_q = get_spaced_review_question(student_id, recent_questions_30d)
-        if review_q:
-            quiz_questions.append(review_q)
-    
-    # ========================================
-    # FINALIZE QUIZ
-    # ========================================
-    
-    # Interleave to prevent topic clustering
-    interleaved_quiz = interleave_questions_by_topic(quiz_questions)
-    
-    # Ensure exactly 10 questions
-    final_quiz = interleaved_quiz[:QUIZ_LENGTH]
-    
-    # Save quiz metadata
-    quiz_id = f"quiz_num{completed_quiz_count}_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M')}"
-    save_quiz_metadata(student_id, quiz_id, completed_quiz_count, learning_phase, final_quiz)
+            selection_slots.append((topic, theta_by_topic[topic]['theta'], 1.0))
     
-    # Increment completed_quiz_count in database
-    student_ref.update({
-        'completed_quiz_count': firestore.Increment(1),
-        'learning_phase': learning_phase,
-        'last_quiz_completed_at': datetime.utcnow().isoformat()
-    })
-    
-    return final_quiz
+    return learning_phase, selection_slots
 
 
-# Helper functions for quiz generation
 
 def get_recent_questions(student_id: str, days: int = 30) -> List[str]:
-    """Get question IDs answered in last N days"""
-    db = firestore.client()
+    """
+    Get question IDs answered in last N days by querying the response log.
+    
+    Quiz generation uses get_recent_question_set, which reads the same data
+    from the student profile; this query remains the fallback for profiles
+    written before recent_questions_by_day existed.
+    """
+    db = get_firestore_client()
     cutoff = datetime.utcnow() - timedelta(days=days)
     
     responses = db.collection('student_responses').document(student_id)\
@@ -1073,6 +3633,86 @@ def get_recent_questions(student_id: str, days: int = 30) -> List[str]:
     return [r.to_dict()['question_id'] for r in responses]
 
 
+def recent_question_day_key(day: datetime) -> str:
+    """Profile field name of the day bucket in recent_questions_by_day (e.g. d20260115)"""
+    return day.strftime('d%Y%m%d')
+
+
+class RecentQuestionSet:
+    """
+    Question IDs answered within the recency window, with O(1) membership.
+    
+    Backed by the day-bucketed profile field
+    recent_questions_by_day = {"d20260115": [question_id, ...], ...}
+    which update_theta_after_response appends to, so the set arrives with
+    the student document and needs no response-log query.
+    """
+    
+    def __init__(self, question_ids=()):
+        self._question_ids = set(question_ids)
+    
+    @classmethod
+    def from_day_buckets(cls, buckets: Dict[str, List[str]],
+                         days: int = RECENT_QUESTIONS_WINDOW_DAYS,
+                         now: Optional[datetime] = None) -> "RecentQuestionSet":
+        """Union of the buckets that fall inside the last `days` days"""
+        oldest_key = recent_question_day_key((now or datetime.utcnow()) - timedelta(days=days))
+        return cls(question_id
+                   for day_key, question_ids in buckets.items() if day_key >= oldest_key
+                   for question_id in question_ids)
+    
+    def __contains__(self, question_id) -> bool:
+        return question_id in self._question_ids
+    
+    def __iter__(self):
+        return iter(self._question_ids)
+    
+    def __len__(self) -> int:
+        return len(self._question_ids)
+
+
+def get_recent_question_set(student_id: str, student_data: Dict,
+                            days: int = RECENT_QUESTIONS_WINDOW_DAYS) -> RecentQuestionSet:
+    """
+    Recent questions from the loaded profile.
+    
+    Profiles created before the day buckets existed start tracking on their
+    next answer (recent_questions_tracked_since); until the window has fully
+    rolled past that point the buckets are merged with the response-log query.
+    """
+    if 'recent_questions_by_day' not in student_data:
+        return RecentQuestionSet(get_recent_questions(student_id, days=days))
+    
+    recent = RecentQuestionSet.from_day_buckets(student_data['recent_questions_by_day'], days)
+    
+    if recent_question_log_needed(student_data, days):
+        recent = RecentQuestionSet(set(recent) | set(get_recent_questions(student_id, days=days)))
+    
+    return recent
+
+
+def recent_question_log_needed(student_data: Dict, days: int = RECENT_QUESTIONS_WINDOW_DAYS) -> bool:
+    """
+    Whether the day buckets alone do not yet cover the recency window.
+    
+    True for profiles without buckets, and for legacy profiles until the
+    window start has passed recent_questions_tracked_since.
+    """
+    if 'recent_questions_by_day' not in student_data:
+        return True
+    tracked_since = student_data.get('recent_questions_tracked_since')
+    return bool(tracked_since) and \
+        datetime.fromisoformat(tracked_since) > datetime.utcnow() - timedelta(days=days)
+
+
+def expired_recent_question_days(buckets: Dict[str, List[str]],
+                                 days: int = RECENT_QUESTIONS_WINDOW_DAYS,
+                                 now: Optional[datetime] = None) -> List[str]:
+    """Day keys in recent_questions_by_day that have aged out of the window"""
+    oldest_key = recent_question_day_key((now or datetime.utcnow()) - timedelta(days=days))
+    return [day_key for day_key in buckets if day_key < oldest_key]
+
+
 def get_unexplored_topics(topic_attempts: Dict, min_attempts: int = 2) -> List[str]:
     """Get topics with fewer than min_attempts"""
     all_topics = list(JEE_TOPIC_WEIGHTS.keys())
@@ -1082,10 +3722,15 @@ def get_unexplored_topics(topic_attempts: Dict, min_attempts: int = 2) -> List[s
 
 
 def prioritize_exploration_topics(unexplored_topics: List[str], 
-                                  subject_balance: Dict) -> List[str]:
+                                  subject_balance: Dict,
+                                  predictable_topics: Collection[str] = ()) -> List[str]:
     """
     Rank unexplored topics by strategic importance.
     Returns sorted list (highest priority first).
+    
+    predictable_topics (see get_predictable_topics) go after the rest: the
+    covariance prior already estimates them, so exploration slots are spent
+    on topics it cannot predict.
     """
     scored_topics = []
     
@@ -1112,7 +3757,9 @@ def prioritize_exploration_topics(unexplored_topics: List[str],
         
         scored_topics.append((topic, priority))
     
-    return [topic for topic, _ in sorted(scored_topics, key=lambda x: x[1], reverse=True)]
+    return [topic for topic, _ in sorted(scored_topics,
+                                         key=lambda x: (x[0] not in predictable_topics, x[1]),
+                                         reverse=True)]
 
 
 def rank_topics_by_weakness(topics: List[str], theta_by_topic: Dict) -> List[str]:
@@ -1121,10 +3768,14 @@ def rank_topics_by_weakness(topics: List[str], theta_by_topic: Dict) -> List[str
 
 
 def rank_topics_by_priority_formula(topics: List[str], theta_by_topic: Dict,
-                                    topic_attempts: Dict, student_id: str) -> List[str]:
+                                    topic_attempts: Dict, student_id: str,
+                                    days_since_by_topic: Optional[Dict[str, int]] = None) -> List[str]:
     """
     Rank topics by weakness priority for exploitation phase.
     Priority = weakness * 0.6 + recency * 0.2 + jee_weight * 0.2
+    
+    days_since_by_topic supplies prefetched recency; topics missing from it
+    are looked up with days_since_last_attempt.
     """
     scored_topics = []
     
@@ -1136,7 +3787,10 @@ def rank_topics_by_priority_formula(topics: List[str], theta_by_topic: Dict,
         weakness_score = 1.0 - normalized_theta
         
         # Component 2: Recency (20%)
-        days_since = days_since_last_attempt(topic, student_id)
+        if days_since_by_topic is not None and topic in days_since_by_topic:
+            days_since = days_since_by_topic[topic]
+        else:
+            days_since = days_since_last_attempt(topic, student_id)
         recency_score = min(1.0, days_since / 7)
         
         # Component 3: JEE Weight (20%)
@@ -1153,9 +3807,13 @@ def rank_topics_by_priority_formula(topics: List[str], theta_by_topic: Dict,
     return [topic for topic, _ in sorted(scored_topics, key=lambda x: x[1], reverse=True)]
 
 
-def days_since_last_attempt(topic: str, student_id: str) -> int:
+def days_since_last_attempt(topic: str, student_id: str,
+                            ctx: Optional[QuizGenerationContext] = None) -> int:
     """Calculate days since last attempt of a topic"""
-    db = firestore.client()
+    if ctx is not None:
+        return ctx.days_since_last_attempt(topic)
+    
+    db = get_firestore_client()
     
     responses = db.collection('student_responses').document(student_id)\
                   .collection('responses')\
@@ -1163,9 +3821,19 @@ def days_since_last_attempt(topic: str, student_id: str) -> int:
                   .order_by('answered_at', direction=firestore.Query.DESCENDING)\
                   .limit(1)\
                   .stream()
+    latest = [r.to_dict() for r in responses]
     
-    for r in responses:
-        last_answered = datetime.fromisoformat(r.to_dict()['answered_at'])
+    if not latest:
+        # Nothing in the raw log; the topic may only survive in the rollup
+        latest = rollup_latest_responses(load_response_rollup(student_id), topic)
+    
+    return _days_since_latest_response(latest)
+
+
+def _days_since_latest_response(latest_responses: List[Dict]) -> int:
+    """Days since the first (most recent) response, 999 if there is none"""
+    for response in latest_responses:
+        last_answered = datetime.fromisoformat(response['answered_at'])
         delta = datetime.utcnow() - last_answered
         return delta.days
     
@@ -1173,8 +3841,11 @@ def days_since_last_attempt(topic: str, student_id: str) -> int:
 
 
 def select_optimal_question_IRT(topic: str, target_theta: float, 
-                               recent_questions: List[str],
-                               discrimination_min: float) -> Optional[Dict]:
+                               recent_questions: Collection[str],
+                               discrimination_min: float,
+                               exposure_control: Optional[str] = EXPOSURE_CONTROL_METHOD,
+                               ctx: Optional[QuizGenerationContext] = None,
+                               rng: Optional[random.Random] = None) -> Optional[Dict]:
     """
     Select single best question using IRT optimization.
     
@@ -1182,18 +3853,39 @@ def select_optimal_question_IRT(topic: str, target_theta: float,
     1. Difficulty matches ability: |b - θ| < 0.5
     2. High discrimination: a ≥ discrimination_min
     3. Not recently answered
-    4. Maximizes Fisher information
-    """
-    db = firestore.client()
-    
-    # Query questions for topic
-    questions_query = db.collection('questions')\
-                       .where('topic', '==', topic)\
-                       .stream()
+    4. Maximizes Fisher information, subject to exposure control:
+       - None: always the maximum-information question
+       - "randomesque": random pick among the top RANDOMESQUE_TOP_K
+       - "sympson_hetter": walk down by information, administering each
+         question with its exposure-control probability K_i
     
+    Exposure-control draws come from rng (see quiz_rng).
+    """
+    with instrument.span("select_optimal_question_IRT.fetch"):
+        if ctx is not None:
+            question_docs = ctx.topic_questions(topic)
+        else:
+            db = get_firestore_client()
+            
+            # Query questions for topic
+            question_docs = [q.to_dict() for q in db.collection('questions')
+                                                    .where('topic', '==', topic)
+                                                    .stream()]
+    
+    with instrument.span("select_optimal_question_IRT.score"):
+        return _choose_from_topic_candidates(
+            topic, question_docs, target_theta, recent_questions,
+            discrimination_min, exposure_control, rng
+        )
+
+
+def _choose_from_topic_candidates(topic: str, question_docs: List[Dict], target_theta: float,
+                                  recent_questions: Collection[str], discrimination_min: float,
+                                  exposure_control: Optional[str],
+                                  rng: Optional[random.Random] = None) -> Optional[Dict]:
+    """Filtering, information scoring and exposure control for select_optimal_question_IRT"""
     candidates = []
-    for q_doc in questions_query:
-        q_data = q_doc.to_dict()
+    for q_data in question_docs:
         question_id = q_data['question_id']
         irt = q_data['irt_parameters']
         
@@ -1213,79 +3905,153 @@ def select_optimal_question_IRT(topic: str, target_theta: float,
     
     # If no candidates, relax constraints
     if len(candidates) == 0:
-        candidates = [(q.to_dict(), q.to_dict()['irt_parameters']) 
-                     for q in questions_query
-                     if q.to_dict()['question_id'] not in recent_questions]
+        candidates = [(q_data, q_data['irt_parameters'])
+                      for q_data in question_docs
+                      if q_data['question_id'] not in recent_questions]
     
     if len(candidates) == 0:
         return None
     
-    # Score by Fisher information
-    scored = []
-    for q_data, irt in candidates:
-        info = calculate_fisher_information(
-            target_theta, irt['difficulty_b'], 
-            irt['discrimination_a'], irt['guessing_c']
-        )
-        scored.append((q_data, info))
+    # Score by Fisher information (one vectorized call for all candidates)
+    info = calculate_fisher_information_array(
+        target_theta,
+        np.array([irt['difficulty_b'] for _, irt in candidates]),
+        np.array([irt['discrimination_a'] for _, irt in candidates]),
+        np.array([irt['guessing_c'] for _, irt in candidates])
+    )
+    scored = list(zip((q_data for q_data, _ in candidates), info.tolist()))
     
-    # Select highest information
-    best = max(scored, key=lambda x: x[1])
-    return best[0]
+    # Highest information first
+    scored.sort(key=lambda x: x[1], reverse=True)
+    ranked = [q_data for q_data, _ in scored]
+    
+    tracker = get_item_exposure_tracker()
+    chosen, offered = apply_exposure_control(ranked, exposure_control, tracker, rng)
+    tracker.record_selection(topic, [q['question_id'] for q in offered],
+                             chosen['question_id'])
+    
+    return chosen
 
 
-def interleave_questions_by_topic(questions: List[Dict]) -> List[Dict]:
+def interleave_questions_by_topic(questions: List[Dict],
+                                  rng: Optional[random.Random] = None,
+                                  subject_spacing: bool = False,
+                                  difficulty_ramp: bool = False) -> List[Dict]:
     """
-    Shuffle questions to prevent topic clustering.
-    Ensures no two consecutive questions from same topic.
+    Order questions so no two consecutive ones share a topic whenever any
+    such order exists.
+    
+    Greedy over a max-heap of topics keyed by questions left: each step
+    takes the fullest topic other than the previous one. Spending the
+    largest group first keeps it spread out, so this only fails when one
+    topic holds more than ceil(n / 2) of the questions, where no valid
+    order exists (its surplus ends up adjacent at the end). Choosing
+    between equally full topics never affects that guarantee, so the
+    options below only act on ties. O(n log t) for n questions over t topics.
+    
+    Args:
+        questions: Question dictionaries
+        rng: Breaks ties between equally full topics (see quiz_rng); None =
+             first-appearance order, fully deterministic
+        subject_spacing: Among equally full topics, prefer one whose subject
+                         differs from the previous question's (checks up to
+                         INTERLEAVE_SUBJECT_LOOKAHEAD of them)
+        difficulty_ramp: Easier questions first: each topic's questions go in
+                         ascending difficulty_b, and of equally full topics the
+                         one with the easiest next question goes first
+    
+    Returns:
+        The same questions, reordered
     """
-    # Group by topic
     topic_groups = {}
     for q in questions:
-        topic = q['topic']
-        if topic not in topic_groups:
-            topic_groups[topic] = []
-        topic_groups[topic].append(q)
-    
-    # Interleave
-    interleaved = []
-    remaining_topics = list(topic_groups.keys())
-    
-    while remaining_topics:
-        # Avoid same topic twice in a row
-        if len(interleaved) > 0:
-            last_topic = interleaved[-1]['topic']
-            available = [t for t in remaining_topics if t != last_topic]
-        else:
-            available = remaining_topics
+        topic_groups.setdefault(q['topic'], []).append(q)
+    if difficulty_ramp:
+        for group in topic_groups.values():
+            group.sort(key=lambda q: q['irt_parameters']['difficulty_b'])
+    
+    subjects = {topic: (group[0].get('subject') or get_subject_from_topic(topic)).lower()
+                for topic, group in topic_groups.items()}
+    tiebreak = {topic: rng.random() if rng is not None else i
+                for i, topic in enumerate(topic_groups)}
+    taken = dict.fromkeys(topic_groups, 0)
+    
+    def heap_entry(topic):
+        """(-questions left, next difficulty if ramping, tiebreak, topic)"""
+        group = topic_groups[topic]
+        ramp = group[taken[topic]]['irt_parameters']['difficulty_b'] if difficulty_ramp else 0.0
+        return (-(len(group) - taken[topic]), ramp, tiebreak[topic], topic)
+    
+    heap = [heap_entry(topic) for topic in topic_groups]
+    heapq.heapify(heap)
+    width = 1 + INTERLEAVE_SUBJECT_LOOKAHEAD if subject_spacing else 1
+    
+    ordered = []
+    last_topic = None
+    
+    while heap:
+        # Pop the fullest topics (all equally full), setting the previous one aside
+        candidates, previous = [], []
+        while heap and len(candidates) < width:
+            if candidates and heap[0][0] != candidates[0][0]:
+                break
+            entry = heapq.heappop(heap)
+            (previous if entry[3] == last_topic else candidates).append(entry)
+        if not candidates:
+            candidates, previous = previous, []  # Only the previous topic is left
         
-        if len(available) == 0:
-            available = remaining_topics
+        choice = candidates[0]
+        if subject_spacing and ordered:
+            last_subject = subjects[last_topic]
+            choice = next((c for c in candidates if subjects[c[3]] != last_subject), choice)
         
-        next_topic = random.choice(available)
-        interleaved.append(topic_groups[next_topic].pop(0))
+        for entry in candidates + previous:
+            if entry is not choice:
+                heapq.heappush(heap, entry)
         
-        if len(topic_groups[next_topic]) == 0:
-            remaining_topics.remove(next_topic)
-    
-    return interleaved
+        topic = choice[3]
+        ordered.append(topic_groups[topic][taken[topic]])
+        taken[topic] += 1
+        if taken[topic] < len(topic_groups[topic]):
+            heapq.heappush(heap, heap_entry(topic))
+        last_topic = topic
+    
+    return ordered
 
 
-def get_spaced_review_question(student_id: str, recent_questions: List[str]) -> Optional[Dict]:
+def get_spaced_review_question(student_id: str, recent_questions: Collection[str],
+                               ctx: Optional[QuizGenerationContext] = None) -> Optional[Dict]:
     """
     Select one question for spaced repetition review.
     Intervals: 1, 3, 7, 14, 30 days
     """
-    db = firestore.client()
+    if ctx is not None:
+        question_id = _pick_spaced_review_question_id(ctx.correct_responses(), recent_questions)
+        return ctx.question(question_id) if question_id is not None else None
     
-    # Get past correct answers
+    db = get_firestore_client()
+    
+    # Get past correct answers (raw log plus compacted review candidates)
     responses = db.collection('student_responses').document(student_id)\
                   .collection('responses')\
                   .where('is_correct', '==', True)\
                   .stream()
+    correct_responses = [r.to_dict() for r in responses] + \
+        rollup_review_responses(load_response_rollup(student_id))
+    
+    question_id = _pick_spaced_review_question_id(correct_responses, recent_questions)
+    if question_id is None:
+        return None
     
-    reviewable = [r.to_dict() for r in responses 
-                  if r.to_dict()['question_id'] not in recent_questions]
+    q_ref = db.collection('questions').document(question_id)
+    return q_ref.get().to_dict()
+
+
+def _pick_spaced_review_question_id(correct_responses: List[Dict],
+                                    recent_questions: Collection[str]) -> Optional[str]:
+    """Spaced-repetition choice among past correct responses (None if nothing is due)"""
+    reviewable = [r for r in correct_responses
+                  if r['question_id'] not in recent_questions]
     
     if len(reviewable) == 0:
         return None
@@ -1319,29 +4085,58 @@ def get_spaced_review_question(student_id: str, recent_questions: List[str]) ->
     
     # Pick highest priority, longest time
     best = max(scored, key=lambda x: (x[1], x[2]))
-    question_id = best[0]
-    
-    q_ref = db.collection('questions').document(question_id)
-    return q_ref.get().to_dict()
+    return best[0]
 
 
 def save_quiz_metadata(student_id: str, quiz_id: str, completed_quiz_count: int,
-                      learning_phase: str, questions: List[Dict]):
+                      learning_phase: str, questions: List[Dict],
+                      selection_seed: Optional[int] = None,
+                      degradations: Optional[List[str]] = None,
+                      ctx: Optional[QuizGenerationContext] = None):
     """Save quiz metadata to Firebase for analytics"""
-    db = firestore.client()
+    db = get_firestore_client()
     
     # Calculate current day for analytics
-    student_ref = db.collection('students').document(student_id)
-    student_data = student_ref.get().to_dict()
-    assessment_date = datetime.fromisoformat(student_data['assessment_completed_at'])
+    if ctx is not None:
+        student_data = ctx.student_data()
+    else:
+        student_ref = db.collection('students').document(student_id)
+        student_data = student_ref.get().to_dict()
+    
+    quiz_data = build_quiz_metadata(student_id, quiz_id, completed_quiz_count,
+                                    learning_phase, questions,
+                                    student_data['assessment_completed_at'], selection_seed,
+                                    degradations)
+    
+    db.collection('quizzes').document(student_id)\
+      .collection('quizzes').document(quiz_id).set(quiz_data)
+    if ctx is not None:
+        ctx.writes += 1
+
+
+def build_quiz_metadata(student_id: str, quiz_id: str, completed_quiz_count: int,
+                        learning_phase: str, questions: List[Dict],
+                        assessment_completed_at: str,
+                        selection_seed: Optional[int] = None,
+                        degradations: Optional[List[str]] = None) -> Dict:
+    """
+    Quiz metadata document saved by save_quiz_metadata.
+    
+    selection_seed with quiz_number reproduces the quiz's RNG (quiz_rng), so
+    regenerating against the same profile state yields the same questions.
+    degradations lists the deadline fallbacks taken (see QuizDeadline).
+    """
+    assessment_date = datetime.fromisoformat(assessment_completed_at)
     current_day = (datetime.utcnow() - assessment_date).days
     
-    quiz_data = {
+    return {
         "quiz_id": quiz_id,
         "student_id": student_id,
         "quiz_number": completed_quiz_count,  # PRIMARY: quiz count
         "current_day": current_day,  # Analytics: calendar days
         "learning_phase": learning_phase,
+        "selection_seed": selection_seed,
+        "degradations": degradations or [],
         "generated_at": datetime.utcnow().isoformat(),
         "questions": [
             {
@@ -1354,43 +4149,3060 @@ def save_quiz_metadata(student_id: str, quiz_id: str, completed_quiz_count: int,
         ],
         "topics_covered": list(set(q['topic'] for q in questions))
     }
-    
-    db.collection('quizzes').document(student_id)\
-      .collection('quizzes').document(quiz_id).set(quiz_data)
 
 
 # ============================================================================
-# MAIN EXECUTION FLOW
+# ASYNC QUIZ GENERATION (CONCURRENT FIRESTORE READS)
 # ============================================================================
+# Same selection rules as the synchronous functions above (they share the
+# pure helpers), but every independent Firestore read is issued at once with
+# asyncio.gather, so wall-clock time is bounded by the slowest query rather
+# than the sum of all of them.
 
-if __name__ == "__main__":
-    # Example usage
+async def get_recent_questions_async(student_id: str, days: int = 30) -> List[str]:
+    """Async get_recent_questions"""
+    db = get_async_firestore_client()
+    cutoff = datetime.utcnow() - timedelta(days=days)
     
-    # Initialize Firebase (you'll need to provide credentials)
-    # cred = credentials.Certificate('path/to/serviceAccountKey.json')
-    # firebase_admin.initialize_app(cred)
+    responses = db.collection('student_responses').document(student_id)\
+                  .collection('responses')\
+                  .where('answered_at', '>=', cutoff.isoformat())\
+                  .stream()
     
-    # Example 1: Process initial assessment
-    sample_responses = [
-        {"question_id": "ASSESS_PHY_MECH_001", "answer": "A", "is_correct": True, "time_taken": 95},
-        {"question_id": "ASSESS_PHY_MECH_002", "answer": "C", "is_correct": False, "time_taken": 140},
-        # ... 28 more
-    ]
+    return [r.to_dict()['question_id'] async for r in responses]
+
+
+async def check_circuit_breaker_async(student_id: str) -> bool:
+    """Async check_circuit_breaker"""
+    db = get_async_firestore_client()
     
-    # profile = process_initial_assessment("student_12345", sample_responses)
-    # print(f"Initial theta: {profile['overall_theta']}")
+    recent_responses = db.collection('student_responses')\
+                        .document(student_id)\
+                        .collection('responses')\
+                        .order_by('answered_at', direction=firestore.Query.DESCENDING)\
+                        .limit(10)\
+                        .stream()
     
-    # Example 2: Generate daily quiz (quiz-based, not day-based)
-    # completed_quiz_count = 0  # First quiz after assessment
-    # quiz = generate_daily_quiz("student_12345", completed_quiz_count=0)
-    # print(f"Generated {len(quiz)} questions for Quiz #{completed_quiz_count}")
+    return _is_failure_streak([r.to_dict() async for r in recent_responses])
+
+
+async def days_since_last_attempt_async(topic: str, student_id: str) -> int:
+    """Async days_since_last_attempt"""
+    db = get_async_firestore_client()
     
-    # Example 2b: Auto-fetch quiz count from DB
-    # quiz = generate_daily_quiz("student_12345")  # Fetches completed_quiz_count from profile
-    # print(f"Generated quiz")
+    responses = db.collection('student_responses').document(student_id)\
+                  .collection('responses')\
+                  .where('topic', '==', topic)\
+                  .order_by('answered_at', direction=firestore.Query.DESCENDING)\
+                  .limit(1)\
+                  .stream()
+    latest = [r.to_dict() async for r in responses]
     
-    # Example 3: Update theta after response
-    # new_theta = update_theta_after_response("student_12345", "MECH_045", is_correct=True, time_taken=120)
-    # print(f"Updated theta: {new_theta}")
+    if not latest:
+        rollup_doc = await db.collection('student_response_rollups').document(student_id).get()
+        latest = rollup_latest_responses(rollup_doc.to_dict() or {}, topic)
+    
+    return _days_since_latest_response(latest)
+
+
+async def select_optimal_question_IRT_async(topic: str, target_theta: float,
+                                            recent_questions: Collection[str],
+                                            discrimination_min: float,
+                                            exposure_control: Optional[str] = EXPOSURE_CONTROL_METHOD,
+                                            rng: Optional[random.Random] = None
+                                            ) -> Optional[Dict]:
+    """Async select_optimal_question_IRT"""
+    db = get_async_firestore_client()
+    
+    questions = db.collection('questions').where('topic', '==', topic).stream()
+    question_docs = [q.to_dict() async for q in questions]
+    
+    return _choose_from_topic_candidates(
+        topic, question_docs, target_theta, recent_questions,
+        discrimination_min, exposure_control, rng
+    )
+
+
+async def get_spaced_review_question_async(student_id: str,
+                                           recent_questions: Collection[str]) -> Optional[Dict]:
+    """Async get_spaced_review_question"""
+    db = get_async_firestore_client()
+    
+    async def raw_correct_responses():
+        responses = db.collection('student_responses').document(student_id)\
+                      .collection('responses')\
+                      .where('is_correct', '==', True)\
+                      .stream()
+        return [r.to_dict() async for r in responses]
+    
+    raw_responses, rollup_doc = await asyncio.gather(
+        raw_correct_responses(),
+        db.collection('student_response_rollups').document(student_id).get()
+    )
+    
+    question_id = _pick_spaced_review_question_id(
+        raw_responses + rollup_review_responses(rollup_doc.to_dict() or {}), recent_questions
+    )
+    if question_id is None:
+        return None
+    
+    q_doc = await db.collection('questions').document(question_id).get()
+    return q_doc.to_dict()
+
+
+async def generate_daily_quiz_async(student_id: str, completed_quiz_count: int = None,
+                                    assembly_mode: str = "greedy",
+                                    seed: int = QUIZ_SELECTION_SEED,
+                                    deadline_seconds: Optional[float] = QUIZ_DEADLINE_SECONDS) -> List[Dict]:
+    """
+    Async generate_daily_quiz using the async Firestore client.
+    
+    Round trips:
+    1. Student profile and circuit breaker together (the 30-day recency
+       window is read from the profile)
+    2. (Exploitation) last-attempt lookups for every topic together
+    3. All per-topic candidate queries and the spaced-review lookup together
+    4. Quiz metadata and profile update written together
+    
+    Args:
+        student_id: Unique student identifier
+        completed_quiz_count: Number of quizzes completed (0-indexed). If None, fetches from DB.
+        assembly_mode: "greedy" or "optimal" (see generate_daily_quiz)
+        seed: Selection seed; same quiz as generate_daily_quiz for the same
+              seed (each slot draws from its own split_rng child)
+        deadline_seconds: Latency budget; overrunning round trips are
+                          cancelled and replaced as in generate_daily_quiz
+    
+    Returns:
+        quiz: List of 10 question dictionaries
+    """
+    db = get_async_firestore_client()
+    student_ref = db.collection('students').document(student_id)
+    deadline = QuizDeadline(deadline_seconds)
+    
+    # ========================================
+    # ROUND 1: Independent lookups
+    # ========================================
+    
+    student_doc, circuit_breaker_tripped = await asyncio.gather(
+        deadline.call_async("cached_quiz", student_ref.get()),
+        deadline.call_async("circuit_breaker_skipped", check_circuit_breaker_async(student_id),
+                            fallback=lambda: False)
+    )
+    if student_doc is None:
+        deadline.record(student_id)
+        return cached_quiz(student_id)
+    
+    student_data = student_doc.to_dict()
+    
+    # Recency window rides on the profile; only legacy profiles need the query
+    if not recent_question_log_needed(student_data):
+        recent_questions_30d = get_recent_question_set(student_id, student_data)
+    else:
+        recent_questions_30d = await deadline.call_async(
+            "profile_recent_questions",
+            asyncio.to_thread(get_recent_question_set, student_id, student_data),
+            fallback=lambda: RecentQuestionSet.from_day_buckets(
+                student_data.get('recent_questions_by_day', {}))
+        )
+    
+    if completed_quiz_count is None:
+        completed_quiz_count = student_data.get('completed_quiz_count', 0)
+    
+    if circuit_breaker_tripped:
+        instrument.event("circuit_breaker.activated",
+                         f"⚠️ Circuit breaker activated for {student_id}", level=logging.WARNING)
+        recovery_quiz = await deadline.call_async(
+            "cached_quiz",
+            asyncio.to_thread(generate_recovery_quiz, student_id, student_data, seed=seed,
+                              save=False)
+        )
+        if recovery_quiz is None:
+            # A generic quiz is not a recovery quiz: no event, metadata or phase change
+            deadline.record(student_id)
+            return cached_quiz(student_id)
+        
+        await deadline.finish_writes_async(asyncio.gather(
+            asyncio.to_thread(save_recovery_quiz, student_id,
+                              student_data.get('completed_quiz_count', 0), recovery_quiz, seed),
+            student_ref.update({
+                'completed_quiz_count': firestore.Increment(1),
+                'learning_phase': 'recovery',
+                'last_quiz_completed_at': datetime.utcnow().isoformat()
+            })
+        ))
+        deadline.record(student_id)
+        
+        return recovery_quiz
+    
+    # ========================================
+    # ROUND 2: Topic recency for exploitation ranking
+    # ========================================
+    
+    days_since_by_topic = None
+    if completed_quiz_count >= EXPLORATION_END_QUIZ:
+        topics = list(student_data['theta_by_topic'].keys())
+        days_since = await deadline.call_async(
+            "profile_recency",
+            asyncio.gather(*(days_since_last_attempt_async(topic, student_id) for topic in topics))
+        )
+        if days_since is None:
+            days_since_by_topic = days_since_from_profile(student_data['theta_by_topic'])
+        else:
+            days_since_by_topic = dict(zip(topics, days_since))
+    
+    rng = quiz_rng(student_id, completed_quiz_count, seed)
+    learning_phase, selection_slots = plan_quiz_selection_slots(
+        student_id, student_data, completed_quiz_count, days_since_by_topic, rng=rng
+    )
+    
+    # ========================================
+    # ROUND 3: Candidate queries + review lookup
+    # ========================================
+    
+    review_lookup = deadline.call_async(
+        "review_skipped", get_spaced_review_question_async(student_id, recent_questions_30d)
+    )
+    
+    if assembly_mode == "optimal":
+        index = await asyncio.to_thread(get_question_bank_index)
+        blueprint = build_daily_quiz_blueprint(selection_slots)
+        item_seconds = await asyncio.to_thread(expected_item_seconds, student_data, index)
+        quiz_questions, review_q = await asyncio.gather(
+            asyncio.to_thread(assemble_optimal_quiz, blueprint, recent_questions_30d, index,
+                              item_seconds, rng),
+            review_lookup
+        )
+    else:
+        slot_rngs = split_rng(rng, len(selection_slots))
+        slot_tasks = [
+            asyncio.ensure_future(select_optimal_question_IRT_async(
+                topic, target_theta, recent_questions_30d,
+                discrimination_min=discrimination_min, rng=slot_rng))
+            for (topic, target_theta, discrimination_min), slot_rng
+            in zip(selection_slots, slot_rngs)
+        ]
+        
+        async def await_slots():
+            if slot_tasks and deadline.expires_at is not None:
+                await asyncio.wait(slot_tasks, timeout=max(0.0, deadline.remaining()))
+            else:
+                await asyncio.gather(*slot_tasks)
+        
+        _, review_q = await asyncio.gather(await_slots(), review_lookup)
+        
+        # Slots whose query overran or failed are assembled from the in-memory index
+        selected, late = [], []
+        for slot, task in zip(selection_slots, slot_tasks):
+            if task.done() and not task.cancelled() and task.exception() is None:
+                selected.append(task.result())
+            else:
+                task.cancel()
+                late.append(slot)
+        if late:
+            deadline.degrade("index_selection")
+            selected += complete_slots_from_index(late, [], set(recent_questions_30d) |
+                                                  {q['question_id'] for q in selected if q})
+        quiz_questions = [q for q in selected if q]
+    
+    if review_q:
+        quiz_questions.append(review_q)
+    
+    # ========================================
+    # FINALIZE QUIZ
+    # ========================================
+    
+    interleaved_quiz = interleave_questions_by_topic(
+        quiz_questions, rng=rng, subject_spacing=INTERLEAVE_SUBJECT_SPACING,
+        difficulty_ramp=INTERLEAVE_DIFFICULTY_RAMP
+    )
+    final_quiz = interleaved_quiz[:QUIZ_LENGTH]
+    
+    quiz_id = f"quiz_num{completed_quiz_count}_{datetime.utcnow().strftime('%Y-%m-%d_%H-%M')}"
+    quiz_data = build_quiz_metadata(student_id, quiz_id, completed_quiz_count,
+                                    learning_phase, final_quiz,
+                                    student_data['assessment_completed_at'], seed,
+                                    list(deadline.degradations))
+    
+    profile_update = {
+        'completed_quiz_count': firestore.Increment(1),
+        'learning_phase': learning_phase,
+        'last_quiz_completed_at': datetime.utcnow().isoformat()
+    }
+    if learning_phase == "exploitation" and student_data.get('phase_switched_at_quiz') is None:
+        profile_update['phase_switched_at_quiz'] = completed_quiz_count
+    
+    await deadline.finish_writes_async(asyncio.gather(
+        db.collection('quizzes').document(student_id)
+          .collection('quizzes').document(quiz_id).set(quiz_data),
+        student_ref.update(profile_update)
+    ))
+    deadline.record(student_id)
+    
+    return final_quiz
+
+
+# ============================================================================
+# QUESTION BANK INDEX (IN-MEMORY)
+# ============================================================================
+
+def get_difficulty_label(difficulty_b: float) -> str:
+    """Map a difficulty_b value onto the question bank's easy/medium/hard labels"""
+    if difficulty_b < DIFFICULTY_MEDIUM_MIN:
+        return "easy"
+    elif difficulty_b < DIFFICULTY_HARD_MIN:
+        return "medium"
+    else:
+        return "hard"
+
+
+class QuestionBankIndex:
+    """
+    Columnar in-memory view of the question bank.
+    
+    Rows are sorted by (topic, difficulty_b, question_id) so every topic is a
+    contiguous slice recorded in topic_offsets. IRT parameters are parallel
+    numpy arrays, which lets selection score a whole topic in one call
+    instead of streaming and decoding Firestore documents per candidate.
+    """
+    
+    def __init__(self, question_ids, topics, subjects, difficulties, question_types,
+                 difficulty_b: np.ndarray, discrimination_a: np.ndarray,
+                 guessing_c: np.ndarray, time_estimates: np.ndarray,
+                 documents: Optional[Dict[str, Dict]] = None,
+                 topic_offsets: Optional[Dict[str, Tuple[int, int]]] = None,
+                 id_order: Optional[np.ndarray] = None,
+                 information_table: Optional[np.ndarray] = None,
+                 probability_table: Optional[np.ndarray] = None):
+        """
+        Columns must already be sorted by (topic, difficulty_b, question_id).
+        
+        Columns are used as given (lists or numpy arrays, including
+        memory-mapped ones), so attaching to a snapshot copies nothing.
+        topic_offsets, id_order (argsort of question_ids) and the THETA_GRID
+        curve tables are derived when not supplied (the tables on first use).
+        """
+        self.question_ids = question_ids
+        self.topics = topics
+        self.subjects = subjects
+        self.difficulties = difficulties
+        self.question_types = question_types
+        self.difficulty_b = np.asarray(difficulty_b, dtype=np.float64)
+        self.discrimination_a = np.asarray(discrimination_a, dtype=np.float64)
+        self.guessing_c = np.asarray(guessing_c, dtype=np.float64)
+        self.time_estimates = np.asarray(time_estimates, dtype=np.int32)
+        self.documents = documents if documents is not None else {}
+        
+        # Question ID -> row via binary search over the ID sort order
+        if id_order is None:
+            id_order = np.argsort(np.asarray(question_ids, dtype=str), kind='stable')
+        self.id_order = id_order
+        
+        # Topic -> (start, end) row slice
+        if topic_offsets is None:
+            topic_offsets = {}
+            for row, topic in enumerate(self.topics):
+                start, _ = topic_offsets.get(topic, (row, row))
+                topic_offsets[topic] = (start, row + 1)
+        self.topic_offsets = topic_offsets
+        
+        self._information_table = information_table
+        self._probability_table = probability_table
+        self._cutoff_cells: Optional[np.ndarray] = None  # Derived from the information table
+        
+        self.snapshot_version: Optional[str] = None  # Set when attached to a snapshot
+    
+    @classmethod
+    def from_documents(cls, documents: List[Dict]) -> "QuestionBankIndex":
+        """Build the index from raw question documents"""
+        docs = sorted(
+            documents,
+            key=lambda d: (d['topic'], d['irt_parameters']['difficulty_b'], d['question_id'])
+        )
+        
+        return cls(
+            question_ids=np.array([d['question_id'] for d in docs], dtype=str),
+            topics=np.array([d['topic'] for d in docs], dtype=str),
+            subjects=np.array([(d.get('subject') or get_subject_from_topic(d['topic'])).lower()
+                               for d in docs], dtype=str),
+            difficulties=np.array([d.get('difficulty') or
+                                   get_difficulty_label(d['irt_parameters']['difficulty_b'])
+                                   for d in docs], dtype=str),
+            question_types=np.array([d.get('question_type', 'mcq_single') for d in docs], dtype=str),
+            difficulty_b=[d['irt_parameters']['difficulty_b'] for d in docs],
+            discrimination_a=[d['irt_parameters']['discrimination_a'] for d in docs],
+            guessing_c=[d['irt_parameters']['guessing_c'] for d in docs],
+            time_estimates=[d.get('time_estimate', 0) for d in docs],
+            documents={d['question_id']: d for d in docs}
+        )
+    
+    def __len__(self) -> int:
+        return len(self.question_ids)
+    
+    def row_of(self, question_id: str) -> Optional[int]:
+        """Row number of a question ID (None if not in the bank)"""
+        pos = int(np.searchsorted(self.question_ids, question_id, sorter=self.id_order))
+        if pos < len(self) and self.question_ids[self.id_order[pos]] == question_id:
+            return int(self.id_order[pos])
+        return None
+    
+    def topic_rows(self, topic: str) -> range:
+        """Row numbers belonging to a topic (empty if topic has no questions)"""
+        start, end = self.topic_offsets.get(topic, (0, 0))
+        return range(start, end)
+    
+    def curve_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(information, probability) tables over THETA_GRID, built on first use"""
+        if self._information_table is None:
+            self._information_table, self._probability_table = build_item_curve_tables(
+                self.difficulty_b, self.discrimination_a, self.guessing_c
+            )
+        return self._information_table, self._probability_table
+    
+    def fisher_information(self, rows, theta) -> np.ndarray:
+        """
+        Fisher information of the given rows at theta.
+        
+        Table lookup, except in the grid cells a P(θ) cut-off falls inside,
+        which are evaluated exactly. Elsewhere the curves are smooth and, for
+        discrimination up to 3, the interpolation error stays below
+        INFORMATION_INTERPOLATION_TOLERANCE times the item's peak information
+        (absolute: ~4e-5 for a <= 1, ~2.5e-3 for a <= 2, ~0.03 for a <= 3).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        information = interpolate_item_curves(self.curve_tables()[0], rows, theta)
+        
+        if self._cutoff_cells is None:
+            self._cutoff_cells = information_cutoff_cells(self.curve_tables()[0])
+        lower, _ = theta_grid_cell(theta)
+        exact = self._cutoff_cells[rows, lower]
+        if exact.any():
+            exact_rows = rows[exact]
+            exact_theta = np.broadcast_to(np.clip(theta, THETA_MIN, THETA_MAX), rows.shape)[exact]
+            information = np.array(information, dtype=np.float64)
+            information[exact] = calculate_fisher_information_array(
+                exact_theta, self.difficulty_b[exact_rows],
+                self.discrimination_a[exact_rows], self.guessing_c[exact_rows]
+            )
+        return information
+    
+    def probability(self, rows, theta) -> np.ndarray:
+        """3PL probability of a correct answer for the given rows at theta (table lookup)"""
+        return interpolate_item_curves(self.curve_tables()[1], rows, theta)
+    
+    def topic_max_information(self, topic: str) -> np.ndarray:
+        """Best information any of the topic's items offers at each THETA_GRID point"""
+        rows = self.topic_rows(topic)
+        if len(rows) == 0:
+            return np.zeros(len(THETA_GRID))
+        return self.curve_tables()[0][rows.start:rows.stop].max(axis=0)
+    
+    def get_document(self, row: int) -> Dict:
+        """Full question document for a row, fetched from Firebase if not held"""
+        question_id = self.question_ids[row]
+        if question_id not in self.documents:
+            db = get_firestore_client()
+            self.documents[question_id] = db.collection('questions')\
+                                            .document(question_id).get().to_dict()
+        return self.documents[question_id]
+    
+    def hold_all_documents(self, chunk_size: int = 300):
+        """Fetch every full document not yet held, so get_document makes no I/O"""
+        missing = [str(question_id) for question_id in self.question_ids
+                   if question_id not in self.documents]
+        if not missing:
+            return
+        
+        db = get_firestore_client()
+        for start in range(0, len(missing), chunk_size):
+            refs = [db.collection('questions').document(question_id)
+                    for question_id in missing[start:start + chunk_size]]
+            for snapshot in db.get_all(refs):
+                if snapshot.exists:
+                    self.documents[snapshot.id] = snapshot.to_dict()
+        instrument.count("firestore.reads", len(missing), operation="hold_all_documents")
+
+
+_question_bank_index: Optional[QuestionBankIndex] = None
+
+
+def load_question_bank_index() -> QuestionBankIndex:
+    """Stream the whole questions collection once and build a fresh index"""
+    db = get_firestore_client()
+    documents = [q.to_dict() for q in db.collection('questions').stream()]
+    return QuestionBankIndex.from_documents(documents)
+
+
+def get_question_bank_index() -> QuestionBankIndex:
+    """
+    Process-wide question bank index, loaded on first use.
+    
+    Sources, in order:
+    - QUESTION_BANK_SNAPSHOT_DIR set: attached zero-copy to the published
+      snapshot, swapped for a newer snapshot version when one is published
+    - QUESTION_BANK_CHANGE_FEED set (default "poll"): the change-feed
+      QuestionBankCache, cold-started from the columnar export, so
+      Firestore is only read for deltas and question edits show up
+      without a reload
+    - Otherwise: one full Firestore load per process
+    """
+    global _question_bank_index
+    
+    if QUESTION_BANK_SNAPSHOT_DIR:
+        return _snapshot_attachment.current(QUESTION_BANK_SNAPSHOT_DIR)
+    
+    if QUESTION_BANK_CHANGE_FEED:
+        return get_question_bank_cache().index()
+    
+    if _question_bank_index is None:
+        _question_bank_index = load_question_bank_index()
+    
+    return _question_bank_index
+
+
+def find_question_bank_gaps(index: Optional[QuestionBankIndex] = None,
+                            min_information: float = BANK_GAP_MIN_INFORMATION
+                            ) -> Dict[str, List[Tuple[float, float]]]:
+    """
+    Theta ranges where no item of a topic is informative enough.
+    
+    Uses each topic's max-achievable-information curve; topics in
+    JEE_TOPIC_WEIGHTS with no questions at all report the whole scale.
+    
+    Args:
+        index: Question bank index (defaults to the process-wide index)
+        min_information: Information a topic should reach at every theta
+    
+    Returns:
+        topic -> list of (theta_from, theta_to) gaps (topics without gaps omitted)
+    """
+    if index is None:
+        index = get_question_bank_index()
+    
+    gaps = {}
+    for topic in sorted(set(JEE_TOPIC_WEIGHTS) | set(index.topic_offsets)):
+        weak = index.topic_max_information(topic) < min_information
+        ranges = []
+        start = None
+        for point, is_weak in zip(THETA_GRID.tolist(), weak.tolist()):
+            if is_weak and start is None:
+                start = point
+            elif not is_weak and start is not None:
+                ranges.append((start, round(point - THETA_GRID_STEP, 2)))
+                start = None
+        if start is not None:
+            ranges.append((start, THETA_MAX))
+        if ranges:
+            gaps[topic] = [(round(low, 2), high) for low, high in ranges]
+    
+    return gaps
+
+
+# ============================================================================
+# SHARED QUESTION BANK SNAPSHOT (MEMORY-MAPPED, MULTI-WORKER)
+# ============================================================================
+# Layout under the snapshot root:
+#   CURRENT                 -> name of the live version (replaced atomically)
+#   <version>/manifest.json -> row count, column dtypes, topic offsets
+#   <version>/<column>.npy  -> one array per QuestionBankIndex column
+# Workers np.load the columns with mmap_mode='r': pages come from the OS page
+# cache shared by every process, so memory does not grow with worker count
+# and attaching costs only the manifest read.
+
+QUESTION_BANK_SNAPSHOT_COLUMNS = (
+    "question_ids", "topics", "subjects", "difficulties", "question_types",
+    "difficulty_b", "discrimination_a", "guessing_c", "time_estimates", "id_order"
+)
+QUESTION_BANK_SNAPSHOT_TABLES = ("information_table", "probability_table")
+
+
+def publish_question_bank_snapshot(index: QuestionBankIndex, snapshot_root: str) -> str:
+    """
+    Write the index as a new snapshot version and make it current.
+    
+    The version directory is fully written before CURRENT is swapped with
+    os.replace, so workers only ever see a complete snapshot. Versions beyond
+    SNAPSHOT_VERSIONS_KEPT are removed (processes still mapping them keep
+    their open mappings until they re-attach).
+    
+    Args:
+        index: Index to publish
+        snapshot_root: Snapshot directory shared by the workers
+    
+    Returns:
+        The new version name
+    """
+    version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    os.makedirs(snapshot_root, exist_ok=True)
+    staging_dir = os.path.join(snapshot_root, f".{version}.tmp")
+    os.makedirs(staging_dir)
+    
+    manifest = {"version": version, "row_count": len(index), "columns": {},
+                "topic_offsets": {t: list(span) for t, span in index.topic_offsets.items()},
+                "theta_grid_step": THETA_GRID_STEP}
+    
+    for column in QUESTION_BANK_SNAPSHOT_COLUMNS:
+        values = getattr(index, column)
+        array = np.asarray(values, dtype=str) if isinstance(values, list) else np.asarray(values)
+        np.save(os.path.join(staging_dir, f"{column}.npy"), array)
+        manifest["columns"][column] = array.dtype.str
+    
+    # Curve tables ride along so workers share one copy instead of each building it
+    for name, table in zip(QUESTION_BANK_SNAPSHOT_TABLES, index.curve_tables()):
+        np.save(os.path.join(staging_dir, f"{name}.npy"), table)
+    
+    with open(os.path.join(staging_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    
+    os.rename(staging_dir, os.path.join(snapshot_root, version))
+    
+    pointer_tmp = os.path.join(snapshot_root, "CURRENT.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(snapshot_root, "CURRENT"))
+    
+    # Prune old versions
+    versions = sorted(v for v in os.listdir(snapshot_root)
+                      if os.path.isdir(os.path.join(snapshot_root, v)) and not v.startswith("."))
+    for old_version in versions[:-SNAPSHOT_VERSIONS_KEPT]:
+        shutil.rmtree(os.path.join(snapshot_root, old_version), ignore_errors=True)
+    
+    return version
+
+
+def read_current_snapshot_version(snapshot_root: str) -> Optional[str]:
+    """Live snapshot version, or None if nothing has been published"""
+    try:
+        with open(os.path.join(snapshot_root, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def attach_question_bank_snapshot(snapshot_root: str,
+                                  version: Optional[str] = None) -> QuestionBankIndex:
+    """
+    Attach to a published snapshot without copying the columns.
+    
+    Args:
+        snapshot_root: Snapshot directory
+        version: Specific version (default: CURRENT)
+    
+    Returns:
+        Read-only QuestionBankIndex backed by memory-mapped arrays
+    """
+    version = version or read_current_snapshot_version(snapshot_root)
+    if version is None:
+        raise FileNotFoundError(f"No question bank snapshot published in {snapshot_root}")
+    
+    version_dir = os.path.join(snapshot_root, version)
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    
+    columns = {column: np.load(os.path.join(version_dir, f"{column}.npy"), mmap_mode='r')
+               for column in QUESTION_BANK_SNAPSHOT_COLUMNS}
+    
+    # Older snapshots (or another grid step) have no usable tables; they are rebuilt locally
+    if manifest.get("theta_grid_step") == THETA_GRID_STEP:
+        columns.update({name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r')
+                        for name in QUESTION_BANK_SNAPSHOT_TABLES})
+    
+    index = QuestionBankIndex(
+        topic_offsets={t: tuple(span) for t, span in manifest["topic_offsets"].items()},
+        **columns
+    )
+    index.snapshot_version = version
+    return index
+
+
+class _SnapshotAttachment:
+    """Per-process handle on the live snapshot, re-attached when CURRENT changes"""
+    
+    def __init__(self):
+        self.index: Optional[QuestionBankIndex] = None
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def current(self, snapshot_root: str) -> QuestionBankIndex:
+        now = time.monotonic()
+        if self.index is not None and now - self.checked_at < SNAPSHOT_VERSION_CHECK_SECONDS:
+            return self.index
+        
+        with self._lock:
+            self.checked_at = now
+            version = read_current_snapshot_version(snapshot_root)
+            if self.index is None or (version is not None and version != self.version):
+                self.index = attach_question_bank_snapshot(snapshot_root, version)
+                self.version = self.index.snapshot_version
+        
+        return self.index
+
+
+_snapshot_attachment = _SnapshotAttachment()
+
+
+# ============================================================================
+# COLUMNAR QUESTION BANK EXPORT (FAST COLD LOAD)
+# ============================================================================
+# One .npz file per export: the selection columns (question_id, topic,
+# subject, difficulty, a/b/c, question_type, time_estimate) plus a JSON
+# manifest with the format version, row count, per-column SHA-256 and the
+# updated_at watermark of the export. Loading is one file read with no
+# per-document decoding; the change feed then polls Firestore only for
+# documents updated after the watermark.
+
+QUESTION_BANK_EXPORT_COLUMNS = (
+    "question_ids", "topics", "subjects", "difficulties", "question_types",
+    "difficulty_b", "discrimination_a", "guessing_c", "time_estimates"
+)
+
+
+def _is_archived_question(doc: Dict) -> bool:
+    return doc.get('active', True) is False
+
+
+def _column_checksum(array: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()
+
+
+def export_question_bank(export_path: str = QUESTION_BANK_EXPORT_PATH) -> Dict:
+    """
+    Nightly job: stream the questions collection once and write the export.
+    
+    Written to a temporary file, verified, then moved into place with
+    os.replace, so readers never see a partial export.
+    
+    Args:
+        export_path: Destination .npz file
+    
+    Returns:
+        The export manifest
+    """
+    db = get_firestore_client()
+    documents = [q.to_dict() for q in db.collection('questions').stream()]
+    
+    live = [d for d in documents if not _is_archived_question(d)]
+    archived_ids = sorted(d['question_id'] for d in documents if _is_archived_question(d))
+    timestamps = [d['updated_at'] for d in documents if d.get('updated_at') is not None]
+    
+    index = QuestionBankIndex.from_documents(live)
+    columns = {column: np.asarray(getattr(index, column)) for column in QUESTION_BANK_EXPORT_COLUMNS}
+    columns["archived_ids"] = np.array(archived_ids, dtype=str)
+    
+    manifest = {
+        "format_version": QUESTION_BANK_EXPORT_FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "watermark": max(timestamps).isoformat() if timestamps else None,
+        "row_count": len(index),
+        "checksums": {column: _column_checksum(array) for column, array in columns.items()}
+    }
+    
+    tmp_path = f"{export_path}.tmp.npz"
+    np.savez(tmp_path, manifest=np.array(json.dumps(manifest)), **columns)
+    verify_question_bank_export(tmp_path)
+    os.replace(tmp_path, export_path)
+    
+    instrument.event("question_bank.exported", f"📦 Question bank exported: {manifest['row_count']} questions "
+                                               f"({len(archived_ids)} archived) to {export_path}")
+    return manifest
+
+
+def read_question_bank_export(export_path: str) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Read the manifest and all columns (one bulk read, no integrity checks)"""
+    with np.load(export_path, allow_pickle=False) as data:
+        manifest = json.loads(str(data["manifest"]))
+        columns = {name: data[name] for name in data.files if name != "manifest"}
+    return manifest, columns
+
+
+def verify_question_bank_export(export_path: str) -> Dict:
+    """
+    Integrity checks for an export file.
+    
+    Checks format version, column presence and checksums, equal column
+    lengths, unique question IDs, (topic, difficulty_b, question_id) row
+    order and plausible IRT parameters / time estimates.
+    
+    Args:
+        export_path: Export .npz file
+    
+    Returns:
+        The manifest
+    
+    Raises:
+        ValueError: Describing the first failed check
+    """
+    manifest, columns = read_question_bank_export(export_path)
+    
+    if manifest.get("format_version") != QUESTION_BANK_EXPORT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format version: {manifest.get('format_version')}")
+    
+    for column in QUESTION_BANK_EXPORT_COLUMNS + ("archived_ids",):
+        if column not in columns:
+            raise ValueError(f"Export is missing column {column}")
+        if _column_checksum(columns[column]) != manifest["checksums"].get(column):
+            raise ValueError(f"Checksum mismatch in column {column}")
+    
+    row_count = manifest["row_count"]
+    for column in QUESTION_BANK_EXPORT_COLUMNS:
+        if len(columns[column]) != row_count:
+            raise ValueError(f"Column {column} has {len(columns[column])} rows, expected {row_count}")
+    
+    question_ids, topics, difficulty_b = columns["question_ids"], columns["topics"], columns["difficulty_b"]
+    if len(np.unique(question_ids)) != row_count:
+        raise ValueError("Duplicate question IDs in export")
+    
+    keys = list(zip(topics.tolist(), difficulty_b.tolist(), question_ids.tolist()))
+    if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+        raise ValueError("Export rows are not sorted by (topic, difficulty_b, question_id)")
+    
+    discrimination_a, guessing_c = columns["discrimination_a"], columns["guessing_c"]
+    if not (np.all(np.isfinite(difficulty_b)) and np.all(np.isfinite(discrimination_a))
+            and np.all(discrimination_a > 0) and np.all((guessing_c >= 0) & (guessing_c < 1))):
+        raise ValueError("Export has out-of-range IRT parameters")
+    
+    if np.any(columns["time_estimates"] < 0):
+        raise ValueError("Export has negative time estimates")
+    
+    return manifest
+
+
+def run_nightly_question_bank_export(export_path: str = QUESTION_BANK_EXPORT_PATH):
+    """Cron entry point: export, verify and report (errors are printed, not raised)"""
+    try:
+        manifest = export_question_bank(export_path)
+        instrument.event("question_bank.export_verified",
+                         f"✅ Nightly question bank export verified: {manifest['row_count']} rows, "
+                         f"watermark {manifest['watermark']}")
+    except Exception as e:
+        instrument.event("question_bank.export_failed",
+                         f"❌ Nightly question bank export failed: {e}", level=logging.ERROR)
+
+
+# ============================================================================
+# QUESTION BANK CHANGE FEED (INCREMENTAL REFRESH)
+# ============================================================================
+# Edits from the data-upload scripts reach the engine as document changes
+# instead of full reloads. Two feeds:
+# - "listen": Firestore on_snapshot; ADDED / MODIFIED / REMOVED changes
+# - "poll": updated_at watermark query (scripts stamp updated_at on every
+#   write); works against any client, including local stand-ins
+# Archived questions (active == False) are treated as deletes. In poll mode
+# the cache cold-starts from the columnar export when a valid one exists.
+# A full rescan only happens on a detected gap: a poll returning more than
+# CHANGE_FEED_POLL_LIMIT changes, a listener that stopped, or a document
+# count that no longer matches the cache (hard deletes are invisible to
+# the watermark).
+
+def _question_record(doc: Dict) -> Dict:
+    """Selection fields of a question document (the exported columns)"""
+    irt = doc['irt_parameters']
+    return {
+        'question_id': doc['question_id'],
+        'topic': doc['topic'],
+        'subject': (doc.get('subject') or get_subject_from_topic(doc['topic'])).lower(),
+        'difficulty': doc.get('difficulty') or get_difficulty_label(irt['difficulty_b']),
+        'question_type': doc.get('question_type', 'mcq_single'),
+        'time_estimate': doc.get('time_estimate', 0),
+        'irt_parameters': {'difficulty_b': irt['difficulty_b'],
+                           'discrimination_a': irt['discrimination_a'],
+                           'guessing_c': irt['guessing_c']}
+    }
+
+
+class QuestionBankCache:
+    """
+    Question records plus a per-topic sorted index, updated in place.
+    
+    records holds the selection fields of every live question (IRT
+    parameters, labels, time estimate); documents holds the full documents
+    seen through the feed. Questions cold-loaded from the export only have
+    a record, and their full document is fetched on first use.
+    
+    Each topic keeps a list of (difficulty_b, question_id) sorted with
+    bisect, so an insert / update / delete costs O(log n) plus the list
+    shift. The columnar QuestionBankIndex handed to selection is
+    materialized lazily, only when something changed since the last one.
+    """
+    
+    def __init__(self, mode: str = "poll", poll_interval: float = CHANGE_FEED_POLL_SECONDS):
+        if mode not in ("listen", "poll"):
+            raise ValueError(f"Unknown change feed mode: {mode}")
+        self.mode = mode
+        self.poll_interval = poll_interval
+        
+        self.records: Dict[str, Dict] = {}  # Live (non-archived) questions
+        self.documents: Dict[str, Dict] = {}  # Full documents, where known
+        self.archived_ids = set()  # Still in the collection, excluded from selection
+        self.topic_keys: Dict[str, List[Tuple[float, str]]] = {}
+        self.watermark = None  # Highest updated_at applied (poll mode)
+        self.full_rescans = 0
+        self.changes_applied = 0
+        
+        self._keys: Dict[str, Tuple[str, float]] = {}  # question_id -> (topic, difficulty_b)
+        self._index: Optional[QuestionBankIndex] = None
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._count_checked_at = 0.0
+    
+    # ----------------------------------------
+    # Incremental updates
+    # ----------------------------------------
+    
+    def apply_upsert(self, doc: Dict):
+        """Insert or update one question (moves it if topic / difficulty changed)"""
+        with self._lock:
+            self._upsert(doc)
+            self.changes_applied += 1
+            self._index = None
+    
+    def apply_delete(self, question_id: str):
+        """Remove a question deleted from the collection"""
+        with self._lock:
+            self._discard(question_id)
+            self.archived_ids.discard(question_id)
+            self.changes_applied += 1
+            self._index = None
+    
+    def _upsert(self, doc: Dict):
+        question_id = doc['question_id']
+        self._discard(question_id)
+        if _is_archived_question(doc):
+            self.archived_ids.add(question_id)
+        else:
+            self.archived_ids.discard(question_id)
+            topic = doc['topic']
+            difficulty_b = doc['irt_parameters']['difficulty_b']
+            bisect.insort(self.topic_keys.setdefault(topic, []), (difficulty_b, question_id))
+            self._keys[question_id] = (topic, difficulty_b)
+            self.records[question_id] = _question_record(doc)
+            self.documents[question_id] = doc
+        
+        updated_at = doc.get('updated_at')
+        if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+    
+    def _discard(self, question_id: str):
+        key = self._keys.pop(question_id, None)
+        if key is None:
+            return
+        topic, difficulty_b = key
+        keys = self.topic_keys[topic]
+        del keys[bisect.bisect_left(keys, (difficulty_b, question_id))]
+        if not keys:
+            del self.topic_keys[topic]
+        del self.records[question_id]
+        self.documents.pop(question_id, None)
+    
+    def full_rescan(self):
+        """Rebuild from a full read of the collection (gap recovery only)"""
+        db = get_firestore_client()
+        documents = [q.to_dict() for q in db.collection('questions').stream()]
+        
+        with self._lock:
+            self._clear()
+            for doc in documents:
+                self._upsert(doc)
+            self.full_rescans += 1
+            self._count_checked_at = time.monotonic()
+        
+        instrument.count("question_bank_full_rescans")
+        instrument.event("question_bank.rescanned", f"🔄 Question bank rescanned: {len(self.records)} live questions")
+    
+    def load_export(self, export_path: str):
+        """
+        Cold start from a verified columnar export (no Firestore reads).
+        
+        The watermark is set to the export's, so the next poll() fetches
+        exactly the documents changed since the export was taken.
+        """
+        manifest = verify_question_bank_export(export_path)
+        _, columns = read_question_bank_export(export_path)
+        
+        with self._lock:
+            self._clear()
+            rows = zip(*(columns[column].tolist() for column in QUESTION_BANK_EXPORT_COLUMNS))
+            for (question_id, topic, subject, difficulty, question_type,
+                 difficulty_b, discrimination_a, guessing_c, time_estimate) in rows:
+                self.topic_keys.setdefault(topic, []).append((difficulty_b, question_id))
+                self._keys[question_id] = (topic, difficulty_b)
+                self.records[question_id] = {
+                    'question_id': question_id, 'topic': topic, 'subject': subject,
+                    'difficulty': difficulty, 'question_type': question_type,
+                    'time_estimate': time_estimate,
+                    'irt_parameters': {'difficulty_b': difficulty_b,
+                                       'discrimination_a': discrimination_a,
+                                       'guessing_c': guessing_c}
+                }
+            self.archived_ids = set(columns["archived_ids"].tolist())
+            if manifest["watermark"] is not None:
+                self.watermark = datetime.fromisoformat(manifest["watermark"])
+            self._count_checked_at = 0.0  # Reconcile on the first feed cycle
+        
+        instrument.event("question_bank.export_loaded",
+                         f"📦 Question bank loaded from export: {manifest['row_count']} questions "
+                         f"(exported {manifest['exported_at']})")
+    
+    def _clear(self):
+        self.records, self.documents, self.archived_ids = {}, {}, set()
+        self.topic_keys, self._keys = {}, {}
+        self.watermark = None
+        self._index = None
+    
+    # ----------------------------------------
+    # Feeds
+    # ----------------------------------------
+    
+    def poll(self) -> int:
+        """
+        Apply changes newer than the watermark.
+        
+        A write batch shares one server timestamp and commits atomically, so
+        a strict > never splits a batch across polls.
+        
+        Returns:
+            Number of changed documents applied (-1 if a gap forced a rescan)
+        """
+        db = get_firestore_client()
+        query = db.collection('questions')
+        if self.watermark is not None:
+            query = query.where('updated_at', '>', self.watermark)
+        changes = [q.to_dict() for q in
+                   query.order_by('updated_at').limit(CHANGE_FEED_POLL_LIMIT + 1).stream()]
+        
+        if len(changes) > CHANGE_FEED_POLL_LIMIT:
+            # Too far behind to catch up incrementally (e.g. a full re-upload)
+            self.full_rescan()
+            return -1
+        
+        for doc in changes:
+            self.apply_upsert(doc)
+        instrument.count("question_bank_changes", len(changes), feed="poll")
+        return len(changes)
+    
+    def subscribe(self):
+        """Start (or restart) the on_snapshot listener; its first snapshot is the full load"""
+        with self._lock:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+            self._clear()
+            self._ready.clear()
+        
+        db = get_firestore_client()
+        self._watch = db.collection('questions').on_snapshot(self._on_snapshot)
+    
+    def _on_snapshot(self, collection_snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self.apply_delete(change.document.id)
+                else:
+                    self.apply_upsert(change.document.to_dict())
+        instrument.count("question_bank_changes", len(changes), feed="listen")
+        self._ready.set()
+    
+    def reconcile_count(self) -> bool:
+        """
+        Compare the collection's document count with the cache.
+        
+        Returns:
+            True if they matched; on a mismatch the cache is rescanned
+        """
+        db = get_firestore_client()
+        collection_count = int(db.collection('questions').count().get()[0][0].value)
+        self._count_checked_at = time.monotonic()
+        
+        with self._lock:
+            cached_count = len(self.records) + len(self.archived_ids)
+        
+        if collection_count == cached_count:
+            return True
+        
+        instrument.event("question_bank.gap",
+                         f"⚠️ Question bank gap: {collection_count} documents vs {cached_count} cached",
+                         level=logging.WARNING)
+        if self.mode == "listen":
+            self.subscribe()
+        else:
+            self.full_rescan()
+        return False
+    
+    def start(self, export_path: Optional[str] = QUESTION_BANK_EXPORT_PATH):
+        """
+        Initial load plus the background feed thread.
+        
+        Poll mode loads the export (if present and valid) and polls the
+        deltas since it; otherwise, and in listen mode (whose first snapshot
+        is always a full one), the whole collection is read.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="question-bank-feed", daemon=True)
+        
+        if self.mode == "listen":
+            source = "listener snapshot"
+            self.subscribe()
+            if not self._ready.wait(CHANGE_FEED_READY_TIMEOUT_SECONDS):
+                instrument.event("question_bank.listener_slow",
+                                 "⚠️ Question bank listener slow to deliver; loading directly",
+                                 level=logging.WARNING)
+                source = "Firestore (listener slow)"
+                self.full_rescan()
+        elif export_path and os.path.exists(export_path):
+            source = f"export {export_path}"
+            try:
+                self.load_export(export_path)
+                self.poll()
+            except ValueError as e:
+                instrument.event("question_bank.export_rejected",
+                                 f"⚠️ Question bank export rejected ({e}); loading from Firestore",
+                                 level=logging.WARNING)
+                source = f"Firestore (export {export_path} rejected)"
+                self.full_rescan()
+        else:
+            source = f"Firestore (no export at {export_path})" if export_path else "Firestore"
+            self.full_rescan()
+        
+        with self._lock:
+            cached = len(self.records)
+        instrument.event("question_bank.started",
+                         f"🗃️ Question bank cache started from {source}: {cached} live questions")
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the feed thread and the listener"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+    
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if self.mode == "poll":
+                    self.poll()
+                elif self._watch is None or not self._watch.is_active:
+                    instrument.event("question_bank.listener_stopped",
+                                     "⚠️ Question bank listener stopped; resubscribing",
+                                     level=logging.WARNING)
+                    self.subscribe()
+                
+                if time.monotonic() - self._count_checked_at >= CHANGE_FEED_COUNT_CHECK_SECONDS:
+                    self.reconcile_count()
+            except Exception as e:
+                instrument.event("question_bank.change_feed_failed",
+                                 f"⚠️ Question bank change feed failed: {e}", level=logging.WARNING)
+    
+    # ----------------------------------------
+    # Index
+    # ----------------------------------------
+    
+    def index(self) -> QuestionBankIndex:
+        """Columnar index over the live questions (rebuilt only after changes)"""
+        index = self._index
+        if index is not None:
+            return index
+        
+        with self._lock:
+            if self._index is None:
+                self._index = self._materialize()
+            return self._index
+    
+    def _materialize(self) -> QuestionBankIndex:
+        records = [self.records[question_id]
+                   for topic in sorted(self.topic_keys)
+                   for _, question_id in self.topic_keys[topic]]
+        
+        # Same row order from_documents produces: (topic, difficulty_b, question_id)
+        index = QuestionBankIndex.from_documents(records)
+        index.documents = dict(self.documents)  # Records are not full documents
+        return index
+
+
+_question_bank_cache: Optional[QuestionBankCache] = None
+_question_bank_cache_lock = threading.Lock()
+
+
+def get_question_bank_cache() -> QuestionBankCache:
+    """Process-wide change-feed cache (started once, on first use)"""
+    global _question_bank_cache
+    
+    if _question_bank_cache is None:
+        with _question_bank_cache_lock:
+            if _question_bank_cache is None:
+                cache = QuestionBankCache(QUESTION_BANK_CHANGE_FEED or "poll")
+                cache.start()
+                _question_bank_cache = cache
+    
+    return _question_bank_cache
+
+
+# ============================================================================
+# OPTIMAL TEST ASSEMBLY (JOINT QUIZ SELECTION)
+# ============================================================================
+
+@dataclass
+class QuizBlueprint:
+    """
+    Quiz-level constraints for jointly assembling a quiz.
+    
+    All (min, max) pairs are inclusive item counts. Labels missing from
+    subject_counts / difficulty_mix are unconstrained.
+    """
+    topic_targets: Dict[str, float]  # topic -> theta to maximize information at
+    topic_counts: Dict[str, Tuple[int, int]]  # topic -> (min, max) items
+    length: int
+    discrimination_min: Dict[str, float] = field(default_factory=dict)  # topic -> a threshold
+    subject_counts: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    difficulty_mix: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    time_budget_seconds: Optional[int] = None
+
+
+def build_daily_quiz_blueprint(selection_slots: List[Tuple[str, float, float]]) -> QuizBlueprint:
+    """
+    Turn the topics planned by generate_daily_quiz into assembly constraints.
+    
+    Every planned topic gets one item; a topic may take a second item only to
+    cover for a planned topic that has no usable questions left.
+    
+    Args:
+        selection_slots: List of (topic, target_theta, discrimination_min)
+    
+    Returns:
+        QuizBlueprint for assemble_optimal_quiz
+    """
+    length = len(selection_slots)
+    subject_max = max(1, math.ceil(length / 2))
+    
+    return QuizBlueprint(
+        topic_targets={topic: theta for topic, theta, _ in selection_slots},
+        topic_counts={topic: (1, 2) for topic, _, _ in selection_slots},
+        length=length,
+        discrimination_min={topic: a_min for topic, _, a_min in selection_slots},
+        subject_counts={subject: (0, subject_max)
+                        for subject in ("physics", "chemistry", "mathematics")},
+        difficulty_mix=DAILY_QUIZ_DIFFICULTY_MIX,
+        time_budget_seconds=round(QUIZ_TIME_BUDGET_SECONDS * length / QUIZ_LENGTH)
+    )
+
+
+def _blueprint_violation(blueprint: QuizBlueprint, subject_counts: Dict[str, int],
+                         difficulty_counts: Dict[str, int], total_time: int) -> float:
+    """Total amount by which the subject, difficulty and time constraints are broken"""
+    violation = 0.0
+    
+    for label, (low, high) in blueprint.subject_counts.items():
+        count = subject_counts.get(label, 0)
+        violation += max(0, low - count) + max(0, count - high)
+    
+    for label, (low, high) in blueprint.difficulty_mix.items():
+        count = difficulty_counts.get(label, 0)
+        violation += max(0, low - count) + max(0, count - high)
+    
+    if blueprint.time_budget_seconds is not None and total_time > blueprint.time_budget_seconds:
+        # One item's worth of time over budget weighs like one item over a count limit
+        average_time = blueprint.time_budget_seconds / max(1, blueprint.length)
+        violation += (total_time - blueprint.time_budget_seconds) / average_time
+    
+    return violation
+
+
+def assemble_optimal_quiz(blueprint: QuizBlueprint, recent_questions: Collection[str],
+                          index: Optional[QuestionBankIndex] = None,
+                          item_seconds: Optional[np.ndarray] = None,
+                          rng: Optional[random.Random] = None,
+                          exposure_control: Optional[str] = EXPOSURE_CONTROL_METHOD) -> List[Dict]:
+    """
+    Select all quiz items jointly, maximizing total Fisher information.
+    
+    Each item's information is measured at its own topic's theta. Heuristic
+    solver over the in-memory index (runs in milliseconds):
+    1. Candidates per topic: not recent, a ≥ discrimination_min (relaxed to
+       any non-recent question if none qualify), top-K by information, with
+       the topic's picks ordered by exposure control (as in the greedy path)
+    2. Greedy fill: topic minimums first, then best remaining items while
+       topic and subject maximums allow
+    3. Repair: best single-item swaps until subject balance, difficulty mix
+       and time budget hold (or no swap reduces the violation)
+    4. Order so no two consecutive items share a topic
+    
+    Args:
+        blueprint: Quiz-level constraints
+        recent_questions: Recently answered question IDs to exclude
+        index: Question bank index (defaults to the process-wide index)
+        item_seconds: Seconds per index row counted against the time budget
+                      (default: the authored time_estimate; see expected_item_seconds)
+        rng: Quiz RNG for exposure control and ordering (see quiz_rng)
+        exposure_control: None, "randomesque" or "sympson_hetter"
+    
+    Returns:
+        Ordered list of question dictionaries (best effort if infeasible)
+    """
+    if index is None:
+        index = get_question_bank_index()
+    if item_seconds is None:
+        item_seconds = index.time_estimates
+    
+    recent = set(recent_questions)
+    
+    # ----------------------------------------
+    # 1. Candidate pools
+    # ----------------------------------------
+    info_by_row = {}
+    pool_by_topic = {}
+    offered_by_row = {}
+    tracker = get_item_exposure_tracker()
+    
+    for topic, target_theta in blueprint.topic_targets.items():
+        rows = [r for r in index.topic_rows(topic) if index.question_ids[r] not in recent]
+        a_min = blueprint.discrimination_min.get(topic, 1.0)
+        qualified = [r for r in rows if index.discrimination_a[r] >= a_min]
+        rows = qualified or rows  # Relax discrimination if nothing qualifies
+        
+        if not rows:
+            pool_by_topic[topic] = []
+            continue
+        
+        info = index.fisher_information(rows, target_theta)
+        ranked = sorted(zip(rows, info.tolist()), key=lambda x: x[1], reverse=True)
+        ranked = ranked[:ASSEMBLY_CANDIDATE_POOL_SIZE]
+        info_by_row.update(ranked)
+        
+        # Each pick the topic may take goes through exposure control, so
+        # similar-theta students do not all get the most informative items
+        _, high = blueprint.topic_counts.get(topic, (0, blueprint.length))
+        remaining = [r for r, _ in ranked]
+        picks = []
+        while remaining and len(picks) < high:
+            chosen, offered = apply_exposure_control(
+                [{'question_id': index.question_ids[r], 'row': r} for r in remaining],
+                exposure_control, tracker, rng
+            )
+            picks.append(chosen['row'])
+            offered_by_row[chosen['row']] = [q['question_id'] for q in offered]
+            remaining.remove(chosen['row'])
+        pool_by_topic[topic] = picks + remaining
+    
+    # ----------------------------------------
+    # 2. Greedy fill
+    # ----------------------------------------
+    selected = []
+    topic_counts = {topic: 0 for topic in blueprint.topic_targets}
+    subject_counts = {}
+    
+    def add(row):
+        selected.append(row)
+        topic_counts[index.topics[row]] += 1
+        subject = index.subjects[row]
+        subject_counts[subject] = subject_counts.get(subject, 0) + 1
+    
+    for topic, pool in pool_by_topic.items():
+        low, _ = blueprint.topic_counts.get(topic, (0, blueprint.length))
+        for row in pool[:low]:
+            if len(selected) < blueprint.length:
+                add(row)
+    
+    while len(selected) < blueprint.length:
+        best_row = None
+        for topic, pool in pool_by_topic.items():
+            _, high = blueprint.topic_counts.get(topic, (0, blueprint.length))
+            if topic_counts[topic] >= high or topic_counts[topic] >= len(pool):
+                continue
+            row = pool[topic_counts[topic]]
+            _, subject_high = blueprint.subject_counts.get(index.subjects[row], (0, blueprint.length))
+            if subject_counts.get(index.subjects[row], 0) >= subject_high:
+                continue
+            if best_row is None or info_by_row[row] > info_by_row[best_row]:
+                best_row = row
+        if best_row is None:
+            break  # Bank exhausted under the topic/subject limits
+        add(best_row)
+    
+    # ----------------------------------------
+    # 3. Repair by single-item swaps
+    # ----------------------------------------
+    difficulty_counts = {}
+    for row in selected:
+        label = index.difficulties[row]
+        difficulty_counts[label] = difficulty_counts.get(label, 0) + 1
+    total_time = int(sum(item_seconds[row] for row in selected))
+    
+    def swap_violation(old_row, new_row):
+        """Violation after swapping old_row for new_row (tallies restored after)"""
+        for counts, labels in ((subject_counts, index.subjects),
+                               (difficulty_counts, index.difficulties)):
+            counts[labels[old_row]] -= 1
+            counts[labels[new_row]] = counts.get(labels[new_row], 0) + 1
+        time_after = total_time - int(item_seconds[old_row]) + int(item_seconds[new_row])
+        result = _blueprint_violation(blueprint, subject_counts, difficulty_counts, time_after)
+        for counts, labels in ((subject_counts, index.subjects),
+                               (difficulty_counts, index.difficulties)):
+            counts[labels[new_row]] -= 1
+            counts[labels[old_row]] += 1
+        return result
+    
+    violation = _blueprint_violation(blueprint, subject_counts, difficulty_counts, total_time)
+    
+    for _ in range(ASSEMBLY_MAX_REPAIR_STEPS):
+        if violation == 0:
+            break
+        
+        chosen = set(selected)
+        best_swap = None  # (violation, info_loss, position, new_row)
+        
+        for position, old_row in enumerate(selected):
+            old_topic = index.topics[old_row]
+            for topic, pool in pool_by_topic.items():
+                low, high = blueprint.topic_counts.get(topic, (0, blueprint.length))
+                if topic != old_topic:
+                    old_low, _ = blueprint.topic_counts.get(old_topic, (0, blueprint.length))
+                    if topic_counts[old_topic] <= old_low or topic_counts[topic] >= high:
+                        continue
+                for new_row in pool:
+                    if new_row in chosen:
+                        continue
+                    info_loss = info_by_row[old_row] - info_by_row[new_row]
+                    candidate = (swap_violation(old_row, new_row), info_loss, position, new_row)
+                    if best_swap is None or candidate[:2] < best_swap[:2]:
+                        best_swap = candidate
+        
+        if best_swap is None or best_swap[0] >= violation:
+            break  # No swap improves feasibility
+        
+        violation, _, position, new_row = best_swap
+        old_row = selected[position]
+        for counts, labels in ((topic_counts, index.topics),
+                               (subject_counts, index.subjects),
+                               (difficulty_counts, index.difficulties)):
+            counts[labels[old_row]] -= 1
+            counts[labels[new_row]] = counts.get(labels[new_row], 0) + 1
+        total_time += int(item_seconds[new_row]) - int(item_seconds[old_row])
+        selected[position] = new_row
+    
+    for row in selected:
+        tracker.record_selection(index.topics[row],
+                                 offered_by_row.get(row, [index.question_ids[row]]),
+                                 index.question_ids[row])
+    
+    # ----------------------------------------
+    # 4. Order without consecutive same-topic items
+    # ----------------------------------------
+    return interleave_questions_by_topic([index.get_document(row) for row in selected])
+
+
+# ============================================================================
+# PARALLEL MOCK TEST FORMS (FULL-LENGTH PAPERS IN BATCHES)
+# ============================================================================
+# Builds full JEE Main papers (MOCK_FORM_SECTIONS: 30 items per subject, 20
+# MCQ + 10 NVQ) over the in-memory index, in the mock_test_templates schema
+# the backend serves (see createMockTestTemplates.js).
+# A cell is one (subject, chapter, question type). Every form gets the same
+# per-cell quotas, from JEE_TOPIC_WEIGHTS like the template script's
+# chapter quotas. Every form also targets the same test information curve
+# (TIC) at MOCK_FORM_THETA_POINTS: the curve of the bank's average form,
+# sum over cells of quota x mean item information.
+# Each form is filled greedily. Each step takes the item whose information
+# curve is closest (squared distance) to the still-missing information per
+# remaining slot, as in the normalized weighted absolute deviation
+# heuristic. Same-cell swaps then refine the curve.
+# Two limits keep the forms apart:
+# - Exposure: within a cell, only items used at most
+#   MOCK_FORM_EXPOSURE_SLACK times more than its least-used item are
+#   eligible, so a batch rotates through the bank evenly.
+# - Overlap: no two forms share more than MOCK_FORM_MAX_OVERLAP of their
+#   items.
+# A cell that cannot meet a limit relaxes it rather than leave a slot empty.
+# Forms are built one after another because each depends on the exposure
+# so far. Each step is one vectorized pass over the bank.
+
+@dataclass
+class MockForm:
+    """One assembled mock test paper"""
+    rows: np.ndarray  # Index rows in paper order (subject sections, MCQs before NVQs)
+    information: np.ndarray  # TIC at MOCK_FORM_THETA_POINTS
+    target_information: np.ndarray
+    
+    @property
+    def max_relative_deviation(self) -> float:
+        """Largest |TIC - target| / target over the theta points"""
+        return float(np.max(np.abs(self.information - self.target_information) /
+                            np.maximum(self.target_information, 1e-9)))
+
+
+def mock_chapter_quotas(weights: Dict[str, float], available: Dict[str, int],
+                        total: int) -> Dict[str, int]:
+    """
+    Split total items over chapters in proportion to weight.
+    
+    Like calculateChapterQuotas in createMockTestTemplates.js (floor, then
+    the remainder to the highest weights). A chapter never gets more than
+    its available items; its excess is split again over the others.
+    
+    Args:
+        weights: chapter -> JEE weight
+        available: chapter -> items in the bank
+        total: Items to split
+    
+    Returns:
+        chapter -> quota (chapters with none omitted); sums to less than
+        total only if the bank runs out
+    """
+    quotas = {}
+    remaining = total
+    open_chapters = {chapter: weight for chapter, weight in weights.items()
+                     if available.get(chapter, 0) > 0}
+    
+    while remaining > 0 and open_chapters:
+        total_weight = sum(open_chapters.values())
+        shares = {chapter: int(remaining * weight / total_weight)
+                  for chapter, weight in open_chapters.items()}
+        leftover = remaining - sum(shares.values())
+        for chapter in sorted(open_chapters, key=lambda c: (-open_chapters[c], c))[:leftover]:
+            shares[chapter] += 1
+        
+        for chapter, share in shares.items():
+            taken = min(share, available[chapter] - quotas.get(chapter, 0))
+            if taken > 0:
+                quotas[chapter] = quotas.get(chapter, 0) + taken
+                remaining -= taken
+            if quotas.get(chapter, 0) >= available[chapter]:
+                del open_chapters[chapter]
+    
+    return quotas
+
+
+def _mock_form_cells(index: QuestionBankIndex
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Tuple[str, str, str]]]:
+    """
+    Group the bank's rows into cells with a quota.
+    
+    Returns:
+        (rows sorted by cell, cell number per sorted row, quota per cell,
+         (subject, section, topic) per cell, section "mcq" or "nvq")
+    """
+    type_section = {question_type: "mcq" for question_type in MOCK_MCQ_TYPES}
+    type_section.update({question_type: "nvq" for question_type in MOCK_NVQ_TYPES})
+    
+    rows_by_cell = {}
+    for row, (subject, topic, question_type) in enumerate(zip(
+            index.subjects, index.topics, index.question_types)):
+        section = type_section.get(question_type)
+        if subject in MOCK_FORM_SECTIONS and section is not None:
+            rows_by_cell.setdefault((subject, section, topic), []).append(row)
+    
+    cells, quotas, cell_rows = [], [], []
+    for subject, (mcq_count, nvq_count) in MOCK_FORM_SECTIONS.items():
+        for section, count in (("mcq", mcq_count), ("nvq", nvq_count)):
+            available = {topic: len(rows) for (s, t, topic), rows in rows_by_cell.items()
+                         if s == subject and t == section}
+            section_quotas = mock_chapter_quotas(
+                {topic: JEE_TOPIC_WEIGHTS.get(topic, 0.5) for topic in available}, available, count
+            )
+            if sum(section_quotas.values()) < count:
+                instrument.event("mock_forms.bank_short",
+                                 f"⚠️ Mock forms: bank has only {sum(section_quotas.values())} of "
+                                 f"{count} {subject} {section.upper()} items", level=logging.WARNING)
+            for topic in sorted(section_quotas):
+                cells.append((subject, section, topic))
+                quotas.append(section_quotas[topic])
+                cell_rows.append(rows_by_cell[(subject, section, topic)])
+    
+    rows = np.array([row for group in cell_rows for row in group], dtype=np.int64)
+    cell_of_row = np.repeat(np.arange(len(cells)), [len(group) for group in cell_rows])
+    return rows, cell_of_row, np.array(quotas, dtype=np.int64), cells
+
+
+def assemble_parallel_mock_forms(count: int, index: Optional[QuestionBankIndex] = None,
+                                 item_uses: Optional[Dict[str, int]] = None,
+                                 target_information: Optional[np.ndarray] = None) -> List[MockForm]:
+    """
+    Assemble a batch of parallel full-length mock test forms.
+    
+    All forms share the cell quotas and target information curve; item
+    exposure is balanced over the batch (and over earlier batches through
+    item_uses).
+    
+    Args:
+        count: Forms to build
+        index: Question bank index (defaults to the process-wide index)
+        item_uses: question_id -> times already used in live forms
+        target_information: TIC to match at MOCK_FORM_THETA_POINTS (default:
+                            the bank's average form)
+    
+    Returns:
+        List of MockForm, in build order
+    """
+    if index is None:
+        index = get_question_bank_index()
+    
+    rows, cell_of_row, quotas, cells = _mock_form_cells(index)
+    if len(rows) == 0:
+        return []
+    
+    columns = np.rint((np.array(MOCK_FORM_THETA_POINTS) - THETA_MIN) / THETA_GRID_STEP).astype(np.int64)
+    information = index.curve_tables()[0][rows][:, columns]  # (cell rows, theta points)
+    squared_norms = (information ** 2).sum(axis=1)
+    cell_starts = np.flatnonzero(np.r_[True, cell_of_row[1:] != cell_of_row[:-1]])
+    
+    if target_information is None:
+        cell_means = np.add.reduceat(information, cell_starts) / np.bincount(cell_of_row)[:, None]
+        target_information = quotas @ cell_means
+    target_information = np.asarray(target_information, dtype=np.float64)
+    
+    uses = np.zeros(len(rows), dtype=np.int64)
+    if item_uses:
+        uses += [item_uses.get(question_id, 0)
+                 for question_id in np.asarray(index.question_ids)[rows].tolist()]
+    
+    form_length = int(quotas.sum())
+    overlap_cap = max(1, int(MOCK_FORM_MAX_OVERLAP * form_length))
+    built = np.zeros((count, len(rows)), dtype=bool)  # Items of each form built so far
+    forms = []
+    
+    def eligible(in_form, overlapping, start=0, end=len(rows)):
+        """
+        Rows in [start, end) (whole cells) the form may take. Per cell,
+        relaxed in steps until some row qualifies: exposure slack and
+        overlap cap, then the overlap cap alone, then any row not in the form.
+        """
+        free = ~in_form[start:end]
+        cell_index = cell_of_row[start:end] - cell_of_row[start]
+        starts = cell_starts[cell_of_row[start]:cell_of_row[end - 1] + 1] - start
+        least_used = np.minimum.reduceat(np.where(free, uses[start:end], np.inf), starts)
+        within_slack = uses[start:end] <= least_used[cell_index] + MOCK_FORM_EXPOSURE_SLACK
+        allowed = free & ~overlapping[start:end]
+        
+        mask = np.zeros(end - start, dtype=bool)
+        for level in (allowed & within_slack, allowed, free):
+            mask |= level & ~np.logical_or.reduceat(mask, starts)[cell_index]
+        return mask
+    
+    def overlapping_rows(overlap):
+        """Rows of the earlier forms that already share overlap_cap items with this one"""
+        saturated = np.flatnonzero(overlap >= overlap_cap)
+        if len(saturated) == 0:
+            return np.zeros(len(rows), dtype=bool)
+        return built[saturated].any(axis=0)
+    
+    cell_bounds = list(zip(cell_starts.tolist(), cell_starts[1:].tolist() + [len(rows)]))
+    
+    for form_number in range(count):
+        earlier = built[:form_number]
+        in_form = built[form_number]
+        overlap = np.zeros(form_number, dtype=np.int64)
+        overlapping = np.zeros(len(rows), dtype=bool)
+        open_slots = quotas.copy()
+        form_information = np.zeros_like(target_information)
+        
+        # Greedy fill: closest to the missing information per remaining slot
+        for slots_left in range(form_length, 0, -1):
+            candidates = np.flatnonzero(eligible(in_form, overlapping) & (open_slots[cell_of_row] > 0))
+            goal = (target_information - form_information) / slots_left
+            score = squared_norms[candidates] - 2 * (information[candidates] @ goal)
+            pick = int(candidates[np.argmin(score)])
+            in_form[pick] = True
+            open_slots[cell_of_row[pick]] -= 1
+            form_information += information[pick]
+            if form_number:
+                overlap += earlier[:, pick]
+                for saturated in np.flatnonzero((overlap == overlap_cap) & earlier[:, pick]):
+                    overlapping |= earlier[saturated]
+        
+        # Same-cell swaps that bring the curve closer to the target
+        for _ in range(MOCK_FORM_SWAP_PASSES):
+            improved = False
+            for pick in np.flatnonzero(in_form).tolist():
+                in_form[pick] = False
+                overlap -= earlier[:, pick]
+                cell_start, cell_end = cell_bounds[cell_of_row[pick]]
+                candidates = cell_start + np.flatnonzero(
+                    eligible(in_form, overlapping_rows(overlap), cell_start, cell_end)
+                )
+                residual = form_information - information[pick] - target_information
+                deviation = ((residual + information[candidates]) ** 2).sum(axis=1)
+                best = int(candidates[np.argmin(deviation)])
+                if deviation.min() < ((form_information - target_information) ** 2).sum() - 1e-12:
+                    form_information += information[best] - information[pick]
+                    improved = True
+                else:
+                    best = pick
+                in_form[best] = True
+                overlap += earlier[:, best]
+            if not improved:
+                break
+        
+        uses += in_form
+        forms.append(MockForm(
+            rows=_order_mock_form(index, rows[in_form], cells, cell_of_row[in_form]),
+            information=form_information,
+            target_information=target_information
+        ))
+    
+    return forms
+
+
+def _order_mock_form(index: QuestionBankIndex, form_rows: np.ndarray,
+                     cells: List[Tuple[str, str, str]], form_cells: np.ndarray) -> np.ndarray:
+    """Paper order: subject sections, MCQs then NVQs, chapters interleaved within each"""
+    ordered = []
+    for subject in MOCK_FORM_SECTIONS:
+        for section in ("mcq", "nvq"):
+            part = [{"topic": index.topics[row], "subject": subject, "row": int(row)}
+                    for row, cell in zip(form_rows.tolist(), form_cells.tolist())
+                    if cells[cell][:2] == (subject, section)]
+            ordered.extend(q["row"] for q in interleave_questions_by_topic(part))
+    return np.array(ordered, dtype=np.int64)
+
+
+def format_mock_template_question(question: Dict, number: int, section_index: int) -> Dict:
+    """Question entry of a template's question_chunks (formatQuestionForTemplate's fields)"""
+    question_type = question.get('question_type') or 'mcq_single'
+    formatted = {
+        "question_number": number,
+        "section_index": section_index,
+        "question_id": question['question_id'],
+        "firestore_doc_id": question['question_id'],
+        "question_type": question_type,
+        "subject": question.get('subject') or get_subject_from_topic(question['topic']).capitalize(),
+        "chapter_key": question.get('chapter_key'),
+        "chapter": question.get('chapter'),
+        "question_text": question.get('question_text') or '',
+        "question_text_html": question.get('question_text_html'),
+        "image_url": question.get('image_url'),
+        "options": question.get('options'),
+        "correct_answer": question.get('correct_answer'),
+        "irt_parameters": question['irt_parameters'],
+        "marks_correct": 4,
+        "marks_incorrect": 0 if question_type in MOCK_NVQ_TYPES else -1,  # No negative marking for NVQ
+        "marks_unattempted": 0
+    }
+    for key in ("solution_text", "solution_steps", "key_insight", "common_mistakes",
+                "distractor_analysis"):
+        if question.get(key):
+            formatted[key] = question[key]
+    return formatted
+
+
+def build_mock_test_template(form: MockForm, template_id: str, name: str,
+                             index: Optional[QuestionBankIndex] = None) -> Dict:
+    """
+    mock_test_templates document for a form, questions included under 'questions'.
+    
+    Same shape as the template script's createTemplate, plus the form's
+    information curve.
+    """
+    if index is None:
+        index = get_question_bank_index()
+    
+    sections, questions = [], []
+    for section_index, subject in enumerate(MOCK_FORM_SECTIONS):
+        section_rows = [row for row in form.rows.tolist() if index.subjects[row] == subject]
+        start = len(questions)
+        for number, row in enumerate(section_rows, start=1):
+            questions.append(format_mock_template_question(index.get_document(row), number, section_index))
+        section_questions = questions[start:]
+        sections.append({
+            "name": subject.capitalize(),
+            "subject": subject.capitalize(),
+            "question_count": len(section_questions),
+            "mcq_count": sum(q['question_type'] in MOCK_MCQ_TYPES for q in section_questions),
+            "nvq_count": sum(q['question_type'] in MOCK_NVQ_TYPES for q in section_questions),
+            "start_index": start,
+            "end_index": len(questions) - 1
+        })
+    
+    def average_b(items):
+        return f"{np.mean([q['irt_parameters']['difficulty_b'] for q in items]):.2f}" if items else None
+    
+    return {
+        "template_id": template_id,
+        "name": name,
+        "description": f"Full-length JEE Main simulation with {len(questions)} questions "
+                       f"across Physics, Chemistry, and Mathematics.",
+        "exam_type": "JEE_MAIN",
+        "version": 1,
+        "config": {
+            "duration_seconds": MOCK_TEST_DURATION_SECONDS,
+            "total_marks": 4 * len(questions),
+            "passing_marks": None,
+            "marking_scheme": {
+                "mcq_correct": 4, "mcq_incorrect": -1, "mcq_unattempted": 0,
+                "nvq_correct": 4, "nvq_incorrect": 0, "nvq_unattempted": 0
+            },
+            "sections": [{"name": s["name"], "question_count": s["question_count"],
+                          "mcq_count": s["mcq_count"], "nvq_count": s["nvq_count"]}
+                         for s in sections]
+        },
+        "question_count": len(questions),
+        "sections": sections,
+        "questions": questions,
+        "stats": {
+            "avg_difficulty": average_b(questions),
+            **{f"{subject}_avg_difficulty": average_b([q for q in questions
+                                                       if q['section_index'] == i])
+               for i, subject in enumerate(MOCK_FORM_SECTIONS)},
+            "information_theta_points": list(MOCK_FORM_THETA_POINTS),
+            "information": [round(float(x), 3) for x in form.information],
+            "target_information": [round(float(x), 3) for x in form.target_information],
+            "max_relative_deviation": round(form.max_relative_deviation, 4)
+        },
+        "active": True,
+        "use_count": 0,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+        "source": "parallel_forms",
+        "source_collection": "questions",
+        "generation_date": datetime.utcnow().isoformat()
+    }
+
+
+def save_mock_test_template(template: Dict):
+    """Write a template and its question_chunks (MOCK_TEMPLATE_CHUNK_SIZE questions each) in one batch"""
+    db = get_firestore_client()
+    template = dict(template)
+    questions = template.pop('questions')
+    total_chunks = math.ceil(len(questions) / MOCK_TEMPLATE_CHUNK_SIZE)
+    template.update({
+        "uses_chunking": len(questions) > MOCK_TEMPLATE_CHUNK_SIZE,
+        "chunk_size": MOCK_TEMPLATE_CHUNK_SIZE,
+        "total_chunks": total_chunks
+    })
+    
+    template_ref = db.collection('mock_test_templates').document(template['template_id'])
+    batch = db.batch()
+    batch.set(template_ref, template)
+    for chunk_index in range(total_chunks):
+        start = chunk_index * MOCK_TEMPLATE_CHUNK_SIZE
+        chunk = questions[start:start + MOCK_TEMPLATE_CHUNK_SIZE]
+        batch.set(template_ref.collection('question_chunks').document(f"chunk_{chunk_index:02d}"), {
+            "chunk_index": chunk_index,
+            "start_question": start + 1,
+            "end_question": start + len(chunk),
+            "questions": chunk,
+            "question_count": len(chunk)
+        })
+    batch.commit()
+
+
+def run_mock_form_batch(count: int, first_template_number: int, save: bool = True) -> List[Dict]:
+    """
+    Build count parallel forms and publish them as templates.
+    
+    Exposure balancing counts the items of the active templates already
+    published, so a new batch leans on items those use least.
+    
+    Args:
+        count: Forms to build
+        first_template_number: Number of the first template (MOCK_MAIN_{nnn});
+                               templates with these IDs are overwritten
+        save: Write the templates (False: only build and report)
+    
+    Returns:
+        The template documents, in order
+    """
+    db = get_firestore_client()
+    index = get_question_bank_index()
+    
+    item_uses = {}
+    for template_doc in db.collection('mock_test_templates').where('active', '==', True).stream():
+        for chunk in template_doc.reference.collection('question_chunks').stream():
+            for question in chunk.to_dict().get('questions', []):
+                item_uses[question['question_id']] = item_uses.get(question['question_id'], 0) + 1
+    
+    started = time.perf_counter()
+    forms = assemble_parallel_mock_forms(count, index=index, item_uses=item_uses)
+    elapsed = time.perf_counter() - started
+    
+    templates = []
+    for offset, form in enumerate(forms):
+        number = first_template_number + offset
+        template = build_mock_test_template(form, f"MOCK_MAIN_{number:03d}",
+                                            f"JEE Main Mock Test {number}", index=index)
+        if save:
+            save_mock_test_template(template)
+        templates.append(template)
+    
+    if forms:
+        used = {}
+        for form in forms:
+            for question_id in np.asarray(index.question_ids)[form.rows].tolist():
+                used[question_id] = used.get(question_id, 0) + 1
+        instrument.event("mock_forms.batch",
+                         f"📝 Mock forms: {len(forms)} x {len(forms[0].rows)} items in {elapsed:.1f}s, "
+                         f"worst TIC deviation {max(f.max_relative_deviation for f in forms):.1%}, "
+                         f"{len(used)} distinct items, max item use {max(used.values())}")
+    return templates
+
+
+# ============================================================================
+# ITEM EXPOSURE CONTROL
+# ============================================================================
+
+class ItemExposureTracker:
+    """
+    Per-item exposure counters, accumulated in memory and flushed asynchronously.
+    
+    Counters are split by key into EXPOSURE_ITEM_BUCKETS ranges so no
+    document grows with the bank (Firestore caps document size and index
+    entries). Each flush writes a bucket's pending counts with
+    firestore.Increment into ONE of its EXPOSURE_COUNTER_SHARDS shard
+    documents (item_exposure_shards/{bucket}-{n}), picked at random, so
+    concurrent workers rarely write the same document. Totals are the sum
+    over all shards.
+    
+    Counted per flush:
+    - topic_selections.{topic}: selections made for the topic
+    - offered.{question_id}: times the question reached the exposure lottery
+    - administered.{question_id}: times the question was actually served
+    """
+    
+    def __init__(self, flush_interval: float = EXPOSURE_FLUSH_INTERVAL_SECONDS,
+                 num_shards: int = EXPOSURE_COUNTER_SHARDS,
+                 num_buckets: int = EXPOSURE_ITEM_BUCKETS):
+        self.flush_interval = flush_interval
+        self.num_shards = num_shards
+        self.num_buckets = num_buckets
+        self.sympson_hetter_parameters = {}  # question_id -> K_i (default 1.0)
+        self.parameters_calibrated_at: Optional[str] = None
+        self._parameters_loaded_at: Optional[float] = None
+        
+        self._pending = {"topic_selections": {}, "offered": {}, "administered": {}}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def record_selection(self, topic: str, offered_question_ids: List[str],
+                         administered_question_id: str):
+        """Count one selection (O(1), no I/O; starts the flusher on first use)"""
+        with self._lock:
+            pending = self._pending
+            pending["topic_selections"][topic] = pending["topic_selections"].get(topic, 0) + 1
+            for question_id in offered_question_ids:
+                pending["offered"][question_id] = pending["offered"].get(question_id, 0) + 1
+            pending["administered"][administered_question_id] = \
+                pending["administered"].get(administered_question_id, 0) + 1
+        
+        if self._thread is None:
+            self.start()
+    
+    def exposure_probability(self, question_id: str) -> float:
+        """Sympson-Hetter K_i: probability of administering the item once offered"""
+        return self.sympson_hetter_parameters.get(question_id, 1.0)
+    
+    def load_sympson_hetter_parameters(self):
+        """Load K_i values saved by save_sympson_hetter_parameters"""
+        db = get_firestore_client()
+        doc = db.collection('item_exposure_control').document('parameters').get()
+        if doc.exists:
+            data = doc.to_dict()
+            if data.get('calibrated_at') != self.parameters_calibrated_at:
+                self.sympson_hetter_parameters = data.get('k', {})
+                self.parameters_calibrated_at = data.get('calibrated_at')
+        self._parameters_loaded_at = time.monotonic()
+    
+    def parameters_stale(self) -> bool:
+        """True when K_i were never loaded or are older than EXPOSURE_PARAMETERS_REFRESH_SECONDS"""
+        return self._parameters_loaded_at is None or \
+            time.monotonic() - self._parameters_loaded_at >= EXPOSURE_PARAMETERS_REFRESH_SECONDS
+    
+    def bucket(self, key: str) -> int:
+        """Item range a counter key belongs to (stable across processes)"""
+        return int.from_bytes(hashlib.sha256(key.encode()).digest()[:4], 'big') % self.num_buckets
+    
+    def start(self):
+        """Start the background flush thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="exposure-flush", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background thread and flush whatever is pending"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+    
+    def flush(self):
+        """Write pending counts, one random shard document per touched bucket, in one batch"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {"topic_selections": {}, "offered": {}, "administered": {}}
+        
+        if not any(pending.values()):
+            return
+        
+        updates = {}
+        for group, counts in pending.items():
+            for key, count in counts.items():
+                update = updates.setdefault(self.bucket(key), {})
+                update.setdefault(group, {})[key] = firestore.Increment(count)
+        
+        try:
+            db = get_firestore_client()
+            batch = db.batch()
+            for bucket, update in updates.items():
+                shard_ref = db.collection('item_exposure_shards').document(
+                    f"{bucket}-{random.randrange(self.num_shards)}"
+                )
+                batch.set(shard_ref, update, merge=True)
+            batch.commit()
+        except Exception:
+            # Put counts back so the next flush retries them
+            with self._lock:
+                for group, counts in pending.items():
+                    for key, count in counts.items():
+                        self._pending[group][key] = self._pending[group].get(key, 0) + count
+            raise
+    
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                instrument.event("item_exposure.flush_failed",
+                                 f"⚠️ Exposure counter flush failed: {e}", level=logging.WARNING)
+
+
+_item_exposure_tracker: Optional[ItemExposureTracker] = None
+_item_exposure_lock = threading.Lock()
+
+
+def get_item_exposure_tracker() -> ItemExposureTracker:
+    """
+    Process-wide exposure tracker.
+    
+    With Sympson-Hetter control, K_i are loaded on creation and reloaded
+    every EXPOSURE_PARAMETERS_REFRESH_SECONDS, so values the nightly
+    calibration publishes reach running workers.
+    """
+    global _item_exposure_tracker
+    
+    if _item_exposure_tracker is None:
+        with _item_exposure_lock:
+            if _item_exposure_tracker is None:
+                _item_exposure_tracker = ItemExposureTracker()
+    
+    tracker = _item_exposure_tracker
+    if EXPOSURE_CONTROL_METHOD == "sympson_hetter" and tracker.parameters_stale():
+        with _item_exposure_lock:
+            if tracker.parameters_stale():
+                tracker.load_sympson_hetter_parameters()
+    
+    return tracker
+
+
+def apply_exposure_control(ranked_questions: List[Dict], method: Optional[str],
+                           tracker: ItemExposureTracker,
+                           rng: Optional[random.Random] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Choose which of the ranked candidates to administer.
+    
+    Args:
+        ranked_questions: Candidates, highest information first (non-empty)
+        method: None, "randomesque" or "sympson_hetter"
+        tracker: Source of Sympson-Hetter K_i values
+        rng: Quiz RNG (see quiz_rng); module-level random if None
+    
+    Returns:
+        (chosen question, questions offered to the exposure lottery)
+    """
+    rng = rng or random
+    
+    if method == "randomesque":
+        chosen = rng.choice(ranked_questions[:RANDOMESQUE_TOP_K])
+        return chosen, [chosen]
+    
+    if method == "sympson_hetter":
+        offered = []
+        for question in ranked_questions:
+            offered.append(question)
+            if rng.random() < tracker.exposure_probability(question['question_id']):
+                return question, offered
+        # Every lottery failed: serve the most informative candidate
+        return ranked_questions[0], offered
+    
+    return ranked_questions[0], [ranked_questions[0]]
+
+
+def get_item_exposure_report() -> Dict[str, Dict]:
+    """
+    Sum the shard counters into a per-item exposure report.
+    
+    Exposure rate = times administered / selections made for the item's topic.
+    
+    Returns:
+        Dict of {question_id: {topic, offered, administered, exposure_rate}}
+    """
+    db = get_firestore_client()
+    
+    totals = {"topic_selections": {}, "offered": {}, "administered": {}}
+    for shard in db.collection('item_exposure_shards').stream():
+        data = shard.to_dict()
+        for group, counts in totals.items():
+            for key, count in data.get(group, {}).items():
+                counts[key] = counts.get(key, 0) + count
+    
+    index = get_question_bank_index()
+    report = {}
+    
+    for question_id in set(totals["offered"]) | set(totals["administered"]):
+        row = index.row_of(question_id)
+        topic = index.topics[row] if row is not None else None
+        selections = totals["topic_selections"].get(topic, 0)
+        administered = totals["administered"].get(question_id, 0)
+        
+        report[question_id] = {
+            "topic": topic,
+            "offered": totals["offered"].get(question_id, 0),
+            "administered": administered,
+            "exposure_rate": administered / selections if selections > 0 else 0.0
+        }
+    
+    return report
+
+
+def calibrate_sympson_hetter_parameters(report: Dict[str, Dict],
+                                        target_max_rate: float = EXPOSURE_TARGET_MAX_RATE,
+                                        previous: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    One Sympson-Hetter calibration round from observed exposure.
+    
+    K_i is rescaled by target / rate, capped at 1: over-exposed items are
+    administered proportionally less often, and items that were throttled
+    more than needed recover. Repeat over successive reporting windows
+    until rates settle.
+    
+    Args:
+        report: Output of get_item_exposure_report
+        target_max_rate: Highest acceptable exposure rate
+        previous: K_i values in force while the report was collected
+    
+    Returns:
+        Dict of {question_id: K_i}
+    """
+    previous = previous or {}
+    parameters = {}
+    
+    for question_id, stats in report.items():
+        k_old = previous.get(question_id, 1.0)
+        rate = stats["exposure_rate"]
+        parameters[question_id] = min(1.0, k_old * target_max_rate / rate) if rate > 0 else 1.0
+    
+    return parameters
+
+
+def save_sympson_hetter_parameters(parameters: Dict[str, float]):
+    """Persist K_i values for get_item_exposure_tracker to load"""
+    db = get_firestore_client()
+    db.collection('item_exposure_control').document('parameters').set({
+        "k": parameters,
+        "calibrated_at": datetime.utcnow().isoformat()
+    })
+
+
+# ============================================================================
+# ITEM STATISTICS AND PARAMETER DRIFT
+# ============================================================================
+# Each logged answer adds, for its item and the theta bin the student was
+# in, the count, whether it was correct, the 3PL probability and its
+# variance P(1 - P). The totals are sufficient statistics for two checks:
+# - observed vs expected correct overall: the item got easier or harder
+# - Pearson fit over theta bins: residuals that change sign across theta
+#   (discrimination or guessing off) cancel overall but not here
+# Recording is O(1) and in memory. Pending sums are flushed with Increment,
+# one merge write per touched item doc (item_statistics/{question_id}).
+# The test runs only in the nightly check, on the summed docs of all
+# workers: testing at every flush would take a fresh look at the same
+# accumulating data each minute, and the chance that one of those looks
+# crosses ITEM_DRIFT_ALPHA by noise grows with every look. Local totals
+# stay available (local_drift) for inspection, not for queueing.
+# Flagged items go to item_recalibration_queue/{question_id}; items already
+# pending there are left alone. After the item is recalibrated,
+# reset_item_statistics clears its docs; local totals restart by themselves
+# once answers arrive with the new parameters.
+# Theta is the student's estimate at answer time, so the statistics are
+# a screen for recalibration, not a calibration on their own.
+
+ITEM_STAT_FIELDS = ("n", "observed", "expected", "variance")
+
+
+def item_drift(stats: np.ndarray) -> Dict:
+    """
+    Drift test on one item's statistics.
+    
+    Args:
+        stats: Array of shape (4, bins): ITEM_STAT_FIELDS by theta bin
+    
+    Returns:
+        Dict with totals, overall z, bin fit chi-square / df / p-value,
+        residual rate per bin (observed - expected per answer, None for empty
+        bins) and 'flagged'
+    """
+    counts, observed, expected, variance = stats
+    n = counts.sum()
+    total_variance = variance.sum()
+    z = float((observed.sum() - expected.sum()) / np.sqrt(total_variance)) if total_variance > 0 else 0.0
+    
+    fitted = (counts >= ITEM_DRIFT_MIN_BIN_RESPONSES) & (variance > 0)
+    fit_df = int(fitted.sum())
+    fit_chi2 = float(((observed[fitted] - expected[fitted]) ** 2 / variance[fitted]).sum())
+    p_fit = float(chi2.sf(fit_chi2, fit_df)) if fit_df else 1.0
+    p_overall = float(2 * norm.sf(abs(z)))
+    
+    return {
+        "n": int(n),
+        "observed": float(observed.sum()),
+        "expected": float(expected.sum()),
+        "z": z,
+        "fit_chi2": fit_chi2,
+        "fit_df": fit_df,
+        "p_value": min(p_fit, p_overall),
+        "residual_by_bin": [float((o - e) / c) if c else None
+                            for o, e, c in zip(observed, expected, counts)],
+        "flagged": bool(n >= ITEM_DRIFT_MIN_RESPONSES and min(p_fit, p_overall) < ITEM_DRIFT_ALPHA)
+    }
+
+
+def queue_items_for_recalibration(drifts: Dict[str, Dict], source: str) -> List[str]:
+    """
+    Upsert item_recalibration_queue/{question_id} for each flagged item.
+    
+    Items whose queue entry is still pending are skipped, so a repeat flag
+    neither re-sets flagged_at nor rewrites the drift under review.
+    
+    Returns:
+        Question IDs newly queued
+    """
+    db = get_firestore_client()
+    now = datetime.utcnow().isoformat()
+    queue = db.collection('item_recalibration_queue')
+    pending = {snapshot.id for snapshot in db.get_all([queue.document(question_id) for question_id in drifts])
+               if snapshot.exists and (snapshot.to_dict() or {}).get('status') == "pending"}
+    question_ids = [question_id for question_id in drifts if question_id not in pending]
+    
+    for start in range(0, len(question_ids), ITEM_STATS_WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for question_id in question_ids[start:start + ITEM_STATS_WRITE_BATCH_SIZE]:
+            batch.set(queue.document(question_id), {
+                "question_id": question_id,
+                "status": "pending",
+                "source": source,
+                "flagged_at": now,
+                "drift": drifts[question_id]
+            }, merge=True)
+        batch.commit()
+    
+    for question_id in question_ids:
+        drift = drifts[question_id]
+        direction = "easier" if drift["z"] > 0 else "harder"
+        instrument.event("item_drift.queued",
+                         f"📐 Item {question_id} queued for recalibration ({source}): plays {direction} "
+                         f"than calibrated, z={drift['z']:.1f}, fit p={drift['p_value']:.1e}, n={drift['n']}")
+    
+    return question_ids
+
+
+class ItemStatisticsAggregator:
+    """
+    Per-item answer statistics by theta bin, kept in memory and flushed in bulk.
+    
+    Holds two sets of sums per item: pending (not yet written) and local
+    totals since the item's current parameters were first seen. Only the
+    nightly check tests for drift; local totals are for local_drift.
+    """
+    
+    def __init__(self, flush_interval: float = ITEM_STATS_FLUSH_INTERVAL_SECONDS,
+                 theta_edges: Tuple[float, ...] = ITEM_STATS_THETA_EDGES):
+        self.flush_interval = flush_interval
+        self.theta_edges = list(theta_edges)
+        self.num_bins = len(self.theta_edges) + 1
+        
+        self._pending = {}  # question_id -> (4, bins) sums not yet written
+        self._totals = {}   # question_id -> (irt parameters, (4, bins) sums)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def record(self, question_id: str, theta: float, probability: float,
+               is_correct: bool, irt_parameters: Tuple[float, float, float]):
+        """
+        Add one answer (O(1), no I/O; starts the flusher on first use).
+        
+        Args:
+            question_id: Item answered
+            theta: Student's topic theta before the answer
+            probability: 3PL probability of a correct answer at theta
+            is_correct: Whether the answer was correct
+            irt_parameters: (a, b, c) the probability was computed with
+        """
+        column = bisect.bisect_right(self.theta_edges, theta)
+        values = (1.0, 1.0 if is_correct else 0.0, probability, probability * (1 - probability))
+        
+        with self._lock:
+            pending = self._pending.get(question_id)
+            if pending is None:
+                pending = self._pending[question_id] = np.zeros((4, self.num_bins))
+            pending[:, column] += values
+            
+            totals = self._totals.get(question_id)
+            if totals is None or totals[0] != irt_parameters:
+                totals = self._totals[question_id] = (irt_parameters, np.zeros((4, self.num_bins)))
+            totals[1][:, column] += values
+        
+        if self._thread is None:
+            self.start()
+    
+    def local_drift(self, question_id: str) -> Optional[Dict]:
+        """item_drift on this process's totals for the item (None if never answered)"""
+        with self._lock:
+            totals = self._totals.get(question_id)
+            stats = totals[1].copy() if totals is not None else None
+        return item_drift(stats) if stats is not None else None
+    
+    def start(self):
+        """Start the background flush thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="item-stats-flush", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background thread and flush whatever is pending"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+    
+    def flush(self):
+        """Increment pending sums into the item docs"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        
+        if not pending:
+            return
+        
+        db = get_firestore_client()
+        question_ids = list(pending)
+        written = 0
+        try:
+            for start in range(0, len(question_ids), ITEM_STATS_WRITE_BATCH_SIZE):
+                batch = db.batch()
+                chunk = question_ids[start:start + ITEM_STATS_WRITE_BATCH_SIZE]
+                for question_id in chunk:
+                    batch.set(db.collection('item_statistics').document(question_id),
+                              self._increments(pending[question_id]), merge=True)
+                batch.commit()
+                written += len(chunk)
+        except Exception:
+            # Put unwritten sums back so the next flush retries them
+            with self._lock:
+                for question_id in question_ids[written:]:
+                    if question_id in self._pending:
+                        self._pending[question_id] += pending[question_id]
+                    else:
+                        self._pending[question_id] = pending[question_id]
+            raise
+    
+    def _increments(self, sums: np.ndarray) -> Dict:
+        """Merge-write body: running totals plus per-bin sums for non-empty bins"""
+        update = {"n": firestore.Increment(int(sums[0].sum()))}
+        for name, row in zip(ITEM_STAT_FIELDS[1:], sums[1:]):
+            update[name] = firestore.Increment(float(row.sum()))
+        update["bins"] = {
+            str(column): {name: firestore.Increment(float(sums[i, column]))
+                          for i, name in enumerate(ITEM_STAT_FIELDS)}
+            for column in np.flatnonzero(sums[0])
+        }
+        return update
+    
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                instrument.event("item_statistics.flush_failed",
+                                 f"⚠️ Item statistics flush failed: {e}", level=logging.WARNING)
+
+
+_item_statistics_aggregator: Optional[ItemStatisticsAggregator] = None
+_item_statistics_lock = threading.Lock()
+
+
+def get_item_statistics_aggregator() -> ItemStatisticsAggregator:
+    """Process-wide item statistics aggregator"""
+    global _item_statistics_aggregator
+    
+    if _item_statistics_aggregator is None:
+        with _item_statistics_lock:
+            if _item_statistics_aggregator is None:
+                _item_statistics_aggregator = ItemStatisticsAggregator()
+    
+    return _item_statistics_aggregator
+
+
+def get_item_statistics_report(num_bins: int = len(ITEM_STATS_THETA_EDGES) + 1) -> Dict[str, np.ndarray]:
+    """
+    Load every item's summed statistics (one read per item doc).
+    
+    Returns:
+        Dict of {question_id: (4, bins) array of ITEM_STAT_FIELDS by theta bin}
+    """
+    db = get_firestore_client()
+    report = {}
+    
+    for doc in db.collection('item_statistics').stream():
+        stats = np.zeros((4, num_bins))
+        for column, sums in (doc.to_dict().get('bins') or {}).items():
+            if int(column) < num_bins:
+                stats[:, int(column)] = [sums.get(name, 0.0) for name in ITEM_STAT_FIELDS]
+        report[doc.id] = stats
+    
+    return report
+
+
+def detect_item_drift(report: Dict[str, np.ndarray]) -> Dict[str, Dict]:
+    """
+    Run item_drift over a statistics report.
+    
+    Returns:
+        Dict of {question_id: drift} for flagged items only
+    """
+    drifts = {question_id: item_drift(stats) for question_id, stats in report.items()}
+    return {question_id: drift for question_id, drift in drifts.items() if drift["flagged"]}
+
+
+def reset_item_statistics(question_ids: List[str]):
+    """Delete the statistics docs of recalibrated items (old residuals no longer apply)"""
+    db = get_firestore_client()
+    for start in range(0, len(question_ids), ITEM_STATS_WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for question_id in question_ids[start:start + ITEM_STATS_WRITE_BATCH_SIZE]:
+            batch.delete(db.collection('item_statistics').document(question_id))
+        batch.commit()
+
+
+def run_nightly_item_drift_check() -> Dict[str, Dict]:
+    """
+    Cron entry point: test every item on all workers' statistics and queue drifted ones.
+    
+    Returns:
+        Dict of {question_id: drift} for newly queued items (flagged items
+        already pending review are not included)
+    """
+    report = get_item_statistics_report()
+    drifts = detect_item_drift(report)
+    queued = queue_items_for_recalibration(drifts, source="nightly") if drifts else []
+    
+    instrument.event("item_drift.checked", f"📐 Item drift check: {len(drifts)} of {len(report)} items flagged, "
+                                           f"{len(queued)} newly queued for recalibration")
+    return {question_id: drifts[question_id] for question_id in queued}
+
+
+# ============================================================================
+# THETA HISTORY REPLAY (BULK RECOMPUTE AFTER RECALIBRATION)
+# ============================================================================
+# theta_by_topic is the result of applying update_theta_after_response's
+# rule to a student's response log with the IRT parameters of the day.
+# After recalibration, replay re-applies the rule with the new parameters:
+# - Each (student, topic) pair is an independent lane, starting from the
+#   theta_before / confidence_SE_before of its first logged response (the
+#   assessment estimate or untested-topic prior) and from the attempts /
+#   correct counts that predate the log
+# - Lanes of a chunk of students are padded into (lanes x steps) matrices,
+#   sorted longest first, and stepped together with numpy
+# - Chunks run in a process pool while threads load the next chunk's logs;
+#   results go back in batched writes, each guarded by the profile's
+#   update_time so students who answered meanwhile are skipped, not clobbered
+# Responses to questions no longer in the bank replay their logged delta;
+# rapid guesses keep their logged time_weight.
+# Limitation: only the raw log is replayed, which compaction trims to the
+# last RESPONSE_LOG_RETAIN_DAYS. Each lane starts from the theta_before of
+# its oldest retained response, so older answers keep the contribution
+# they had under the parameters of their day; the rollup holds counts,
+# not the per-answer data needed to re-score them.
+
+@dataclass
+class ReplayBatch:
+    """Padded response matrices for one chunk of students (lanes sorted longest first)"""
+    lane_students: List[str]
+    lane_topics: List[str]
+    theta: np.ndarray  # (lanes,) start state
+    se: np.ndarray
+    attempts: np.ndarray
+    correct: np.ndarray
+    lengths: np.ndarray  # (lanes,) responses per lane
+    difficulty_b: np.ndarray  # (lanes, steps); NaN = question missing from the bank
+    discrimination_a: np.ndarray
+    guessing_c: np.ndarray
+    is_correct: np.ndarray
+    logged_delta: np.ndarray
+    time_weight: np.ndarray  # Logged rapid-guess weight (1 = full step)
+
+
+def replay_theta_lanes(batch: ReplayBatch) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Re-apply the per-response theta/SE/accuracy update to every lane at once.
+    
+    Module-level and pure, so it can run in a worker process.
+    
+    Args:
+        batch: Lanes built by build_replay_batch
+    
+    Returns:
+        (theta, confidence_SE, attempts, correct) arrays, one entry per lane
+    """
+    theta = batch.theta.copy()
+    se = batch.se.copy()
+    attempts = batch.attempts.copy()
+    correct = batch.correct.copy()
+    steps = int(batch.lengths[0]) if len(batch.lengths) else 0
+    
+    for step in range(steps):
+        n = int(np.count_nonzero(batch.lengths > step))  # Active lanes are a prefix
+        b = batch.difficulty_b[:n, step]
+        is_correct = batch.is_correct[:n, step]
+        
+        P = calculate_probability_3PL_array(theta[:n], b, batch.discrimination_a[:n, step],
+                                            batch.guessing_c[:n, step])
+        learning_rate = BASE_LEARNING_RATE / (1 + LEARNING_RATE_DECAY * attempts[:n])
+        weight = batch.time_weight[:n, step]
+        delta = np.where(is_correct, learning_rate * (1 - P), -learning_rate * P) * weight
+        delta = np.where(np.isnan(b), batch.logged_delta[:n, step], delta)
+        
+        theta[:n] = np.clip(theta[:n] + delta, THETA_MIN, THETA_MAX)
+        se[:n] = np.maximum(SE_FLOOR, se[:n] * SE_REDUCTION_RATE ** weight)
+        attempts[:n] += 1
+        correct[:n] += is_correct
+    
+    return theta, se, attempts, correct
+
+
+def build_replay_batch(student_inputs: List[Tuple[str, Dict, List[Dict]]],
+                       item_parameters: Dict[str, Tuple[float, float, float]]) -> ReplayBatch:
+    """
+    Turn loaded profiles and response logs into padded lane matrices.
+    
+    Args:
+        student_inputs: (student_id, profile, responses ordered by answered_at)
+        item_parameters: question_id -> (difficulty_b, discrimination_a, guessing_c)
+    
+    Returns:
+        ReplayBatch
+    """
+    lanes = []  # (student_id, topic, start_state, responses)
+    
+    for student_id, student_data, responses in student_inputs:
+        if not student_data:
+            continue
+        by_topic = {}
+        for response in responses:
+            by_topic.setdefault(response['topic'], []).append(response)
+        
+        for topic, topic_responses in by_topic.items():
+            current = student_data.get('theta_by_topic', {}).get(topic)
+            if current is None:
+                continue
+            # Counts that predate the log = current totals minus the logged responses
+            # (correct stays fractional: accuracy is a running mean, not a ratio of ints)
+            total_attempts = current['attempts']
+            total_correct = (current.get('accuracy') or 0.0) * total_attempts
+            attempts = max(0, total_attempts - len(topic_responses))
+            correct = min(attempts, max(0.0, total_correct - sum(r['is_correct'] for r in topic_responses)))
+            first = topic_responses[0]
+            start = (first['theta_before'], first['confidence_SE_before'], attempts, correct)
+            lanes.append((student_id, topic, start, topic_responses))
+    
+    lanes.sort(key=lambda lane: len(lane[3]), reverse=True)
+    steps = len(lanes[0][3]) if lanes else 0
+    shape = (len(lanes), steps)
+    
+    difficulty_b = np.full(shape, np.nan)
+    discrimination_a = np.ones(shape)
+    guessing_c = np.zeros(shape)
+    is_correct = np.zeros(shape, dtype=bool)
+    logged_delta = np.zeros(shape)
+    time_weight = np.ones(shape)
+    
+    for lane, (_, _, _, topic_responses) in enumerate(lanes):
+        for step, response in enumerate(topic_responses):
+            parameters = item_parameters.get(response['question_id'])
+            if parameters is not None:
+                difficulty_b[lane, step], discrimination_a[lane, step], guessing_c[lane, step] = parameters
+            is_correct[lane, step] = bool(response['is_correct'])
+            logged_delta[lane, step] = response.get('theta_delta', 0.0)
+            time_weight[lane, step] = response.get('time_weight', 1.0)
+    
+    return ReplayBatch(
+        lane_students=[lane[0] for lane in lanes],
+        lane_topics=[lane[1] for lane in lanes],
+        theta=np.array([lane[2][0] for lane in lanes], dtype=np.float64),
+        se=np.array([lane[2][1] for lane in lanes], dtype=np.float64),
+        attempts=np.array([lane[2][2] for lane in lanes], dtype=np.int64),
+        correct=np.array([lane[2][3] for lane in lanes], dtype=np.float64),
+        lengths=np.array([len(lane[3]) for lane in lanes], dtype=np.int64),
+        difficulty_b=difficulty_b,
+        discrimination_a=discrimination_a,
+        guessing_c=guessing_c,
+        is_correct=is_correct,
+        logged_delta=logged_delta,
+        time_weight=time_weight
+    )
+
+
+def load_item_parameters() -> Dict[str, Tuple[float, float, float]]:
+    """Current (b, a, c) of every question, read fresh from Firestore"""
+    db = get_firestore_client()
+    parameters = {}
+    for q in db.collection('questions').stream():
+        doc = q.to_dict()
+        irt = doc['irt_parameters']
+        parameters[doc['question_id']] = (irt['difficulty_b'], irt['discrimination_a'], irt['guessing_c'])
+    return parameters
+
+
+def _load_replay_input(student_id: str):
+    """Profile snapshot plus the retained (uncompacted) response log in answer order"""
+    db = get_firestore_client()
+    snapshot = db.collection('students').document(student_id).get()
+    responses = [r.to_dict() for r in
+                 db.collection('student_responses').document(student_id)
+                   .collection('responses').order_by('answered_at').stream()]
+    return student_id, snapshot, responses
+
+
+def _write_replay_results(inputs, batch: ReplayBatch, results, dry_run: bool) -> Tuple[int, int]:
+    """Write recomputed topic thetas; returns (students written, students skipped)"""
+    theta, se, attempts, correct = results
+    snapshots = {student_id: snapshot for student_id, snapshot, _ in inputs}
+    
+    updates = {}
+    for lane, (student_id, topic) in enumerate(zip(batch.lane_students, batch.lane_topics)):
+        previous = snapshots[student_id].to_dict()['theta_by_topic'][topic]
+        updates.setdefault(student_id, {})[f'theta_by_topic.{topic}'] = {
+            "theta": float(theta[lane]),
+            "percentile": theta_to_percentile(float(theta[lane])),
+            "confidence_SE": float(se[lane]),
+            "attempts": int(attempts[lane]),
+            "accuracy": float(correct[lane] / attempts[lane]) if attempts[lane] else 0.0,
+            "last_updated": previous.get('last_updated')
+        }
+    
+    if dry_run or not updates:
+        return len(updates), 0
+    
+    db = get_firestore_client()
+    recomputed_at = datetime.utcnow().isoformat()
+    student_ids = list(updates)
+    written, skipped = 0, 0
+    
+    def write_options(student_id) -> Dict:
+        """Precondition: profile unchanged since it was read"""
+        update_time = getattr(snapshots[student_id], 'update_time', None)
+        return {'option': db.write_option(last_update_time=update_time)} if update_time else {}
+    
+    for start in range(0, len(student_ids), REPLAY_WRITE_BATCH_SIZE):
+        chunk = student_ids[start:start + REPLAY_WRITE_BATCH_SIZE]
+        batch_write = db.batch()
+        for student_id in chunk:
+            ref = db.collection('students').document(student_id)
+            update = {**updates[student_id], 'theta_recomputed_at': recomputed_at}
+            batch_write.update(ref, update, **write_options(student_id))
+        try:
+            batch_write.commit()
+            written += len(chunk)
+        except Exception:
+            # A profile changed since it was read; write the rest one by one
+            for student_id in chunk:
+                ref = db.collection('students').document(student_id)
+                update = {**updates[student_id], 'theta_recomputed_at': recomputed_at}
+                try:
+                    ref.update(update, **write_options(student_id))
+                    written += 1
+                except Exception:
+                    skipped += 1
+    
+    return written, skipped
+
+
+def replay_theta_chunk(student_ids: List[str], item_parameters: Dict[str, Tuple[float, float, float]],
+                       dry_run: bool = False) -> Dict:
+    """
+    Replay one chunk of students in this process, against parameters the caller loaded.
+    
+    For callers that run many chunks with the same parameters (the batch
+    runner), so the questions collection is read once, not once per chunk.
+    
+    Args:
+        student_ids: Students to re-score
+        item_parameters: question_id -> (difficulty_b, discrimination_a, guessing_c)
+        dry_run: Compute without writing
+    
+    Returns:
+        Counts: students, lanes, responses, written, skipped
+    """
+    with ThreadPoolExecutor(max_workers=REPLAY_LOAD_THREADS) as loader:
+        inputs = list(loader.map(_load_replay_input, student_ids))
+    batch = build_replay_batch(
+        [(sid, snapshot.to_dict(), responses) for sid, snapshot, responses in inputs],
+        item_parameters
+    )
+    written, skipped = _write_replay_results(inputs, batch, replay_theta_lanes(batch), dry_run)
+    return {"students": len(student_ids), "lanes": len(batch.lengths),
+            "responses": int(batch.lengths.sum()), "written": written, "skipped": skipped}
+
+
+def recompute_all_student_thetas(student_ids: Optional[List[str]] = None,
+                                 workers: Optional[int] = None,
+                                 chunk_size: int = REPLAY_CHUNK_STUDENTS,
+                                 dry_run: bool = False) -> Dict:
+    """
+    Replay every student's response log with the current IRT parameters.
+    
+    Only the retained raw log (the last RESPONSE_LOG_RETAIN_DAYS) is
+    re-scored; answers already folded into the response rollup are not.
+    
+    Args:
+        student_ids: Students to re-score (default: all)
+        workers: Replay processes (default: CPU count; 1 = in-process)
+        chunk_size: Students per vectorized batch
+        dry_run: Compute without writing
+    
+    Returns:
+        Summary: students, lanes, responses, written, skipped, seconds
+    """
+    started = time.perf_counter()
+    db = get_firestore_client()
+    workers = workers or os.cpu_count() or 1
+    
+    item_parameters = load_item_parameters()
+    if student_ids is None:
+        student_ids = [ref.id for ref in db.collection('students').list_documents()]
+    chunks = [student_ids[i:i + chunk_size] for i in range(0, len(student_ids), chunk_size)]
+    
+    summary = {"students": len(student_ids), "lanes": 0, "responses": 0, "written": 0, "skipped": 0}
+    
+    def finish(inputs, batch, results):
+        written, skipped = _write_replay_results(inputs, batch, results, dry_run)
+        summary["written"] += written
+        summary["skipped"] += skipped
+    
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=REPLAY_LOAD_THREADS) as loader:
+            in_flight = []
+            for chunk in chunks:
+                inputs = list(loader.map(_load_replay_input, chunk))
+                batch = build_replay_batch(
+                    [(sid, snapshot.to_dict(), responses) for sid, snapshot, responses in inputs],
+                    item_parameters
+                )
+                summary["lanes"] += len(batch.lengths)
+                summary["responses"] += int(batch.lengths.sum())
+                
+                if pool is None:
+                    finish(inputs, batch, replay_theta_lanes(batch))
+                    continue
+                
+                in_flight.append((inputs, batch, pool.submit(replay_theta_lanes, batch)))
+                while len(in_flight) > workers:  # Keep loading ahead of the workers, boundedly
+                    inputs, batch, future = in_flight.pop(0)
+                    finish(inputs, batch, future.result())
+            
+            for inputs, batch, future in in_flight:
+                finish(inputs, batch, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    instrument.event("theta_replay.summary",
+                     f"🔁 Theta replay: {summary['students']} students, {summary['responses']} responses, "
+                     f"{summary['written']} written, {summary['skipped']} skipped in {summary['seconds']}s")
+    return summary
+
+
+# ============================================================================
+# RESPONSE LOG COMPACTION (PER-TOPIC ROLLUPS)
+# ============================================================================
+# student_responses/{id}/responses keeps only the last RESPONSE_LOG_RETAIN_DAYS
+# of raw responses. Older ones are folded into student_response_rollups/{id}:
+#
+#   {
+#     "compacted_through": ISO time of the newest folded response,
+#     "topics": {topic: {"attempts", "correct", "last_attempt_at"}},
+#     "review_candidates": {question_id: {"topic", "first_correct_at", "last_correct_at"}}
+#   }
+#
+# and archived as gzipped JSON lines in Cloud Storage. Each chunk's rollup
+# write and raw deletes share one batch, committed only if the rollup is
+# unchanged since it was read (update_time precondition, create() for the
+# first), so a response is never counted twice or lost even when two
+# compactions of a student overlap. review_candidates is bounded: entries
+# not answered correctly for REVIEW_CANDIDATE_MAX_AGE_DAYS are dropped and
+# at most REVIEW_CANDIDATES_MAX (most recently correct) are kept, so the
+# rollup stays far below the document size limit. Readers combine the
+# bounded raw log with the rollup, so per-student query cost stays flat as
+# history grows. Replay (recompute_all_student_thetas) re-scores the
+# retained raw window only, and idempotency keys of compacted responses are
+# no longer recognised (see update_theta_after_response).
+
+def load_response_rollup(student_id: str) -> Dict:
+    """Student's response rollup ({} if never compacted)"""
+    db = get_firestore_client()
+    return db.collection('student_response_rollups').document(student_id).get().to_dict() or {}
+
+
+def rollup_review_responses(rollup: Dict) -> List[Dict]:
+    """
+    Compacted review candidates shaped like correct responses (for the review pickers).
+    
+    Uses each question's first correct answer: the pickers rank a question by
+    its oldest correct response, so the result matches the uncompacted log.
+    """
+    return [
+        {"question_id": question_id, "topic": candidate['topic'],
+         "is_correct": True, "answered_at": candidate['first_correct_at']}
+        for question_id, candidate in rollup.get('review_candidates', {}).items()
+    ]
+
+
+def rollup_latest_responses(rollup: Dict, topic: str) -> List[Dict]:
+    """The topic's last compacted attempt as a one-response list ([] if none)"""
+    topic_rollup = rollup.get('topics', {}).get(topic)
+    if topic_rollup is None:
+        return []
+    return [{"topic": topic, "answered_at": topic_rollup['last_attempt_at']}]
+
+
+def fold_responses_into_rollup(rollup: Dict, responses: List[Dict]) -> Dict:
+    """
+    Add responses to a rollup (returns a new rollup, input unchanged).
+    
+    Args:
+        rollup: Existing rollup ({} for none)
+        responses: Raw responses being compacted
+    
+    Returns:
+        Updated rollup
+    """
+    topics = {topic: dict(values) for topic, values in rollup.get('topics', {}).items()}
+    review_candidates = dict(rollup.get('review_candidates', {}))
+    compacted_through = rollup.get('compacted_through')
+    
+    for response in responses:
+        answered_at = response['answered_at']
+        topic_rollup = topics.setdefault(response['topic'],
+                                         {"attempts": 0, "correct": 0, "last_attempt_at": answered_at})
+        topic_rollup['attempts'] += 1
+        topic_rollup['correct'] += 1 if response['is_correct'] else 0
+        topic_rollup['last_attempt_at'] = max(topic_rollup['last_attempt_at'], answered_at)
+        
+        if response['is_correct']:
+            previous = review_candidates.get(response['question_id'])
+            review_candidates[response['question_id']] = {
+                "topic": response['topic'],
+                "first_correct_at": min(previous['first_correct_at'], answered_at) if previous else answered_at,
+                "last_correct_at": max(previous['last_correct_at'], answered_at) if previous else answered_at
+            }
+        
+        compacted_through = max(compacted_through or answered_at, answered_at)
+    
+    return {"compacted_through": compacted_through, "topics": topics,
+            "review_candidates": prune_review_candidates(review_candidates)}
+
+
+def prune_review_candidates(review_candidates: Dict[str, Dict],
+                            max_age_days: int = REVIEW_CANDIDATE_MAX_AGE_DAYS,
+                            max_candidates: int = REVIEW_CANDIDATES_MAX) -> Dict[str, Dict]:
+    """
+    Bound a rollup's review candidates.
+    
+    Drops questions last answered correctly more than max_age_days ago, then
+    keeps the max_candidates most recently correct.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+    kept = sorted(((question_id, candidate) for question_id, candidate in review_candidates.items()
+                   if candidate['last_correct_at'] >= cutoff),
+                  key=lambda item: item[1]['last_correct_at'], reverse=True)
+    return dict(kept[:max_candidates])
+
+
+def archive_responses_to_storage(student_id: str, responses: List[Dict]) -> str:
+    """
+    Write raw responses to Cloud Storage as gzipped JSON lines.
+    
+    Returns:
+        Object path ({prefix}/{student_id}/{first}_{last}.jsonl.gz)
+    """
+    from firebase_admin import storage  # Needs google-cloud-storage; only the compaction job uses it
+    
+    first, last = responses[0]['answered_at'], responses[-1]['answered_at']
+    path = f"{RESPONSE_ARCHIVE_PREFIX}/{student_id}/{first}_{last}.jsonl.gz"
+    payload = gzip.compress("\n".join(json.dumps(r, default=str) for r in responses).encode())
+    storage.bucket().blob(path).upload_from_string(payload, content_type="application/gzip")
+    return path
+
+
+def compact_student_responses(student_id: str, retain_days: int = RESPONSE_LOG_RETAIN_DAYS,
+                              archive=archive_responses_to_storage) -> int:
+    """
+    Fold a student's raw responses older than retain_days into the rollup.
+    
+    Oldest first, RESPONSE_COMPACTION_CHUNK_SIZE at a time: archive the
+    chunk, then write the rollup and delete the chunk in one batch that
+    only commits if the rollup is as read. The rollup is read before the
+    responses, so a chunk another compaction folded in meanwhile fails the
+    precondition instead of being counted again; this run then leaves the
+    rest to that one.
+    
+    Args:
+        student_id: Student identifier
+        retain_days: Days of raw responses to keep
+        archive: Callable(student_id, responses) storing the raw chunk
+    
+    Returns:
+        Number of responses compacted
+    """
+    retain_days = max(retain_days, RECENT_QUESTIONS_WINDOW_DAYS)  # Recency reads need the raw window
+    cutoff = (datetime.utcnow() - timedelta(days=retain_days)).isoformat()
+    
+    db = get_firestore_client()
+    responses_ref = db.collection('student_responses').document(student_id).collection('responses')
+    rollup_ref = db.collection('student_response_rollups').document(student_id)
+    
+    # Rollup first: anything compacted after this read fails the precondition
+    rollup_snapshot = rollup_ref.get()
+    rollup = rollup_snapshot.to_dict() or {}
+    update_time = rollup_snapshot.update_time if rollup_snapshot.exists else None
+    
+    old_responses = [(r.reference, r.to_dict()) for r in
+                     responses_ref.where('answered_at', '<', cutoff).order_by('answered_at').stream()]
+    
+    compacted = 0
+    for start in range(0, len(old_responses), RESPONSE_COMPACTION_CHUNK_SIZE):
+        chunk = old_responses[start:start + RESPONSE_COMPACTION_CHUNK_SIZE]
+        chunk_responses = [response for _, response in chunk]
+        
+        archive(student_id, chunk_responses)
+        rollup = fold_responses_into_rollup(rollup, chunk_responses)
+        
+        batch = db.batch()
+        if update_time is None:
+            batch.create(rollup_ref, rollup)
+        else:
+            batch.update(rollup_ref, rollup, option=db.write_option(last_update_time=update_time))
+        for ref, _ in chunk:
+            batch.delete(ref)
+        try:
+            update_time = batch.commit()[0].update_time
+        except (AlreadyExists, FailedPrecondition):
+            # Another compaction of this student committed first; it finishes the log
+            instrument.count("responses_compaction_yielded")
+            break
+        compacted += len(chunk)
+    
+    instrument.count("responses_compacted", compacted)
+    return compacted
+
+
+def compact_all_response_logs(student_ids: Optional[List[str]] = None,
+                              retain_days: int = RESPONSE_LOG_RETAIN_DAYS,
+                              threads: int = REPLAY_LOAD_THREADS) -> Dict:
+    """
+    Nightly job: compact every student's response log.
+    
+    Returns:
+        Summary: students, compacted, failed
+    """
+    if student_ids is None:
+        db = get_firestore_client()
+        student_ids = [ref.id for ref in db.collection('students').list_documents()]
+    
+    summary = {"students": len(student_ids), "compacted": 0, "failed": 0}
+    
+    def compact(student_id):
+        try:
+            return compact_student_responses(student_id, retain_days)
+        except Exception as e:
+            instrument.event("response_compaction.failed",
+                             f"⚠️ Response compaction failed for {student_id}: {e}", level=logging.WARNING)
+            return None
+    
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for compacted in pool.map(compact, student_ids):
+            if compacted is None:
+                summary["failed"] += 1
+            else:
+                summary["compacted"] += compacted
+    
+    instrument.event("response_compaction.summary",
+                     f"🗜️ Response logs compacted: {summary['compacted']} responses across "
+                     f"{summary['students']} students ({summary['failed']} failed)")
+    return summary
+
+
+# ============================================================================
+# MAIN EXECUTION FLOW
+# ============================================================================
+
+if __name__ == "__main__":
+    # Example usage
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    # Initialize Firebase (you'll need to provide credentials)
+    # cred = credentials.Certificate('path/to/serviceAccountKey.json')
+    # firebase_admin.initialize_app(cred)
+    
+    # Example 1: Process initial assessment
+    sample_responses = [
+        {"question_id": "ASSESS_PHY_MECH_001", "answer": "A", "is_correct": True, "time_taken": 95},
+        {"question_id": "ASSESS_PHY_MECH_002", "answer": "C", "is_correct": False, "time_taken": 140},
+        # ... 28 more
+    ]
+    
+    # profile = process_initial_assessment("student_12345", sample_responses)
+    # print(f"Initial theta: {profile['overall_theta']}")
+    
+    # Example 2: Generate daily quiz (quiz-based, not day-based)
+    # completed_quiz_count = 0  # First quiz after assessment
+    # quiz = generate_daily_quiz("student_12345", completed_quiz_count=0)
+    # print(f"Generated {len(quiz)} questions for Quiz #{completed_quiz_count}")
+    
+    # Example 2b: Auto-fetch quiz count from DB
+    # quiz = generate_daily_quiz("student_12345")  # Fetches completed_quiz_count from profile
+    # print(f"Generated quiz")
+    
+    # Example 3: Update theta after response
+    # new_theta = update_theta_after_response("student_12345", "MECH_045", is_correct=True, time_taken=120)
+    # print(f"Updated theta: {new_theta}")
+    
+    # Example 4: Nightly columnar export (cron), the cold-start source for selection
+    # run_nightly_question_bank_export()
+    
+    # Example 5: Nightly response log compaction (cron)
+    # compact_all_response_logs()
+    
+    # Example 6: Nightly jobs across nodes, leased shards with checkpoints (see iidp_batch_runner.py)
+    # python iidp_batch_runner.py theta_replay --lease-store firestore --workers 8
+    
+    # Example 7: Nightly topic covariance refit (cron), priors for untested topics
+    # run_nightly_topic_covariance_fit()
+    
+    # Example 8: Nightly response-time model refit (cron), speeds and time budgets
+    # run_nightly_response_time_fit()
+    
+    # Example 9: Batch of parallel full-length mock tests (MOCK_MAIN_004 onwards)
+    # run_mock_form_batch(200, first_template_number=4)
     
     pass
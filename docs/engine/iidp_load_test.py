@@ -0,0 +1,873 @@
+# JEEVibe IIDP Algorithm - Load Test Driver
+# Simulates concurrent students against the engine on a latency-simulating
+# in-memory stand-in for Firestore
+#
+# Usage:
+#   python iidp_load_test.py --students 50 --quizzes 3 --think-time 0.5
+#
+# Each simulated student runs assessment -> daily quiz -> answer loop.
+# Answers are drawn from the 3PL model at the student's (hidden) true
+# ability, so theta updates and selection behave like real traffic.
+
+import argparse
+import asyncio
+import copy
+import itertools
+import math
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, Aborted, DeadlineExceeded, \
+    FailedPrecondition, NotFound, ResourceExhausted
+from google.cloud.firestore_v1.transforms import ArrayRemove, ArrayUnion, Increment
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+import iidp_implementation_v4_CALIBRATED as engine
+from iidp_implementation_v4_CALIBRATED import firestore
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_READ_LATENCY_MS = 8             # Median single-document read
+DEFAULT_WRITE_LATENCY_MS = 15           # Median write / batch commit
+DEFAULT_PER_DOCUMENT_MS = 0.05          # Extra per document streamed by a query
+DEFAULT_LATENCY_SIGMA = 0.35            # Lognormal spread around the medians
+DOCUMENT_WRITE_BURST = 5                # Writes a document absorbs before throttling
+DOCUMENT_WRITES_PER_SECOND = 1.0        # Sustained per-document write rate (Firestore guidance)
+
+RETRYABLE_ERRORS = (Aborted, DeadlineExceeded, ResourceExhausted)
+MAX_RETRIES = 5
+RETRY_BASE_DELAY_SECONDS = 0.05
+
+ASSESSMENT_LENGTH = 30
+
+
+# ============================================================================
+# LATENCY-SIMULATING STORAGE STAND-IN
+# ============================================================================
+
+@dataclass
+class LatencyModel:
+    """Lognormal latency around per-operation medians (0 disables sleeping)"""
+    read_ms: float = DEFAULT_READ_LATENCY_MS
+    write_ms: float = DEFAULT_WRITE_LATENCY_MS
+    per_document_ms: float = DEFAULT_PER_DOCUMENT_MS
+    sigma: float = DEFAULT_LATENCY_SIGMA
+    
+    def delay(self, kind: str, documents: int = 0) -> float:
+        median = self.read_ms if kind == "read" else self.write_ms
+        if median <= 0:
+            return 0.0
+        seconds = median * math.exp(random.gauss(0, self.sigma)) / 1000
+        return seconds + documents * self.per_document_ms / 1000
+
+
+def _get_field(data: Dict, path: str):
+    for key in path.split('.'):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _apply_value(data: Dict, path: str, value, split: bool = True):
+    """Set one field, resolving Firestore transforms and sentinels"""
+    keys = path.split('.') if split else [path]
+    for key in keys[:-1]:
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        data = data[key]
+    leaf = keys[-1]
+    
+    if isinstance(value, Increment):
+        data[leaf] = (data.get(leaf) or 0) + value.value
+    elif isinstance(value, ArrayUnion):
+        current = list(data.get(leaf) or [])
+        data[leaf] = current + [v for v in value.values if v not in current]
+    elif isinstance(value, ArrayRemove):
+        data[leaf] = [v for v in (data.get(leaf) or []) if v not in value.values]
+    elif value is firestore.DELETE_FIELD:
+        data.pop(leaf, None)
+    elif value is firestore.SERVER_TIMESTAMP:
+        data[leaf] = datetime.now(timezone.utc)
+    elif isinstance(value, dict):
+        data[leaf] = {}
+        for key, nested in value.items():
+            _apply_value(data[leaf], key, nested, split=False)
+    else:
+        data[leaf] = copy.deepcopy(value)
+
+
+def _merge_value(data: Dict, key: str, value):
+    """set(merge=True): nested dicts merge, everything else overwrites"""
+    if isinstance(value, dict):
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        for nested_key, nested in value.items():
+            _merge_value(data[key], nested_key, nested)
+    else:
+        _apply_value(data, key, value, split=False)
+
+
+class _WriteOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class _WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class InMemorySnapshot:
+    def __init__(self, reference, data: Optional[Dict], update_time):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+    
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data)
+    
+    def get(self, field_path: str):
+        return _get_field(self._data or {}, field_path)
+
+
+class InMemoryDocument:
+    def __init__(self, store: "InMemoryFirestore", path: tuple):
+        self._store = store
+        self._path = path
+        self.id = path[-1]
+        self.path = "/".join(path)
+    
+    def collection(self, name: str) -> "InMemoryCollection":
+        return InMemoryCollection(self._store, self._path + (name,))
+    
+    def get(self) -> InMemorySnapshot:
+        self._store.simulate("read")
+        return self._store.snapshot(self._path)
+    
+    def set(self, data: Dict, merge: bool = False) -> _WriteResult:
+        return self._store.commit([("set", self._path, data, merge, None)])[0]
+    
+    def create(self, data: Dict) -> _WriteResult:
+        return self._store.commit([("create", self._path, data, False, None)])[0]
+    
+    def update(self, data: Dict, option: Optional[_WriteOption] = None) -> _WriteResult:
+        return self._store.commit([("update", self._path, data, False, option)])[0]
+    
+    def delete(self):
+        self._store.commit([("delete", self._path, None, False, None)])
+
+
+class _AggregationResult:
+    def __init__(self, value: int):
+        self.value = value
+
+
+class InMemoryQuery:
+    _OPERATORS = {
+        '==': lambda x, v: x == v,
+        '!=': lambda x, v: x is not None and x != v,
+        '<': lambda x, v: x is not None and x < v,
+        '<=': lambda x, v: x is not None and x <= v,
+        '>': lambda x, v: x is not None and x > v,
+        '>=': lambda x, v: x is not None and x >= v,
+        'in': lambda x, v: x in v,
+        'array_contains': lambda x, v: isinstance(x, list) and v in x,
+    }
+    
+    def __init__(self, store: "InMemoryFirestore", path: tuple,
+                 filters=(), orders=(), limit_to: Optional[int] = None):
+        self._store = store
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_to
+    
+    def where(self, field_path: str, op: str, value) -> "InMemoryQuery":
+        return InMemoryQuery(self._store, self._path, self._filters + ((field_path, op, value),),
+                             self._orders, self._limit)
+    
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "InMemoryQuery":
+        return InMemoryQuery(self._store, self._path, self._filters,
+                             self._orders + ((field_path, direction),), self._limit)
+    
+    def limit(self, count: int) -> "InMemoryQuery":
+        return InMemoryQuery(self._store, self._path, self._filters, self._orders, count)
+    
+    def _matches(self) -> List[InMemorySnapshot]:
+        rows = []
+        for path, data in self._store.documents_in(self._path):
+            if all(self._OPERATORS[op](_get_field(data, f), v) for f, op, v in self._filters) and \
+                    all(_get_field(data, f) is not None for f, _ in self._orders):
+                rows.append((path, data))
+        
+        for field_path, direction in reversed(self._orders):
+            rows.sort(key=lambda row: _get_field(row[1], field_path),
+                      reverse=(direction == "DESCENDING"))
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        
+        return [self._store.snapshot(path) for path, _ in rows]
+    
+    def stream(self):
+        snapshots = self._matches()
+        self._store.simulate("read", documents=len(snapshots))
+        return iter(snapshots)
+    
+    def get(self) -> List[InMemorySnapshot]:
+        return list(self.stream())
+    
+    def count(self):
+        query = self
+        
+        class _CountQuery:
+            def get(self):
+                query._store.simulate("read")
+                return [[_AggregationResult(len(query._matches()))]]
+        
+        return _CountQuery()
+
+
+class InMemoryCollection(InMemoryQuery):
+    def __init__(self, store: "InMemoryFirestore", path: tuple):
+        super().__init__(store, path)
+        self.id = path[-1]
+    
+    def document(self, document_id: Optional[str] = None) -> InMemoryDocument:
+        return InMemoryDocument(self._store, self._path + (document_id or self._store.auto_id(),))
+    
+    def add(self, data: Dict):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+    
+    def list_documents(self) -> List[InMemoryDocument]:
+        return [InMemoryDocument(self._store, path) for path, _ in self._store.documents_in(self._path)]
+    
+    def on_snapshot(self, callback) -> "InMemoryWatch":
+        return self._store.watch(self._path, callback)
+
+
+class InMemoryWatch:
+    """
+    Collection listener: the first snapshot lists every document as ADDED,
+    later ones carry the changes of each commit. Callbacks run on the
+    watch's own thread, in commit order, like Firestore's listener thread.
+    """
+    
+    def __init__(self, store: "InMemoryFirestore", collection_path: tuple, callback):
+        self._store = store
+        self.collection_path = collection_path
+        self._callback = callback
+        self._queue = queue.Queue()
+        self.is_active = True
+        self._thread = threading.Thread(target=self._deliver, name="in-memory-watch", daemon=True)
+        self._thread.start()
+    
+    def notify(self, changes: List[DocumentChange], initial: bool = False):
+        """Queue a delivery (the initial snapshot is delivered even when empty)"""
+        if (changes or initial) and self.is_active:
+            self._queue.put(changes)
+    
+    def unsubscribe(self):
+        self.is_active = False
+        self._store.unwatch(self)
+        self._queue.put(None)
+    
+    def _deliver(self):
+        while True:
+            changes = self._queue.get()
+            if changes is None or not self.is_active:
+                return
+            self._store.simulate("read", documents=len(changes))
+            collection = [self._store.snapshot(path)
+                          for path, _ in self._store.documents_in(self.collection_path)]
+            self._callback(collection, changes, datetime.now(timezone.utc))
+
+
+class InMemoryBatch:
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._writes = []
+    
+    def set(self, ref: InMemoryDocument, data: Dict, merge: bool = False):
+        self._writes.append(("set", ref._path, data, merge, None))
+    
+    def create(self, ref: InMemoryDocument, data: Dict):
+        self._writes.append(("create", ref._path, data, False, None))
+    
+    def update(self, ref: InMemoryDocument, data: Dict, option: Optional[_WriteOption] = None):
+        self._writes.append(("update", ref._path, data, False, option))
+    
+    def delete(self, ref: InMemoryDocument):
+        self._writes.append(("delete", ref._path, None, False, None))
+    
+    def commit(self) -> List[_WriteResult]:
+        return self._store.commit(self._writes)
+
+
+class InMemoryFirestore:
+    """
+    Thread-safe in-memory stand-in for firestore.Client.
+    
+    Covers what the engine uses: documents and subcollections, where /
+    order_by / limit / count queries, collection listeners (on_snapshot),
+    batches (atomic), Increment / ArrayUnion / ArrayRemove / DELETE_FIELD /
+    SERVER_TIMESTAMP, create() conflicts and last_update_time preconditions.
+    
+    Every call sleeps for a simulated network latency, and each document
+    absorbs DOCUMENT_WRITE_BURST writes before writes faster than
+    DOCUMENT_WRITES_PER_SECOND fail with Aborted, like Firestore contention.
+    Operation and contention counts are kept in stats.
+    """
+    
+    def __init__(self, latency: Optional[LatencyModel] = None,
+                 writes_per_document_per_second: float = DOCUMENT_WRITES_PER_SECOND,
+                 write_burst: int = DOCUMENT_WRITE_BURST):
+        self.latency = latency or LatencyModel()
+        self.writes_per_document_per_second = writes_per_document_per_second
+        self.write_burst = write_burst
+        self.stats = {"reads": 0, "documents_read": 0, "writes": 0, "contention_errors": 0}
+        
+        self._documents: Dict[tuple, Dict] = {}
+        self._update_times: Dict[tuple, datetime] = {}
+        self._write_tokens: Dict[tuple, tuple] = {}  # path -> (tokens, refilled_at)
+        self._watches: List[InMemoryWatch] = []
+        self._lock = threading.RLock()
+        self._ids = itertools.count()
+    
+    # ----------------------------------------
+    # Client interface
+    # ----------------------------------------
+    
+    def collection(self, name: str) -> InMemoryCollection:
+        return InMemoryCollection(self, (name,))
+    
+    def batch(self) -> InMemoryBatch:
+        return InMemoryBatch(self)
+    
+    def get_all(self, references):
+        self.simulate("read", documents=len(references))
+        return [self.snapshot(ref._path) for ref in references]
+    
+    def write_option(self, last_update_time=None) -> _WriteOption:
+        return _WriteOption(last_update_time)
+    
+    def watch(self, collection_path: tuple, callback) -> InMemoryWatch:
+        """Register a listener; its first delivery is the collection's current documents"""
+        with self._lock:
+            watch = InMemoryWatch(self, collection_path, callback)
+            watch.notify([DocumentChange(ChangeType.ADDED, self.snapshot(path), -1, i)
+                          for i, (path, _) in enumerate(self.documents_in(collection_path))],
+                         initial=True)
+            self._watches.append(watch)
+        return watch
+    
+    def unwatch(self, watch: InMemoryWatch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+    
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    
+    def auto_id(self) -> str:
+        return f"auto{next(self._ids):012d}"
+    
+    def simulate(self, kind: str, documents: int = 0):
+        with self._lock:
+            if kind == "read":
+                self.stats["reads"] += 1
+                self.stats["documents_read"] += documents
+        delay = self.latency.delay(kind, documents)
+        if delay > 0:
+            time.sleep(delay)
+    
+    def snapshot(self, path: tuple) -> InMemorySnapshot:
+        with self._lock:
+            return InMemorySnapshot(InMemoryDocument(self, path),
+                                    copy.deepcopy(self._documents.get(path)),
+                                    self._update_times.get(path))
+    
+    def documents_in(self, collection_path: tuple):
+        depth = len(collection_path) + 1
+        with self._lock:
+            return [(path, data) for path, data in self._documents.items()
+                    if len(path) == depth and path[:-1] == collection_path]
+    
+    def _take_write_token(self, path: tuple, now: float) -> bool:
+        tokens, refilled_at = self._write_tokens.get(path, (self.write_burst, now))
+        tokens = min(self.write_burst, tokens + (now - refilled_at) * self.writes_per_document_per_second)
+        if tokens < 1:
+            self._write_tokens[path] = (tokens, now)
+            return False
+        self._write_tokens[path] = (tokens - 1, now)
+        return True
+    
+    def commit(self, writes: List[tuple]) -> List[_WriteResult]:
+        """Apply writes atomically (all or none)"""
+        self.simulate("write")
+        now = time.monotonic()
+        
+        with self._lock:
+            for _, path, _, _, _ in writes:
+                if not self._take_write_token(path, now):
+                    self.stats["contention_errors"] += 1
+                    raise Aborted(f"Too much contention on {'/'.join(path)}")
+            
+            staged = {}
+            for kind, path, data, merge, option in writes:
+                current = staged.get(path, self._documents.get(path))
+                if kind == "create" and current is not None:
+                    raise AlreadyExists(f"Document already exists: {'/'.join(path)}")
+                if kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {'/'.join(path)}")
+                    if option is not None and option.last_update_time != self._update_times.get(path):
+                        raise FailedPrecondition(f"Document changed: {'/'.join(path)}")
+                
+                if kind == "delete":
+                    staged[path] = None
+                    continue
+                
+                document = copy.deepcopy(current) if (kind == "update" or merge) and current else {}
+                for key, value in data.items():
+                    if kind == "update":
+                        _apply_value(document, key, value)
+                    elif merge:
+                        _merge_value(document, key, value)
+                    else:
+                        _apply_value(document, key, value, split=False)
+                staged[path] = document
+            
+            update_time = datetime.now(timezone.utc)
+            changes = []
+            for path, document in staged.items():
+                existed = path in self._documents
+                if document is None:
+                    removed = self.snapshot(path)
+                    self._documents.pop(path, None)
+                    self._update_times.pop(path, None)
+                    if existed:
+                        changes.append((path, DocumentChange(ChangeType.REMOVED, removed, -1, -1)))
+                else:
+                    self._documents[path] = document
+                    self._update_times[path] = update_time
+                    change_type = ChangeType.MODIFIED if existed else ChangeType.ADDED
+                    changes.append((path, DocumentChange(change_type, self.snapshot(path), -1, -1)))
+            self.stats["writes"] += len(writes)
+            
+            for watch in self._watches:
+                watch.notify([change for path, change in changes
+                              if path[:-1] == watch.collection_path])
+        
+        return [_WriteResult(update_time) for _ in writes]
+
+
+# ----------------------------------------
+# Async adapter (generate_daily_quiz_async)
+# ----------------------------------------
+
+class _AsyncQuery:
+    def __init__(self, query: InMemoryQuery):
+        self._query = query
+    
+    def where(self, *args):
+        return _AsyncQuery(self._query.where(*args))
+    
+    def order_by(self, *args, **kwargs):
+        return _AsyncQuery(self._query.order_by(*args, **kwargs))
+    
+    def limit(self, count: int):
+        return _AsyncQuery(self._query.limit(count))
+    
+    async def stream(self):
+        snapshots = await asyncio.to_thread(self._query.get)
+        for snapshot in snapshots:
+            yield snapshot
+    
+    def document(self, document_id: Optional[str] = None):
+        return _AsyncDocument(self._query.document(document_id))
+
+
+class _AsyncDocument:
+    def __init__(self, document: InMemoryDocument):
+        self._document = document
+        self.id = document.id
+    
+    def collection(self, name: str):
+        return _AsyncQuery(self._document.collection(name))
+    
+    async def get(self):
+        return await asyncio.to_thread(self._document.get)
+    
+    async def set(self, data: Dict, merge: bool = False):
+        await asyncio.to_thread(self._document.set, data, merge)
+    
+    async def update(self, data: Dict):
+        await asyncio.to_thread(self._document.update, data)
+
+
+class AsyncInMemoryFirestore:
+    """firestore_async-style view of an InMemoryFirestore (same data and stats)"""
+    
+    def __init__(self, store: InMemoryFirestore):
+        self.store = store
+    
+    def collection(self, name: str):
+        return _AsyncQuery(self.store.collection(name))
+
+
+# ============================================================================
+# SYNTHETIC QUESTION BANK
+# ============================================================================
+
+def seed_question_bank(store: InMemoryFirestore, questions_per_topic: int = 40,
+                       rng: Optional[random.Random] = None) -> List[Dict]:
+    """
+    Fill the stand-in with a synthetic bank over every JEE topic.
+    
+    IRT parameters follow the ranges of the real bank (b in [0.4, 2.6],
+    a in [1.0, 2.0], c = 0.25 for MCQ / 0 for numerical).
+    
+    Returns:
+        The question documents written
+    """
+    rng = rng or random.Random(0)
+    questions = []
+    
+    for topic in engine.JEE_TOPIC_WEIGHTS:
+        subject = engine.get_subject_from_topic(topic)
+        for i in range(questions_per_topic):
+            difficulty_b = round(rng.uniform(engine.DIFFICULTY_EASY_MIN, engine.DIFFICULTY_VERY_HARD_MAX), 2)
+            question_type = "numerical" if rng.random() < 0.2 else "mcq_single"
+            questions.append({
+                "question_id": f"LOAD_{topic.upper()}_{i:03d}",
+                "subject": subject.capitalize(),
+                "topic": topic,
+                "chapter": topic,
+                "difficulty": engine.get_difficulty_label(difficulty_b),
+                "question_type": question_type,
+                "time_estimate": rng.choice([60, 90, 120, 150, 180]),
+                "irt_parameters": {
+                    "difficulty_b": difficulty_b,
+                    "discrimination_a": round(rng.uniform(1.0, 2.0), 2),
+                    "guessing_c": 0.25 if question_type == "mcq_single" else 0.0
+                },
+                "active": True,
+                "updated_at": datetime.now(timezone.utc)
+            })
+    
+    for start in range(0, len(questions), 500):
+        batch = store.batch()
+        for question in questions[start:start + 500]:
+            batch.set(store.collection('questions').document(question['question_id']), question)
+        batch.commit()
+    
+    return questions
+
+
+# ============================================================================
+# LOAD DRIVER
+# ============================================================================
+
+@dataclass
+class OperationStats:
+    """Latency samples and failure counts for one engine operation"""
+    latencies: List[float] = field(default_factory=list)
+    retries: int = 0
+    errors: int = 0
+    
+    def summary(self, elapsed_seconds: float) -> Dict:
+        ordered = sorted(self.latencies)
+        
+        def percentile(q):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        
+        return {
+            "count": len(ordered),
+            "throughput_per_second": round(len(ordered) / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else None,
+            "retries": self.retries,
+            "errors": self.errors
+        }
+
+
+class LoadTestRun:
+    """Shared state of one load test: per-operation stats and the retry policy"""
+    
+    def __init__(self):
+        self.operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+    
+    def call(self, operation: str, fn, *args, **kwargs):
+        """
+        Run one engine call, retrying contention-type errors with backoff.
+        
+        Latency covers the whole call including retries, as a client sees it.
+        """
+        started = time.perf_counter()
+        retries = 0
+        
+        while True:
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                break
+            except RETRYABLE_ERRORS:
+                if retries >= MAX_RETRIES:
+                    result, error = None, True
+                    break
+                time.sleep(RETRY_BASE_DELAY_SECONDS * (2 ** retries) * random.uniform(0.5, 1.5))
+                retries += 1
+            except Exception as e:
+                print(f"⚠️ {operation} failed: {e!r}")
+                result, error = None, True
+                break
+        
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = self.operations.setdefault(operation, OperationStats())
+            stats.retries += retries
+            if error:
+                stats.errors += 1
+            else:
+                stats.latencies.append(elapsed)
+        
+        return result
+
+
+def _simulate_student(run: LoadTestRun, student_id: str, questions: List[Dict],
+                      quizzes: int, think_time: float, quiz_generator: str,
+                      assembly_mode: str, assessment_mode: str, answer_ingestion: str,
+                      rng: random.Random, selection_seed: int):
+    """One student: assessment, then quizzes answered from the 3PL model"""
+    ability = rng.gauss(0, 1)
+    true_theta = {topic: engine.bound_theta(rng.gauss(ability, 0.5)) for topic in engine.JEE_TOPIC_WEIGHTS}
+    
+    def answer(question: Dict) -> bool:
+        irt = question['irt_parameters']
+        probability = engine.calculate_probability_3PL(
+            true_theta.get(question['topic'], ability), irt['difficulty_b'],
+            irt['discrimination_a'], irt['guessing_c']
+        )
+        return rng.random() < probability
+    
+    def think():
+        if think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+    
+    if assessment_mode == "adaptive":
+        def adaptive_assessment():
+            assessment = engine.AdaptiveAssessment(student_id)
+            question = assessment.next_question()
+            while question is not None:
+                assessment.record_response(question['question_id'], answer(question),
+                                           int(question.get('time_estimate', 120) * rng.uniform(0.5, 1.5)))
+                question = assessment.next_question()
+            return assessment.finalize()
+        
+        if run.call("adaptive_assessment", adaptive_assessment) is None:
+            return
+    elif assessment_mode == "streaming":
+        for q in rng.sample(questions, ASSESSMENT_LENGTH):
+            think()
+            run.call("record_assessment_answer", engine.record_assessment_answer,
+                     student_id, q['question_id'], answer(q),
+                     int(q.get('time_estimate', 120) * rng.uniform(0.5, 1.5)))
+        if run.call("finalize_streaming_assessment", engine.finalize_streaming_assessment,
+                    student_id, ASSESSMENT_LENGTH) is None:
+            return
+    else:
+        assessment = [
+            {"question_id": q['question_id'], "answer": "A", "is_correct": answer(q),
+             "time_taken": int(q.get('time_estimate', 120) * rng.uniform(0.5, 1.5))}
+            for q in rng.sample(questions, ASSESSMENT_LENGTH)
+        ]
+        if run.call("process_initial_assessment", engine.process_initial_assessment,
+                    student_id, assessment) is None:
+            return
+    
+    for _ in range(quizzes):
+        think()
+        if quiz_generator == "async":
+            quiz = run.call("generate_daily_quiz", lambda: asyncio.run(
+                engine.generate_daily_quiz_async(student_id, assembly_mode=assembly_mode,
+                                                 seed=selection_seed)
+            ))
+        else:
+            quiz = run.call("generate_daily_quiz", engine.generate_daily_quiz,
+                            student_id, assembly_mode=assembly_mode, seed=selection_seed)
+        
+        for question in quiz or []:
+            think()
+            time_taken = int(question.get('time_estimate', 120) * rng.uniform(0.5, 1.5))
+            if answer_ingestion == "queue":
+                # Retries resubmit the same key, as a client would
+                key = str(uuid.UUID(int=rng.getrandbits(128)))
+                run.call("submit_answer", lambda: engine.submit_answer(
+                    student_id, question['question_id'], answer(question), time_taken, key
+                ).result())
+            else:
+                run.call("update_theta_after_response", engine.update_theta_after_response,
+                         student_id, question['question_id'], answer(question), time_taken)
+
+
+# Process-wide engine state a run leaves behind. The thread owners are
+# stopped first, answer queue before the buffers its answers feed; the
+# exposure and item statistics buffers flush as they stop.
+ENGINE_BACKGROUND_SINGLETONS = (
+    "_answer_ingestion_queue", "_item_exposure_tracker", "_item_statistics_aggregator",
+    "_question_bank_cache", "_quiz_fallbacks",
+)
+ENGINE_SINGLETONS = ENGINE_BACKGROUND_SINGLETONS + (
+    "_idempotency_cache", "_question_bank_index", "_topic_covariance_model",
+    "_topic_covariance_loaded_at", "_response_time_model", "_response_time_loaded_at",
+)
+
+
+def stop_engine_threads():
+    """Stop every engine background thread that was started"""
+    for name in ENGINE_BACKGROUND_SINGLETONS:
+        instance = getattr(engine, name)
+        if instance is not None:
+            instance.stop()
+
+
+def reset_engine_state():
+    """Stop the engine's threads, drop its process-wide state and the storage override"""
+    stop_engine_threads()
+    for name in ENGINE_SINGLETONS:
+        setattr(engine, name, None)
+    with engine._streaming_assessments_lock:
+        engine._streaming_assessments.clear()
+    engine.set_firestore_client(None, None)
+
+
+def run_load_test(students: int = 20, quizzes_per_student: int = 2, think_time: float = 0.5,
+                  concurrency: Optional[int] = None, latency: Optional[LatencyModel] = None,
+                  writes_per_document_per_second: float = DOCUMENT_WRITES_PER_SECOND,
+                  questions_per_topic: int = 40, quiz_generator: str = "sync",
+                  assembly_mode: str = "greedy", assessment_mode: str = "fixed",
+                  answer_ingestion: str = "direct", seed: int = 0) -> Dict:
+    """
+    Simulate concurrent students against the engine on the in-memory stand-in.
+    
+    Args:
+        students: Simulated students
+        quizzes_per_student: Daily quizzes each student generates and answers
+        think_time: Mean seconds between a student's actions (exponential)
+        concurrency: Students active at once (default: all)
+        latency: Storage latency model (default: LatencyModel())
+        writes_per_document_per_second: Sustained per-document write rate before contention
+        questions_per_topic: Size of the synthetic bank
+        quiz_generator: "sync" (generate_daily_quiz) or "async" (generate_daily_quiz_async)
+        assembly_mode: "greedy" or "optimal"
+        assessment_mode: "fixed" (process_initial_assessment on a random 30-item
+                         form), "streaming" (the same form answer by answer through
+                         record_assessment_answer) or "adaptive" (AdaptiveAssessment)
+        answer_ingestion: "direct" (update_theta_after_response in the student's
+                          thread) or "queue" (submit_answer with an idempotency key)
+        seed: Seed for students' abilities and answers, and the quiz selection seed
+    
+    Returns:
+        Report: elapsed seconds, per-operation stats, storage stats
+    """
+    store = InMemoryFirestore(latency=latency,
+                              writes_per_document_per_second=writes_per_document_per_second)
+    rng = random.Random(seed)
+    questions = seed_question_bank(store, questions_per_topic, rng)
+    
+    engine.set_firestore_client(store, AsyncInMemoryFirestore(store))
+    run = LoadTestRun()
+    started = time.perf_counter()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency or students) as pool:
+            futures = [
+                pool.submit(_simulate_student, run, f"load_student_{i:05d}", questions,
+                            quizzes_per_student, think_time, quiz_generator, assembly_mode,
+                            assessment_mode, answer_ingestion, random.Random(rng.random()), seed)
+                for i in range(students)
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        elapsed = time.perf_counter() - started
+        run.call("engine_shutdown", reset_engine_state)
+    
+    report = {
+        "students": students,
+        "elapsed_seconds": round(elapsed, 2),
+        "operations": {name: stats.summary(elapsed) for name, stats in run.operations.items()},
+        "storage": dict(store.stats)
+    }
+    print_load_test_report(report)
+    return report
+
+
+def print_load_test_report(report: Dict):
+    print(f"\n📊 Load test: {report['students']} students in {report['elapsed_seconds']}s")
+    print(f"{'operation':<30}{'count':>7}{'ops/s':>8}{'p50':>9}{'p90':>9}{'p99':>9}"
+          f"{'max':>9}{'retries':>9}{'errors':>8}")
+    for name, s in report['operations'].items():
+        print(f"{name:<30}{s['count']:>7}{s['throughput_per_second']:>8}{str(s['p50_ms']):>9}"
+              f"{str(s['p90_ms']):>9}{str(s['p99_ms']):>9}{str(s['max_ms']):>9}"
+              f"{s['retries']:>9}{s['errors']:>8}")
+    storage = report['storage']
+    print(f"storage: {storage['reads']} reads ({storage['documents_read']} documents), "
+          f"{storage['writes']} writes, {storage['contention_errors']} contention errors")
+
+
+# ============================================================================
+# MAIN EXECUTION FLOW
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the IIDP engine with simulated students")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--quizzes", type=int, default=2, help="Quizzes per student")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between actions")
+    parser.add_argument("--concurrency", type=int, default=None, help="Students active at once")
+    parser.add_argument("--read-ms", type=float, default=DEFAULT_READ_LATENCY_MS)
+    parser.add_argument("--write-ms", type=float, default=DEFAULT_WRITE_LATENCY_MS)
+    parser.add_argument("--doc-writes-per-second", type=float, default=DOCUMENT_WRITES_PER_SECOND,
+                        help="Sustained per-document write rate before contention errors")
+    parser.add_argument("--generator", choices=["sync", "async"], default="sync")
+    parser.add_argument("--assembly", choices=["greedy", "optimal"], default="greedy")
+    parser.add_argument("--assessment", choices=["fixed", "streaming", "adaptive"], default="fixed")
+    parser.add_argument("--ingestion", choices=["direct", "queue"], default="direct",
+                        help="Answers applied inline or through the idempotent answer queue")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    run_load_test(
+        students=args.students,
+        quizzes_per_student=args.quizzes,
+        think_time=args.think_time,
+        concurrency=args.concurrency,
+        latency=LatencyModel(read_ms=args.read_ms, write_ms=args.write_ms),
+        writes_per_document_per_second=args.doc_writes_per_second,
+        quiz_generator=args.generator,
+        assembly_mode=args.assembly,
+        assessment_mode=args.assessment,
+        answer_ingestion=args.ingestion,
+        seed=args.seed
+    )
@@ -0,0 +1,57 @@
+# Shared fixtures for the engine tests
+# Every test runs against the load test's in-memory Firestore stand-in with
+# no simulated latency, and starts from fresh process-wide engine state.
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import iidp_implementation_v4_CALIBRATED as engine
+from iidp_load_test import (ENGINE_SINGLETONS, AsyncInMemoryFirestore, InMemoryFirestore, LatencyModel,
+                            seed_question_bank, stop_engine_threads)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Zero-latency, unthrottled stand-in routed to by every engine call"""
+    store = InMemoryFirestore(latency=LatencyModel(read_ms=0, write_ms=0),
+                              writes_per_document_per_second=1e9, write_burst=10 ** 9)
+    for name in ENGINE_SINGLETONS:
+        monkeypatch.setattr(engine, name, None)
+    monkeypatch.setattr(engine, "_streaming_assessments", {})
+    engine.set_firestore_client(store, AsyncInMemoryFirestore(store))
+    yield store
+    stop_engine_threads()
+    engine.set_firestore_client(None, None)
+
+
+@pytest.fixture
+def question_bank(store):
+    """Synthetic bank over every JEE topic (question documents)"""
+    return seed_question_bank(store, questions_per_topic=12, rng=random.Random(0))
+
+
+def make_student(store, student_id: str, topics, completed_quiz_count: int = 20) -> dict:
+    """Write a post-assessment profile with a theta for each topic"""
+    rng = random.Random(student_id)
+    profile = {
+        "student_id": student_id,
+        "theta_by_topic": {
+            topic: {"theta": rng.uniform(-1, 2), "percentile": 50.0, "confidence_SE": 0.4,
+                    "attempts": 3, "accuracy": 0.5, "last_updated": None}
+            for topic in topics
+        },
+        "overall_theta": 0.5,
+        "assessment_completed_at": (datetime.utcnow() - timedelta(days=10)).isoformat(),
+        "completed_quiz_count": completed_quiz_count,
+        "topic_attempt_counts": {topic: 3 for topic in topics},
+        "total_questions_solved": 3 * len(topics),
+        "subject_balance": {"physics": 0.33, "chemistry": 0.33, "mathematics": 0.34}
+    }
+    store.collection('students').document(student_id).set(profile)
+    return profile
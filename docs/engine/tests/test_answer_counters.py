@@ -0,0 +1,21 @@
+# Answer counters: carried on the per-answer profile write
+
+import iidp_implementation_v4_CALIBRATED as engine
+from conftest import make_student
+
+
+def test_answer_counters_ride_the_per_answer_write(store, question_bank):
+    topic = question_bank[0]['topic']
+    questions = [q for q in question_bank if q['topic'] == topic][:5]
+    profile = make_student(store, "s1", [topic])
+    
+    writes_before = store.stats["writes"]
+    for i, question in enumerate(questions):
+        engine.update_theta_after_response("s1", question['question_id'], i % 2 == 0, 90,
+                                           idempotency_key=f"answer-{i}")
+    
+    # One profile update and one response create per answer, nothing buffered
+    assert store.stats["writes"] - writes_before == 2 * len(questions)
+    updated = store.collection('students').document("s1").get().to_dict()
+    assert updated['topic_attempt_counts'][topic] == profile['topic_attempt_counts'][topic] + len(questions)
+    assert updated['total_questions_solved'] == profile['total_questions_solved'] + len(questions)
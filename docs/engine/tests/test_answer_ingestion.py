@@ -0,0 +1,40 @@
+# Answer ingestion: idempotent theta updates
+
+import iidp_implementation_v4_CALIBRATED as engine
+from conftest import make_student
+
+
+def _responses(store, student_id):
+    return [r.to_dict() for r in
+            store.collection('student_responses').document(student_id).collection('responses').stream()]
+
+
+def test_duplicate_idempotency_key_applies_once(store, question_bank):
+    question = question_bank[0]
+    make_student(store, "s1", [question['topic']])
+    
+    theta = engine.update_theta_after_response("s1", question['question_id'], True, 90,
+                                               idempotency_key="answer-1")
+    retried = engine.update_theta_after_response("s1", question['question_id'], True, 90,
+                                                 idempotency_key="answer-1")
+    
+    assert retried == theta
+    assert len(_responses(store, "s1")) == 1
+    profile = store.collection('students').document("s1").get().to_dict()
+    assert profile['theta_by_topic'][question['topic']]['attempts'] == 4
+
+
+def test_duplicate_from_another_process_is_caught_by_the_store(store, question_bank):
+    question = question_bank[0]
+    make_student(store, "s1", [question['topic']])
+    
+    theta = engine.update_theta_after_response("s1", question['question_id'], False, 90,
+                                               idempotency_key="answer-1")
+    engine._idempotency_cache = None  # A different worker: nothing cached in memory
+    retried = engine.update_theta_after_response("s1", question['question_id'], False, 90,
+                                                 idempotency_key="answer-1")
+    
+    assert retried == theta
+    profile = store.collection('students').document("s1").get().to_dict()
+    assert profile['theta_by_topic'][question['topic']]['attempts'] == 4
+    assert profile['total_questions_solved'] == 3 + 1
@@ -0,0 +1,140 @@
+# Batch runner lease tables: claims, expiry takeover, checkpoints and retries
+
+import threading
+
+import pytest
+
+import iidp_batch_runner as runner
+from conftest import make_student
+
+STUDENTS = [f"student_{i:03d}" for i in range(12)]
+
+
+@pytest.fixture(params=["sqlite", "firestore"])
+def lease_table(request, tmp_path):
+    if request.param == "sqlite":
+        return runner.SQLiteLeaseTable(str(tmp_path / "leases.sqlite"))
+    return runner.FirestoreLeaseTable(request.getfixturevalue("store"))
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Register a toy job that records the students it ran over"""
+    seen = []
+    
+    def run_chunk(job_id, student_ids):
+        seen.extend(student_ids)
+        return {"students": len(student_ids)}
+    
+    monkeypatch.setitem(runner.BATCH_JOBS, "toy", runner.BatchJob("toy", run_chunk))
+    return seen
+
+
+def _plan(lease_table, shards: int = 3) -> str:
+    return runner.plan_batch_job(lease_table, "toy", job_id="toy_job", student_ids=STUDENTS, shards=shards)
+
+
+def test_job_is_planned_once(lease_table, processed):
+    _plan(lease_table)
+    
+    assert not lease_table.create_job("toy_job", "toy", [["other"]])
+    assert lease_table.progress("toy_job")["shards"] == 3
+
+
+def test_live_leases_are_not_claimed_twice(lease_table, processed):
+    job_id = _plan(lease_table)
+    
+    first = lease_table.claim(job_id, "node-a", lease_seconds=60)
+    second = lease_table.claim(job_id, "node-b", lease_seconds=60)
+    third = lease_table.claim(job_id, "node-c", lease_seconds=60)
+    
+    assert sorted([first.shard, second.shard, third.shard]) == [0, 1, 2]
+    assert lease_table.claim(job_id, "node-d", lease_seconds=60) is None
+
+
+def test_concurrent_claims_take_each_shard_once(lease_table, processed):
+    job_id = _plan(lease_table, shards=6)
+    claims = []
+    
+    def claim_all(owner):
+        while True:
+            lease = lease_table.claim(job_id, owner, lease_seconds=60)
+            if lease is None:
+                return
+            claims.append((lease.shard, owner))
+    
+    threads = [threading.Thread(target=claim_all, args=(f"node-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(shard for shard, _ in claims) == list(range(6))
+
+
+def test_expired_lease_is_taken_over_from_its_checkpoint(lease_table, processed):
+    job_id = _plan(lease_table, shards=1)
+    crashed = lease_table.claim(job_id, "node-a", lease_seconds=60)
+    crashed.position = 5
+    assert lease_table.checkpoint(crashed, "node-a", lease_seconds=-1)  # Then node-a dies
+    
+    takeover = lease_table.claim(job_id, "node-b", lease_seconds=60)
+    
+    assert takeover.shard == crashed.shard
+    assert takeover.position == 5
+    # The old owner finds out at its next checkpoint and stops
+    assert not lease_table.checkpoint(crashed, "node-a", lease_seconds=60)
+    assert not lease_table.complete(crashed, "node-a")
+    assert lease_table.complete(takeover, "node-b")
+    assert lease_table.progress(job_id)["done"] == 1
+
+
+def test_runner_resumes_and_finishes_abandoned_shard(lease_table, processed):
+    job_id = _plan(lease_table, shards=2)
+    crashed = lease_table.claim(job_id, "node-a", lease_seconds=60)
+    crashed.position = 2
+    lease_table.checkpoint(crashed, "node-a", lease_seconds=-1)
+    
+    progress = runner.BatchRunner(lease_table, job_id, workers=1, chunk_size=2,
+                                  owner="node-b", initializer=None).run(wait_for_stragglers=False)
+    
+    assert progress["done"] == 2
+    assert progress["students_processed"] == len(STUDENTS)
+    assert sorted(processed) == sorted(set(STUDENTS) - set(crashed.student_ids[:2]))
+
+
+def test_released_shard_fails_after_max_attempts(lease_table, processed):
+    job_id = _plan(lease_table, shards=1)
+    
+    for _ in range(runner.BATCH_MAX_ATTEMPTS):
+        lease = lease_table.claim(job_id, "node-a", lease_seconds=60)
+        assert lease is not None
+        assert lease_table.release(lease, "node-a", "boom")
+    
+    assert lease_table.claim(job_id, "node-a", lease_seconds=60) is None
+    assert lease_table.progress(job_id)["failed"] == 1
+
+
+def test_theta_replay_reads_item_parameters_once_per_job(store, question_bank, monkeypatch, tmp_path):
+    question = question_bank[0]
+    students = [f"student_{i}" for i in range(5)]
+    for student_id in students:
+        make_student(store, student_id, [question["topic"]])
+        store.collection('student_responses').document(student_id).collection('responses').document('r0').set({
+            "question_id": question["question_id"], "topic": question["topic"], "is_correct": True,
+            "theta_before": 0.0, "confidence_SE_before": 0.4, "answered_at": "2026-10-01T00:00:00"
+        })
+    loads = []
+    load_item_parameters = runner.engine.load_item_parameters
+    monkeypatch.setattr(runner.engine, "load_item_parameters", lambda: loads.append(1) or load_item_parameters())
+    monkeypatch.setattr(runner, "_replay_item_parameters", {})
+    lease_table = runner.SQLiteLeaseTable(str(tmp_path / "leases.sqlite"))
+    job_id = runner.plan_batch_job(lease_table, "theta_replay", job_id="replay_job", student_ids=students, shards=2)
+    
+    progress = runner.BatchRunner(lease_table, job_id, workers=1, chunk_size=2,
+                                  initializer=None).run(wait_for_stragglers=False)
+    
+    assert progress["done"] == 2
+    assert len(loads) == 1
+    for student_id in students:
+        assert store.collection('students').document(student_id).get().to_dict().get('theta_recomputed_at')
@@ -0,0 +1,52 @@
+# Curve-table lookups against the closed-form 3PL curves
+
+import numpy as np
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+def _random_index(count: int, seed: int = 0) -> engine.QuestionBankIndex:
+    rng = np.random.default_rng(seed)
+    documents = [{
+        "question_id": f"q{i:05d}",
+        "topic": "physics_kinematics",
+        "irt_parameters": {"difficulty_b": float(rng.uniform(-2.5, 3.0)),
+                           "discrimination_a": float(rng.uniform(0.3, 3.0)),
+                           "guessing_c": float(rng.uniform(0.0, 0.35))}
+    } for i in range(count)]
+    return engine.QuestionBankIndex.from_documents(documents)
+
+
+def _exact_information(index, theta):
+    return engine.calculate_fisher_information_array(
+        theta, index.difficulty_b, index.discrimination_a, index.guessing_c)
+
+
+def test_information_lookup_within_stated_tolerance():
+    index = _random_index(2000)
+    rows = np.arange(len(index))
+    peak = index.curve_tables()[0].max(axis=1)
+    
+    worst = 0.0
+    for theta in np.random.default_rng(1).uniform(engine.THETA_MIN, engine.THETA_MAX, 300):
+        error = np.abs(index.fisher_information(rows, theta) - _exact_information(index, theta))
+        worst = max(worst, float((error / peak).max()))
+    
+    assert worst < engine.INFORMATION_INTERPOLATION_TOLERANCE
+
+
+def test_information_lookup_exact_on_grid_points():
+    index = _random_index(200)
+    rows = np.arange(len(index))
+    
+    for theta in engine.THETA_GRID[::7]:
+        np.testing.assert_allclose(index.fisher_information(rows, theta),
+                                   _exact_information(index, theta), rtol=1e-9, atol=1e-12)
+
+
+def test_information_lookup_clamps_outside_grid():
+    index = _random_index(50)
+    rows = np.arange(len(index))
+    
+    np.testing.assert_allclose(index.fisher_information(rows, engine.THETA_MAX + 1.0),
+                               index.fisher_information(rows, engine.THETA_MAX))
@@ -0,0 +1,67 @@
+# Item exposure counters: sharded flushes, restore on failure, summed report
+
+import random
+
+import pytest
+from google.api_core.exceptions import DeadlineExceeded
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+@pytest.fixture
+def tracker(store, question_bank):
+    tracker = engine.ItemExposureTracker(flush_interval=3600, num_shards=4, num_buckets=3)
+    yield tracker
+    tracker.stop()
+
+
+def _select(tracker, question_bank, selections: int, rng: random.Random):
+    """Record selections over one topic's questions; returns administered counts"""
+    topic = question_bank[0]["topic"]
+    question_ids = [q["question_id"] for q in question_bank if q["topic"] == topic]
+    administered = {}
+    for _ in range(selections):
+        offered = rng.sample(question_ids, 3)
+        tracker.record_selection(topic, offered, offered[-1])
+        administered[offered[-1]] = administered.get(offered[-1], 0) + 1
+    return administered
+
+
+def test_flushes_spread_over_shards_and_the_report_sums_them(store, question_bank, tracker):
+    rng = random.Random(0)
+    administered = {}
+    for _ in range(20):
+        for question_id, count in _select(tracker, question_bank, 5, rng).items():
+            administered[question_id] = administered.get(question_id, 0) + count
+        tracker.flush()
+    
+    shard_ids = {doc.id for doc in store.collection('item_exposure_shards').list_documents()}
+    report = engine.get_item_exposure_report()
+    
+    assert len(shard_ids) > 3  # More than one shard per bucket was written
+    assert all(int(bucket) < 3 and int(shard) < 4 for bucket, shard in (s.split("-") for s in shard_ids))
+    assert {q: r["administered"] for q, r in report.items() if r["administered"]} == administered
+    assert sum(r["offered"] for r in report.values()) == 100 * 3
+    assert all(r["exposure_rate"] == r["administered"] / 100 for r in report.values())
+
+
+def test_failed_flush_puts_counts_back_for_the_next_one(store, question_bank, tracker, monkeypatch):
+    administered = _select(tracker, question_bank, 10, random.Random(1))
+    
+    def unavailable(writes):
+        raise DeadlineExceeded("flush lost")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "commit", unavailable)
+        with pytest.raises(DeadlineExceeded):
+            tracker.flush()
+    assert not list(store.collection('item_exposure_shards').list_documents())
+    
+    more = _select(tracker, question_bank, 5, random.Random(2))
+    tracker.flush()
+    
+    report = engine.get_item_exposure_report()
+    for question_id, count in more.items():
+        administered[question_id] = administered.get(question_id, 0) + count
+    assert {q: r["administered"] for q, r in report.items() if r["administered"]} == administered
+    assert sum(r["offered"] for r in report.values()) == 15 * 3
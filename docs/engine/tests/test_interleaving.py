@@ -0,0 +1,66 @@
+# Quiz ordering constraints (interleave_questions_by_topic)
+
+import random
+from collections import Counter
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+def _questions(topic_sizes, seed: int = 0):
+    rng = random.Random(seed)
+    return [{"question_id": f"{topic}_{i}", "topic": topic,
+             "subject": engine.get_subject_from_topic(topic),
+             "irt_parameters": {"difficulty_b": round(rng.uniform(-1, 2), 2)}}
+            for topic, size in topic_sizes.items() for i in range(size)]
+
+
+def _adjacent_same_topic(ordered):
+    return sum(a['topic'] == b['topic'] for a, b in zip(ordered, ordered[1:]))
+
+
+TOPICS = sorted(engine.JEE_TOPIC_WEIGHTS)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_no_adjacent_topic_when_feasible(seed):
+    rng = random.Random(seed)
+    sizes = {topic: rng.randint(1, 4) for topic in rng.sample(TOPICS, rng.randint(2, 6))}
+    largest = max(sizes.values())
+    total = sum(sizes.values())
+    if largest > (total + 1) // 2:
+        sizes[max(sizes, key=sizes.get)] = total - largest + 1
+    questions = _questions(sizes, seed)
+    
+    ordered = engine.interleave_questions_by_topic(questions, rng=random.Random(seed),
+                                                   subject_spacing=True, difficulty_ramp=True)
+    
+    assert Counter(q['question_id'] for q in ordered) == Counter(q['question_id'] for q in questions)
+    assert _adjacent_same_topic(ordered) == 0
+
+
+def test_infeasible_mix_keeps_only_the_surplus_adjacent():
+    questions = _questions({TOPICS[0]: 6, TOPICS[1]: 2})
+    
+    ordered = engine.interleave_questions_by_topic(questions)
+    
+    # 6 of 8 from one topic: at best 3 adjacent pairs remain
+    assert _adjacent_same_topic(ordered) == 6 - (2 + 1)
+
+
+def test_difficulty_ramp_orders_each_topic_easiest_first():
+    questions = _questions({TOPICS[0]: 4, TOPICS[1]: 4, TOPICS[2]: 3})
+    
+    ordered = engine.interleave_questions_by_topic(questions, difficulty_ramp=True)
+    
+    for topic in TOPICS[:3]:
+        difficulties = [q['irt_parameters']['difficulty_b'] for q in ordered if q['topic'] == topic]
+        assert difficulties == sorted(difficulties)
+
+
+def test_without_rng_order_is_deterministic():
+    questions = _questions({TOPICS[0]: 3, TOPICS[1]: 3, TOPICS[2]: 2})
+    
+    assert engine.interleave_questions_by_topic(questions) == \
+        engine.interleave_questions_by_topic(list(questions))
@@ -0,0 +1,50 @@
+# Item statistics and drift: nightly flagging, pending entries left alone
+
+import random
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+@pytest.fixture
+def statistics(store):
+    """q_drifted: always answered correctly at P = 0.3; q_fit: answered as calibrated"""
+    aggregator = engine.ItemStatisticsAggregator(flush_interval=3600)
+    rng = random.Random(0)
+    for _ in range(2000):
+        theta = rng.uniform(-3, 3)
+        aggregator.record("q_drifted", theta, 0.3, True, (1.0, 0.0, 0.0))
+        aggregator.record("q_fit", theta, 0.5, rng.random() < 0.5, (1.0, 0.0, 0.0))
+    aggregator.stop()  # Flushes
+    return aggregator
+
+
+def _queue_entry(store, question_id: str):
+    return store.collection('item_recalibration_queue').document(question_id).get().to_dict()
+
+
+def test_flushing_statistics_queues_nothing(store, statistics):
+    assert not list(store.collection('item_recalibration_queue').stream())
+
+
+def test_nightly_check_flags_only_the_drifted_item(store, statistics):
+    queued = engine.run_nightly_item_drift_check()
+    
+    assert list(queued) == ["q_drifted"]
+    assert queued["q_drifted"]["z"] > 0  # Plays easier than calibrated
+    entry = _queue_entry(store, "q_drifted")
+    assert (entry["status"], entry["source"]) == ("pending", "nightly")
+    assert _queue_entry(store, "q_fit") is None
+
+
+def test_pending_entry_is_not_requeued(store, statistics):
+    engine.run_nightly_item_drift_check()
+    flagged = _queue_entry(store, "q_drifted")
+    
+    assert engine.run_nightly_item_drift_check() == {}
+    assert _queue_entry(store, "q_drifted") == flagged
+    
+    store.collection('item_recalibration_queue').document("q_drifted").update({"status": "done"})
+    assert list(engine.run_nightly_item_drift_check()) == ["q_drifted"]
+    assert _queue_entry(store, "q_drifted")["status"] == "pending"
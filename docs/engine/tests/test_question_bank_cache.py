@@ -0,0 +1,65 @@
+# Question bank cache: polled changes applied in place, gaps trigger a rescan
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+@pytest.fixture
+def cache(store, question_bank):
+    cache = engine.QuestionBankCache(mode="poll")
+    cache.full_rescan()
+    return cache
+
+
+def _edit(store, question_id: str, minutes: int, **fields):
+    """Update a question as an upload script would, stamping updated_at"""
+    ref = store.collection('questions').document(question_id)
+    ref.update({**fields, "updated_at": datetime.now(timezone.utc) + timedelta(minutes=minutes)})
+    return ref.get().to_dict()
+
+
+def test_poll_applies_moves_and_archives_in_place(store, question_bank, cache):
+    moved, archived = question_bank[0], question_bank[1]
+    new_topic = next(q["topic"] for q in question_bank if q["topic"] != moved["topic"])
+    
+    _edit(store, moved["question_id"], 1, topic=new_topic, **{"irt_parameters.difficulty_b": 0.5})
+    _edit(store, archived["question_id"], 2, active=False)
+    
+    assert cache.poll() == 2
+    assert cache.full_rescans == 1  # Only the initial load
+    assert (0.5, moved["question_id"]) in cache.topic_keys[new_topic]
+    assert moved["question_id"] not in {qid for _, qid in cache.topic_keys[moved["topic"]]}
+    assert archived["question_id"] in cache.archived_ids
+    assert archived["question_id"] not in cache.records
+    
+    index = cache.index()
+    assert index.topics[index.row_of(moved["question_id"])] == new_topic
+    assert index.row_of(archived["question_id"]) is None
+    assert cache.poll() == 0  # Watermark moved past both edits
+
+
+def test_hard_delete_is_found_by_the_count_check(store, question_bank, cache):
+    deleted = question_bank[0]["question_id"]
+    store.collection('questions').document(deleted).delete()
+    
+    assert cache.poll() == 0  # Invisible to the watermark
+    assert not cache.reconcile_count()
+    
+    assert cache.full_rescans == 2
+    assert deleted not in cache.records
+    assert cache.reconcile_count()
+
+
+def test_poll_too_far_behind_rescans(store, question_bank, cache, monkeypatch):
+    monkeypatch.setattr(engine, "CHANGE_FEED_POLL_LIMIT", 3)
+    for i, question in enumerate(question_bank[:5]):
+        _edit(store, question["question_id"], i + 1, time_estimate=100)
+    
+    assert cache.poll() == -1
+    
+    assert cache.full_rescans == 2
+    assert all(cache.records[q["question_id"]]["time_estimate"] == 100 for q in question_bank[:5])
+    assert cache.poll() == 0
@@ -0,0 +1,80 @@
+# Columnar question bank export: verified cold start, rejection of bad files
+
+import os
+
+import numpy as np
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    sink = engine.InMemorySink()
+    monkeypatch.setattr(engine.instrument, "sink", sink)
+    return sink
+
+
+@pytest.fixture
+def export_path(store, question_bank, tmp_path):
+    path = str(tmp_path / "question_bank_export.npz")
+    engine.export_question_bank(path)
+    return path
+
+
+def _rewrite(export_path: str, drop=(), **changes):
+    """Replace or drop columns in an export, keeping its original manifest and checksums"""
+    _, columns = engine.read_question_bank_export(export_path)
+    columns.update(changes)
+    for column in drop:
+        del columns[column]
+    with np.load(export_path, allow_pickle=False) as data:
+        manifest = data["manifest"]
+    np.savez(export_path, manifest=manifest, **columns)
+
+
+def test_default_export_path_does_not_depend_on_the_working_directory():
+    if "IIDP_QUESTION_BANK_EXPORT_PATH" not in os.environ:
+        assert os.path.dirname(engine.QUESTION_BANK_EXPORT_PATH) == os.path.dirname(engine.__file__)
+    assert os.path.isabs(engine.QUESTION_BANK_EXPORT_PATH)
+
+
+def test_cache_cold_starts_from_the_export(store, question_bank, export_path, sink):
+    cache = engine.QuestionBankCache(mode="poll")
+    cache.start(export_path)
+    cache.stop()
+    
+    assert cache.full_rescans == 0
+    assert set(cache.records) == {q["question_id"] for q in question_bank}
+    assert any(name == "question_bank.started" and export_path in message
+               for name, message, _, _ in sink.events)
+
+
+def test_tampered_column_is_rejected(export_path):
+    _, columns = engine.read_question_bank_export(export_path)
+    _rewrite(export_path, difficulty_b=columns["difficulty_b"] + 0.1)
+    
+    with pytest.raises(ValueError, match="Checksum mismatch in column difficulty_b"):
+        engine.verify_question_bank_export(export_path)
+
+
+def test_missing_column_is_rejected(export_path):
+    _rewrite(export_path, drop=("guessing_c",))
+    
+    with pytest.raises(ValueError, match="missing column guessing_c"):
+        engine.verify_question_bank_export(export_path)
+
+
+def test_rejected_export_falls_back_to_firestore(store, question_bank, export_path, sink):
+    _, columns = engine.read_question_bank_export(export_path)
+    _rewrite(export_path, question_ids=columns["question_ids"][::-1].copy())
+    
+    cache = engine.QuestionBankCache(mode="poll")
+    cache.start(export_path)
+    cache.stop()
+    
+    assert cache.full_rescans == 1
+    assert set(cache.records) == {q["question_id"] for q in question_bank}
+    assert "question_bank.export_rejected" in sink.event_names()
+    assert any(name == "question_bank.started" and "rejected" in message
+               for name, message, _, _ in sink.events)
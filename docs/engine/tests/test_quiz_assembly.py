@@ -0,0 +1,91 @@
+# Joint quiz assembly: every QuizBlueprint constraint holds on the result
+
+import random
+from collections import Counter
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+TOPICS = [
+    "physics_mechanics_kinematics", "physics_current_electricity", "chemistry_physical_kinetics",
+    "chemistry_organic_reactions", "mathematics_calculus_integrals", "mathematics_algebra_complex",
+]
+
+
+@pytest.fixture
+def index(question_bank):
+    return engine.get_question_bank_index()
+
+
+def _blueprint(target_theta: float = 1.0, **constraints) -> engine.QuizBlueprint:
+    return engine.QuizBlueprint(
+        topic_targets={topic: target_theta for topic in TOPICS},
+        topic_counts=constraints.pop("topic_counts", {topic: (1, 2) for topic in TOPICS}),
+        length=10,
+        **constraints
+    )
+
+
+def _assemble(index, blueprint, recent_questions=()):
+    return engine.assemble_optimal_quiz(blueprint, recent_questions, index=index,
+                                        rng=random.Random(0), exposure_control=None)
+
+
+def test_topic_counts_stay_within_their_bounds(index):
+    topic_counts = {topic: (1, 2) for topic in TOPICS}
+    topic_counts[TOPICS[0]] = (3, 3)
+    
+    quiz = _assemble(index, _blueprint(topic_counts=topic_counts))
+    
+    counts = Counter(question["topic"] for question in quiz)
+    assert len(quiz) == 10
+    for topic, (low, high) in topic_counts.items():
+        assert low <= counts[topic] <= high
+
+
+def test_subject_counts_are_respected(index):
+    quiz = _assemble(index, _blueprint(subject_counts={"mathematics": (0, 2), "physics": (4, 10)}))
+    
+    subjects = Counter(engine.get_subject_from_topic(question["topic"]) for question in quiz)
+    assert subjects["mathematics"] <= 2
+    assert subjects["physics"] >= 4
+
+
+def test_difficulty_mix_is_repaired(index):
+    unconstrained = _assemble(index, _blueprint(target_theta=2.0))
+    assert Counter(q["difficulty"] for q in unconstrained)["hard"] > 2
+    
+    quiz = _assemble(index, _blueprint(target_theta=2.0, difficulty_mix={"hard": (0, 2), "easy": (1, 10)}))
+    
+    difficulties = Counter(question["difficulty"] for question in quiz)
+    assert difficulties["hard"] <= 2
+    assert difficulties["easy"] >= 1
+
+
+def test_time_budget_is_repaired(index):
+    unconstrained = _assemble(index, _blueprint())
+    budget = sum(question["time_estimate"] for question in unconstrained) - 200
+    
+    quiz = _assemble(index, _blueprint(time_budget_seconds=budget))
+    
+    assert len(quiz) == 10
+    assert sum(question["time_estimate"] for question in quiz) <= budget
+
+
+def test_recent_questions_are_not_repeated(index, question_bank):
+    first = _assemble(index, _blueprint())
+    recent = {question["question_id"] for question in first}
+    
+    quiz = _assemble(index, _blueprint(), recent_questions=recent)
+    
+    assert len(quiz) == 10
+    assert not recent & {question["question_id"] for question in quiz}
+
+
+def test_adjacent_questions_never_share_a_topic(index):
+    for seed in range(20):
+        quiz = engine.assemble_optimal_quiz(_blueprint(), (), index=index, rng=random.Random(seed),
+                                            exposure_control="randomesque")
+        topics = [question["topic"] for question in quiz]
+        assert all(a != b for a, b in zip(topics, topics[1:]))
@@ -0,0 +1,71 @@
+# Deadline-aware quiz generation: degradation paths and I/O-free fallbacks
+
+import time
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+from conftest import make_student
+from iidp_load_test import LatencyModel
+
+
+@pytest.fixture
+def fallbacks(store, question_bank):
+    fallbacks = engine.prepare_quiz_fallbacks()
+    yield fallbacks
+    fallbacks.stop()
+
+
+def test_fast_store_is_not_degraded(store, question_bank, fallbacks):
+    make_student(store, "s1", sorted({q['topic'] for q in question_bank})[:20])
+    ctx = engine.QuizGenerationContext("s1")
+    
+    quiz = engine.generate_daily_quiz("s1", ctx=ctx, deadline_seconds=5.0)
+    
+    assert quiz
+    assert ctx.degradations == []
+
+
+def test_slow_profile_read_serves_cached_quiz_within_deadline(store, question_bank, fallbacks):
+    make_student(store, "s1", sorted({q['topic'] for q in question_bank})[:20])
+    store.latency = LatencyModel(read_ms=800, write_ms=0, sigma=0)
+    ctx = engine.QuizGenerationContext("s1")
+    
+    started = time.monotonic()
+    quiz = engine.generate_daily_quiz("s1", ctx=ctx, deadline_seconds=0.3)
+    elapsed = time.monotonic() - started
+    
+    assert ctx.degradations == ["cached_quiz"]
+    assert elapsed < 0.6
+    assert quiz == engine.cached_quiz("s1")
+    assert len(quiz) == engine.QUIZ_LENGTH
+
+
+def test_fallbacks_make_no_storage_calls(store, question_bank, fallbacks):
+    index, _ = fallbacks.state()
+    topics = sorted(index.topic_offsets)[:3]
+    reads, writes = store.stats["reads"], store.stats["writes"]
+    
+    quiz = engine.cached_quiz("s1")
+    filled = engine.complete_slots_from_index([(topic, 0.5, 0.0) for topic in topics], [], set())
+    
+    assert quiz and len(filled) == 3 and all(filled)
+    assert (store.stats["reads"], store.stats["writes"]) == (reads, writes)
+
+
+def test_unprepared_fallbacks_degrade_to_empty(store, question_bank):
+    assert engine.cached_quiz("s1") == []
+    assert engine.complete_slots_from_index([("physics_kinematics", 0.5, 0.0)], [], set()) == []
+
+
+def test_abandoned_stage_leaves_context_untouched(store, question_bank, fallbacks):
+    make_student(store, "s1", sorted({q['topic'] for q in question_bank})[:20])
+    store.latency = LatencyModel(read_ms=300, write_ms=0, sigma=0)
+    ctx = engine.QuizGenerationContext("s1")
+    
+    engine.generate_daily_quiz("s1", ctx=ctx, deadline_seconds=0.2)
+    reads = ctx.reads
+    time.sleep(0.5)  # Let the overrunning read finish in the background
+    
+    assert ctx.degradations
+    assert ctx.reads == reads
@@ -0,0 +1,64 @@
+# Recency day buckets: window membership, expiry on answer, legacy log fallback
+
+from datetime import datetime, timedelta
+
+import iidp_implementation_v4_CALIBRATED as engine
+from conftest import make_student
+
+NOW = datetime(2026, 3, 31, 12, 0)
+
+
+def _day(days_ago: int) -> str:
+    return engine.recent_question_day_key(NOW - timedelta(days=days_ago))
+
+
+def test_only_buckets_inside_the_window_count():
+    buckets = {_day(0): ["q_today"], _day(29): ["q_old"], _day(31): ["q_expired"]}
+    
+    recent = engine.RecentQuestionSet.from_day_buckets(buckets, days=30, now=NOW)
+    
+    assert "q_today" in recent and "q_old" in recent
+    assert "q_expired" not in recent
+    assert engine.expired_recent_question_days(buckets, days=30, now=NOW) == [_day(31)]
+
+
+def test_answer_adds_todays_bucket_and_deletes_expired_ones(store, question_bank):
+    question = question_bank[0]
+    make_student(store, "student_1", [question["topic"]])
+    now = datetime.utcnow()
+    expired_key = engine.recent_question_day_key(now - timedelta(days=engine.RECENT_QUESTIONS_WINDOW_DAYS + 2))
+    kept_key = engine.recent_question_day_key(now - timedelta(days=3))
+    store.collection('students').document("student_1").update({
+        "recent_questions_by_day": {expired_key: ["q_expired"], kept_key: ["q_kept"]}
+    })
+    
+    engine.update_theta_after_response("student_1", question["question_id"], True, 90)
+    
+    student_data = store.collection('students').document("student_1").get().to_dict()
+    buckets = student_data["recent_questions_by_day"]
+    assert expired_key not in buckets
+    assert buckets[kept_key] == ["q_kept"]
+    assert buckets[engine.recent_question_day_key(now)] == [question["question_id"]]
+    assert set(engine.get_recent_question_set("student_1", student_data)) == {"q_kept", question["question_id"]}
+
+
+def test_legacy_profile_reads_the_log_until_buckets_cover_the_window(store, question_bank):
+    question = question_bank[0]
+    make_student(store, "student_1", [question["topic"]])
+    old_answer = (datetime.utcnow() - timedelta(days=2)).isoformat()
+    store.collection('student_responses').document("student_1").collection('responses').document('r0').set({
+        "question_id": "q_before_buckets", "topic": question["topic"], "is_correct": True,
+        "answered_at": old_answer
+    })
+    
+    engine.update_theta_after_response("student_1", question["question_id"], True, 90)
+    student_data = store.collection('students').document("student_1").get().to_dict()
+    
+    assert student_data["recent_questions_tracked_since"]
+    assert engine.recent_question_log_needed(student_data)
+    assert "q_before_buckets" in engine.get_recent_question_set("student_1", student_data)
+    
+    covered = dict(student_data, recent_questions_tracked_since=(
+        datetime.utcnow() - timedelta(days=engine.RECENT_QUESTIONS_WINDOW_DAYS + 1)).isoformat())
+    assert not engine.recent_question_log_needed(covered)
+    assert "q_before_buckets" not in engine.get_recent_question_set("student_1", covered)
@@ -0,0 +1,85 @@
+# Response log compaction: rollup folding, bounded review candidates, overlapping runs
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+NOW = datetime.utcnow()
+
+
+def _log(store, student_id: str, first_day: int, count: int, prefix: str = "r"):
+    """Raw responses answered first_day, first_day + 1, ... days ago (5 topics, half correct)"""
+    responses_ref = store.collection('student_responses').document(student_id).collection('responses')
+    for i in range(count):
+        responses_ref.document(f"{prefix}{i}").set({
+            "question_id": f"q{i % 40}", "topic": f"topic_{i % 5}", "is_correct": i % 2 == 0,
+            "answered_at": (NOW - timedelta(days=first_day + i)).isoformat()
+        })
+
+
+def _raw_count(store, student_id: str) -> int:
+    return len(list(store.collection('student_responses').document(student_id).collection('responses').stream()))
+
+
+def _rollup(store, student_id: str) -> dict:
+    return store.collection('student_response_rollups').document(student_id).get().to_dict()
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(engine, "RESPONSE_COMPACTION_CHUNK_SIZE", 25)
+
+
+def _no_archive(student_id, responses):
+    pass
+
+
+def test_old_responses_fold_into_the_rollup(store, small_chunks):
+    _log(store, "s1", first_day=1, count=10, prefix="recent")
+    _log(store, "s1", first_day=40, count=120)
+    
+    compacted = engine.compact_student_responses("s1", archive=_no_archive)
+    
+    rollup = _rollup(store, "s1")
+    assert compacted == 120
+    assert _raw_count(store, "s1") == 10
+    assert {topic: values["attempts"] for topic, values in rollup["topics"].items()} == \
+        {f"topic_{t}": 24 for t in range(5)}
+    assert sum(values["correct"] for values in rollup["topics"].values()) == 60
+    assert rollup["compacted_through"] == (NOW - timedelta(days=40)).isoformat()
+    assert set(rollup["review_candidates"]) == {f"q{i}" for i in range(0, 40, 2)}
+    assert engine.compact_student_responses("s1", archive=_no_archive) == 0
+
+
+def test_review_candidates_are_bounded_by_age_and_count():
+    candidates = {
+        f"q{i}": {"topic": "t", "first_correct_at": day, "last_correct_at": day}
+        for i, day in enumerate((NOW - timedelta(days=d)).isoformat() for d in (1, 2, 3, 400))
+    }
+    
+    pruned = engine.prune_review_candidates(candidates, max_age_days=365, max_candidates=2)
+    
+    assert list(pruned) == ["q0", "q1"]
+
+
+@pytest.mark.parametrize("existing_rollup", [False, True])
+def test_overlapping_compaction_yields_instead_of_double_counting(store, small_chunks, existing_rollup):
+    if existing_rollup:
+        _log(store, "s1", first_day=200, count=30, prefix="older")
+        engine.compact_student_responses("s1", archive=_no_archive)
+    _log(store, "s1", first_day=40, count=100)
+    other_run = []
+    
+    def archive_while_another_run_finishes(student_id, responses):
+        if not other_run:  # The other run reads and commits after this one read the rollup
+            other_run.append(engine.compact_student_responses(student_id, archive=_no_archive))
+    
+    compacted = engine.compact_student_responses("s1", archive=archive_while_another_run_finishes)
+    
+    rollup = _rollup(store, "s1")
+    expected = 100 + (30 if existing_rollup else 0)
+    assert (compacted, other_run) == (0, [100])
+    assert sum(values["attempts"] for values in rollup["topics"].values()) == expected
+    assert _raw_count(store, "s1") == 0
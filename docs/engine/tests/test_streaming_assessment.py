@@ -0,0 +1,38 @@
+# Streaming initial assessment: answers applied once despite lost acknowledgements
+
+import pytest
+from google.api_core.exceptions import DeadlineExceeded
+
+import iidp_implementation_v4_CALIBRATED as engine
+
+
+def test_streaming_assessment_lost_ack_counts_answer_once(store, question_bank, monkeypatch):
+    questions = question_bank[:3]
+    for question in questions[:2]:
+        engine.record_assessment_answer("s1", question['question_id'], True, 60, topic=question['topic'])
+    
+    # The next write lands but its acknowledgement is lost
+    commit = store.commit
+    lost = []
+    
+    def commit_losing_ack(writes):
+        results = commit(writes)
+        if not lost and any(path[0] == 'assessment_progress' for _, path, _, _, _ in writes):
+            lost.append(writes)
+            raise DeadlineExceeded("acknowledgement lost")
+        return results
+    
+    monkeypatch.setattr(store, "commit", commit_losing_ack)
+    third = questions[2]
+    with pytest.raises(DeadlineExceeded):
+        engine.record_assessment_answer("s1", third['question_id'], False, 60, topic=third['topic'])
+    engine.record_assessment_answer("s1", third['question_id'], False, 60, topic=third['topic'])
+    
+    progress = store.collection('assessment_progress').document("s1").get().to_dict()
+    assert sorted(progress['question_ids']) == sorted(q['question_id'] for q in questions)
+    assert sum(counts['attempts'] for counts in progress['topic_counts'].values()) == 3
+    assert sum(counts['correct'] for counts in progress['topic_counts'].values()) == 2
+    
+    profile = engine.finalize_streaming_assessment("s1", expected_responses=3)
+    assert sum(entry['attempts'] for entry in profile['theta_by_topic'].values()) == 3
+    assert not store.collection('assessment_progress').document("s1").get().exists
@@ -0,0 +1,63 @@
+# Theta replay: re-scoring with unchanged parameters is a no-op, stale profiles are skipped
+
+import pytest
+
+import iidp_implementation_v4_CALIBRATED as engine
+from conftest import make_student
+
+
+@pytest.fixture
+def answered(store, question_bank):
+    """Two students who answered questions in two topics through the normal path"""
+    topics = sorted({q["topic"] for q in question_bank})[:2]
+    students = ["student_1", "student_2"]
+    for n, student_id in enumerate(students):
+        make_student(store, student_id, topics)
+        questions = [q for q in question_bank if q["topic"] in topics][n::3][:6]
+        for i, question in enumerate(questions):
+            engine.update_theta_after_response(student_id, question["question_id"], (i + n) % 3 != 0, 90)
+    return students
+
+
+def _thetas(store, student_ids):
+    return {student_id: store.collection('students').document(student_id).get().to_dict()['theta_by_topic']
+            for student_id in student_ids}
+
+
+def test_replay_with_unchanged_parameters_reproduces_the_profile(store, answered):
+    before = _thetas(store, answered)
+    
+    first = engine.recompute_all_student_thetas(answered, workers=1)
+    after_first = _thetas(store, answered)
+    second = engine.recompute_all_student_thetas(answered, workers=1)
+    after_second = _thetas(store, answered)
+    
+    assert first["written"] == second["written"] == len(answered)
+    assert first["responses"] == 12
+    for student_id in answered:
+        for topic, entry in before[student_id].items():
+            replayed = after_first[student_id][topic]
+            assert replayed["theta"] == pytest.approx(entry["theta"])
+            assert replayed["confidence_SE"] == pytest.approx(entry["confidence_SE"])
+            assert replayed["attempts"] == entry["attempts"]
+            assert replayed["accuracy"] == pytest.approx(entry["accuracy"])
+    assert after_second == after_first
+
+
+def test_profile_changed_since_it_was_read_is_skipped(store, question_bank, answered):
+    inputs = [engine._load_replay_input(student_id) for student_id in answered]
+    batch = engine.build_replay_batch(
+        [(sid, snapshot.to_dict(), responses) for sid, snapshot, responses in inputs],
+        engine.load_item_parameters()
+    )
+    results = engine.replay_theta_lanes(batch)
+    
+    question = next(q for q in question_bank if q["topic"] in _thetas(store, ["student_1"])["student_1"])
+    engine.update_theta_after_response("student_1", question["question_id"], True, 90)  # Answers meanwhile
+    answered_meanwhile = _thetas(store, ["student_1"])["student_1"]
+    
+    written, skipped = engine._write_replay_results(inputs, batch, results, dry_run=False)
+    
+    assert (written, skipped) == (1, 1)
+    assert _thetas(store, ["student_1"])["student_1"] == answered_meanwhile
+    assert 'theta_recomputed_at' in store.collection('students').document("student_2").get().to_dict()